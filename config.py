@@ -13,8 +13,128 @@ class Config:
                                        Defaults to a local SQLite database 'sqlite:///site.db' if not set.
         SQLALCHEMY_TRACK_MODIFICATIONS (bool): Configuration to disable SQLAlchemy's modification tracking
                                                system to save resources. Defaults to False.
+        APP_PROFILE (str): Which parts of the app to build. 'full' registers every route and extension;
+                           'data' registers only the `/api/data` polling route for fast cold starts.
+                           Defaults to 'full'.
+        STARTUP_BUDGET_MS (int): Cold-start budget (import plus `create_app`) in milliseconds, checked by
+                                 the `flask startup-time` command. Defaults to 600.
+        BOARD_TTL_SECONDS (int): How long a fetched bus/train board is served before it is refreshed from
+                                 TransportAPI. Defaults to 300.
+        BOARD_CACHE_MAX_BYTES (int): Estimated bytes of upstream boards a worker keeps in memory; the least
+                                     recently used are dropped beyond it. Defaults to 33554432 (32 MiB).
+        PAYLOAD_CACHE_MAX_BYTES (int): Estimated bytes of materialized payloads a worker keeps in memory.
+                                       Defaults to 8388608 (8 MiB).
+        QUIET_BOARD_TTL_SECONDS (int): Longest time a board is served when nothing on it departs soon (a
+                                       quiet period); it is refreshed one `BOARD_TTL_SECONDS` before its
+                                       first departure. Train boards only get it once nothing on them is
+                                       still to depart, since live statuses change. Set to
+                                       `BOARD_TTL_SECONDS` to disable. Defaults to 1800.
+        SNAPSHOT_PATH (str): File the board and payload caches are snapshotted to and restored from at
+                             worker start. Snapshots are disabled when unset.
+        SNAPSHOT_INTERVAL_SECONDS (int): Minimum time between snapshots written after board refreshes.
+                                         Defaults to 60.
+        RATE_LIMIT_PER_MINUTE (int): Default sustained requests per minute allowed per access token.
+                                     Defaults to 6.
+        RATE_LIMIT_BURST (int): Default burst of requests allowed per access token. Defaults to 10.
+        RATE_LIMIT_MAX_BYTES (int): Estimated bytes of per-token rate-limit state a worker keeps.
+                                    Defaults to 4194304 (4 MiB).
+        MIN_REFRESH_SECONDS (int): Default minimum interval between recomputed `/api/data` payloads for
+                                   one installation; polls inside it get the previous payload. Defaults to 30.
+        BUS_PROVIDER (str): Source of bus departures: 'transportapi' (default) or 'static', which answers
+                            from the local timetable at `TIMETABLE_PATH` and uses TransportAPI only for
+                            stops the feed does not cover or that are listed in `LIVE_BUS_STOPS`.
+        TIMETABLE_PATH (str): SQLite timetable store built by `flask import-timetable`.
+                              Defaults to 'timetable.db'.
+        LIVE_BUS_STOPS (list): Comma-separated ATCO codes that always use live TransportAPI data.
+        TIMETABLE_DEPARTURE_LIMIT (int): Departures returned per stop by the static provider. Defaults to 20.
+        TRANSPORTAPI_URL (str): TransportAPI base URL. Defaults to 'https://transportapi.com/v3/uk'.
+        TRAIN_SECONDARY (str): Secondary train departure source. 'darwin' hedges TransportAPI requests
+                               that are slower than their recent p90 to the Darwin feed at `DARWIN_URL`.
+                               Disabled when unset.
+        DARWIN_URL (str): Darwin departure board JSON URL (e.g. a Huxley proxy) with a `{code}` placeholder
+                          for the station's CRS code.
+        DARWIN_TOKEN (str): Darwin access token, sent as the `accessToken` parameter.
+        HEDGE_BUDGET (float): Hedged requests allowed per TransportAPI train request. Defaults to 0.1.
+        UPSTREAM_TIMEOUT_SECONDS (float): Timeout of a single TransportAPI request. Defaults to 10.
+        UPSTREAM_BACKOFF_MAX_SECONDS (int): Longest wait before retrying a stop or station whose lookups keep
+                                            failing (not found, auth, quota, transient or timeout errors).
+                                            Defaults to 21600.
+        PROFILE_ENABLED (bool): Profile a sample of requests with cProfile. Defaults to False.
+        PROFILE_SAMPLE_RATE (float): Fraction of requests profiled when enabled. Defaults to 0.01.
+        PROFILE_DIR (str): Directory profiles are written to, one subdirectory per route.
+                           Defaults to 'profiles'.
+        PROFILE_TOKEN_MAX_AGE (int): Lifetime in seconds of signed `X-Profile-Token` header values,
+                                     which force profiling of a single request. Defaults to 3600.
+        PUSH_ENABLED (bool): Push changed payloads to TRMNL webhooks after board refreshes. Defaults to False.
+        PUSH_WEBHOOK_URL_TEMPLATE (str): TRMNL webhook URL that payloads are pushed to;
+                                         `{installation_id}` is replaced by the TRMNL installation ID.
+        PUSH_MAX_WORKERS (int): Maximum concurrent webhook requests per worker. Defaults to 4.
+        PUSH_RETRIES (int): Retries for a failed push. Defaults to 3.
+        PUSH_BACKOFF_SECONDS (float): Initial delay between push retries, doubled each time. Defaults to 0.5.
+        PUSH_TIMEOUT_SECONDS (float): Timeout of a single webhook request. Defaults to 10.
+        NAPTAN_PATH (str): NaPTAN stops CSV used to validate bus stop codes and power the stop lookup.
+                           Validation is skipped when unset.
+        CRS_PATH (str): Railway station CSV (CRS code and name) used to validate station codes and
+                        power the station lookup. Validation is skipped when unset.
+        LEASES_ENABLED (bool): Coordinate board refreshes between app nodes through the database, so each
+                               board is fetched by one node and read by the rest. Defaults to False.
+        NODE_ID (str): This node's name in the lease tables. Defaults to '<hostname>-<pid>'.
+        LEASE_SECONDS (int): How long a node may hold a board's refresh lease, and how overdue a board must
+                             be before a node other than its ring owner refreshes it. Defaults to 30.
+        NODE_TIMEOUT_SECONDS (int): Nodes that have not heartbeated for this long lose their boards to the
+                                    remaining nodes. Defaults to 90.
+        INSTALL_STATE_TTL_SECONDS (int): How long an install whose OAuth flow has not completed is kept
+                                         before the sweeper deletes it. Defaults to 3600.
+        INSTALL_SWEEP_BATCH_SIZE (int): Pending installs deleted per transaction. Defaults to 500.
+        INSTALL_SWEEP_INTERVAL_SECONDS (int): Minimum time between the single-batch sweeps run by `/install`.
+                                              Defaults to 300.
+        ADMIN_TOKEN (str): Bearer token for operator endpoints such as `/metrics`. They are disabled
+                           (404) when unset.
     """
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a-hard-to-guess-string'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    APP_PROFILE = os.environ.get('APP_PROFILE') or 'full'
+    STARTUP_BUDGET_MS = int(os.environ.get('STARTUP_BUDGET_MS') or 600)
+    BOARD_TTL_SECONDS = int(os.environ.get('BOARD_TTL_SECONDS') or 300)
+    BOARD_CACHE_MAX_BYTES = int(os.environ.get('BOARD_CACHE_MAX_BYTES') or 32 * 1024 * 1024)
+    PAYLOAD_CACHE_MAX_BYTES = int(os.environ.get('PAYLOAD_CACHE_MAX_BYTES') or 8 * 1024 * 1024)
+    QUIET_BOARD_TTL_SECONDS = int(os.environ.get('QUIET_BOARD_TTL_SECONDS') or 1800)
+    SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH')
+    SNAPSHOT_INTERVAL_SECONDS = int(os.environ.get('SNAPSHOT_INTERVAL_SECONDS') or 60)
+    RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE') or 6)
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST') or 10)
+    RATE_LIMIT_MAX_BYTES = int(os.environ.get('RATE_LIMIT_MAX_BYTES') or 4 * 1024 * 1024)
+    MIN_REFRESH_SECONDS = int(os.environ.get('MIN_REFRESH_SECONDS') or 30)
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    BUS_PROVIDER = os.environ.get('BUS_PROVIDER') or 'transportapi'
+    TIMETABLE_PATH = os.environ.get('TIMETABLE_PATH') or 'timetable.db'
+    LIVE_BUS_STOPS = [code for code in (os.environ.get('LIVE_BUS_STOPS') or '').split(',') if code]
+    TIMETABLE_DEPARTURE_LIMIT = int(os.environ.get('TIMETABLE_DEPARTURE_LIMIT') or 20)
+    TRANSPORTAPI_URL = os.environ.get('TRANSPORTAPI_URL') or 'https://transportapi.com/v3/uk'
+    TRAIN_SECONDARY = os.environ.get('TRAIN_SECONDARY')
+    DARWIN_URL = os.environ.get('DARWIN_URL')
+    DARWIN_TOKEN = os.environ.get('DARWIN_TOKEN')
+    HEDGE_BUDGET = float(os.environ.get('HEDGE_BUDGET') or 0.1)
+    UPSTREAM_TIMEOUT_SECONDS = float(os.environ.get('UPSTREAM_TIMEOUT_SECONDS') or 10)
+    UPSTREAM_BACKOFF_MAX_SECONDS = int(os.environ.get('UPSTREAM_BACKOFF_MAX_SECONDS') or 21600)
+    PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0.01)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or 'profiles'
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE') or 3600)
+    PUSH_ENABLED = os.environ.get('PUSH_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PUSH_WEBHOOK_URL_TEMPLATE = os.environ.get('PUSH_WEBHOOK_URL_TEMPLATE')
+    PUSH_MAX_WORKERS = int(os.environ.get('PUSH_MAX_WORKERS') or 4)
+    PUSH_RETRIES = int(os.environ.get('PUSH_RETRIES') or 3)
+    PUSH_BACKOFF_SECONDS = float(os.environ.get('PUSH_BACKOFF_SECONDS') or 0.5)
+    PUSH_TIMEOUT_SECONDS = float(os.environ.get('PUSH_TIMEOUT_SECONDS') or 10)
+    NAPTAN_PATH = os.environ.get('NAPTAN_PATH')
+    CRS_PATH = os.environ.get('CRS_PATH')
+    LEASES_ENABLED = os.environ.get('LEASES_ENABLED', '').lower() in ('1', 'true', 'yes')
+    NODE_ID = os.environ.get('NODE_ID')
+    LEASE_SECONDS = int(os.environ.get('LEASE_SECONDS') or 30)
+    NODE_TIMEOUT_SECONDS = int(os.environ.get('NODE_TIMEOUT_SECONDS') or 90)
+    INSTALL_STATE_TTL_SECONDS = int(os.environ.get('INSTALL_STATE_TTL_SECONDS') or 3600)
+    INSTALL_SWEEP_BATCH_SIZE = int(os.environ.get('INSTALL_SWEEP_BATCH_SIZE') or 500)
+    INSTALL_SWEEP_INTERVAL_SECONDS = int(os.environ.get('INSTALL_SWEEP_INTERVAL_SECONDS') or 300)
@@ -1,32 +1,71 @@
 from flask import Flask
-from .main import main as main_blueprint
+from .main import main as main_blueprint, api as api_blueprint
 from .models import db
-from flask_migrate import Migrate
 from config import Config
 from .oauth import init_oauth
-from flask_wtf.csrf import CSRFProtect
+from .commands import init_commands, init_migrate_command
+from .boards import init_boards
+from .metrics import init_metrics
+from .ratelimit import init_rate_limiter
+from .providers import init_providers
+from .profiling import init_profiling
+from .push import init_push
+from .stops import init_stops
+from .leases import init_leases
+from .sweeper import init_sweeper
+from .upstream import init_upstream_errors
 
-csrf = CSRFProtect()
+PROFILES = ('full', 'data')
 
-def create_app(config_class=Config):
+def create_app(config_class=Config, profile=None):
     """Factory function to create the Flask application instance.
 
     This function initializes the Flask application, loads the configuration,
-    initializes extensions (database, migrations, OAuth, CSRF protection),
-    and registers the main blueprint.
+    initializes extensions and registers blueprints according to the app profile:
+
+    * ``full``: database, OAuth, CSRF protection and every route. The
+      `flask db` migration commands are registered, but Flask-Migrate is only
+      imported when one of them runs, since importing Alembic is a large part
+      of the cold-start cost.
+    * ``data``: database and the `/api/data` polling route only. Flask-WTF,
+      Authlib and Alembic are never imported.
 
     Args:
         config_class (class): The configuration class to use for setting up the app.
                               Defaults to `Config`.
+        profile (str, optional): Overrides the `APP_PROFILE` configuration value.
 
     Returns:
         Flask: The initialized Flask application instance.
+
+    Raises:
+        ValueError: If the requested profile is unknown.
     """
     app = Flask(__name__)
     app.config.from_object(config_class)
+    profile = profile or app.config.get('APP_PROFILE', 'full')
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown app profile: {profile!r}")
+    app.config['APP_PROFILE'] = profile
+
     db.init_app(app)
-    Migrate(app, db)
-    init_oauth(app)
-    csrf.init_app(app)
-    app.register_blueprint(main_blueprint)
+    init_boards(app)
+    metrics = init_metrics(app)
+    init_rate_limiter(app)
+    init_providers(app, metrics)
+    init_upstream_errors(app)
+    init_profiling(app)
+    init_push(app, metrics)
+    init_leases(app)
+    init_sweeper(app)
+    init_commands(app)
+    app.register_blueprint(api_blueprint)
+
+    if profile == 'full':
+        init_migrate_command(app)
+        init_oauth(app)
+        init_stops(app)
+        from flask_wtf.csrf import CSRFProtect
+        CSRFProtect(app)
+        app.register_blueprint(main_blueprint)
     return app
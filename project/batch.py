@@ -0,0 +1,277 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from .clock import uk_timezone
+
+# Operators shown on train boards; see the train filter in `build_payload`.
+TRAIN_OPERATOR = 'Greater Anglia'
+
+
+def _numpy():
+    """Returns NumPy if it is installed.
+
+    Returns:
+        module or None: The `numpy` module, or None to use the pure-Python path.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class TrainColumns:
+    """One train board in columnar form, ordered by departure time.
+
+    Everything that does not depend on an installation's settings is worked
+    out once per board: whether each departure is run by `TRAIN_OPERATOR`
+    and has a usable time, its minutes from now, and a code for its
+    destination. Columns are in the order `build_payload` lists departures,
+    i.e. stably sorted by time of day.
+
+    Attributes:
+        order (list): Index into the board's `departures.all` of each row.
+        eligible (list): Whether each row passes the operator and time checks.
+        minutes (list): Minutes from now until each row departs (0.0 if not eligible).
+        codes (list): Index into `destinations` of each row's destination.
+        destinations (list): Distinct lower-cased destination names.
+    """
+
+    def __init__(self, departures, now):
+        uk_tz = uk_timezone()
+        rows = []
+        destination_codes = {}
+        for i, train in enumerate(departures):
+            time_str = train.get('aimed_departure_time') or train.get('expected_departure_time')
+            minutes = None
+            if time_str and TRAIN_OPERATOR in train.get('operator_name', ''):
+                try:
+                    t_obj = datetime.strptime(time_str, "%H:%M").time()
+                except ValueError:
+                    t_obj = None
+                if t_obj is not None:
+                    # Same conversion, midnight roll-over included, as `build_payload`.
+                    train_time = uk_tz.localize(datetime.combine(now.date(), t_obj))
+                    if train_time < now and (now - train_time).total_seconds() > 43200:
+                        train_time = train_time + timedelta(days=1)
+                    minutes = (train_time - now).total_seconds() / 60
+                    rows.append((t_obj.hour * 60 + t_obj.minute, i, minutes))
+                    continue
+            rows.append((24 * 60, i, minutes))
+        # Stable, so equal times keep their upstream order as in `build_payload`.
+        rows.sort(key=lambda row: row[0])
+        self.order = [i for _, i, _ in rows]
+        self.eligible = [minutes is not None for _, _, minutes in rows]
+        self.minutes = [minutes if minutes is not None else 0.0 for _, _, minutes in rows]
+        self.codes = []
+        for _, i, _ in rows:
+            name = (departures[i].get('destination_name') or '').lower()
+            self.codes.append(destination_codes.setdefault(name, len(destination_codes)))
+        self.destinations = list(destination_codes)
+
+    def __len__(self):
+        return len(self.order)
+
+
+def evaluate_filters(columns, filters, limit=3, use_numpy=None):
+    """Evaluates many installations' train filters against one board at once.
+
+    Args:
+        columns (TrainColumns): The board.
+        filters (list): `(destination, min_train_time)` pairs, with
+                        `destination` a lower-case substring ('' for any).
+        limit (int): Departures to keep per filter.
+        use_numpy (bool, optional): Force or forbid the NumPy path. Defaults to
+                                    using NumPy when it is installed.
+
+    Returns:
+        list: For each filter, the indices into the board's `departures.all`
+              of its first `limit` matching departures, in display order.
+    """
+    if not filters:
+        return []
+    substrings = sorted({destination for destination, _ in filters})
+    # Substring tests run once per distinct destination, not once per departure.
+    matches = {
+        substring: [substring in name for name in columns.destinations]
+        for substring in substrings
+    }
+    np = _numpy() if use_numpy is not False else None
+    if use_numpy and np is None:
+        raise RuntimeError("NumPy is not installed.")
+    if np is None or not len(columns):
+        return _evaluate_python(columns, filters, matches, limit)
+
+    rows_of = {substring: row for row, substring in enumerate(substrings)}
+    table = np.array([matches[substring] for substring in substrings], dtype=bool)
+    destination_ok = table[np.array([rows_of[d] for d, _ in filters])][:, np.array(columns.codes)]
+    thresholds = np.array([minimum for _, minimum in filters], dtype=float)
+    mask = (
+        np.array(columns.eligible, dtype=bool)[None, :]
+        & destination_ok
+        & (np.array(columns.minutes)[None, :] >= thresholds[:, None])
+    )
+    mask &= np.cumsum(mask, axis=1) <= limit
+    rows, picked = np.nonzero(mask)
+    bounds = np.searchsorted(rows, np.arange(len(filters) + 1))
+    order = np.array(columns.order)[picked].tolist()
+    return [order[bounds[f]:bounds[f + 1]] for f in range(len(filters))]
+
+
+def _evaluate_python(columns, filters, matches, limit):
+    """The pure-Python path of `evaluate_filters`.
+
+    Args:
+        columns (TrainColumns): The board.
+        filters (list): `(destination, min_train_time)` pairs.
+        matches (dict): For each destination substring, whether it matches each of `columns.destinations`.
+        limit (int): Departures to keep per filter.
+
+    Returns:
+        list: For each filter, the selected indices into the board's `departures.all`.
+    """
+    results = []
+    for destination, minimum in filters:
+        match = matches[destination]
+        picked = []
+        for row in range(len(columns)):
+            if columns.eligible[row] and match[columns.codes[row]] and columns.minutes[row] >= minimum:
+                picked.append(columns.order[row])
+                if len(picked) == limit:
+                    break
+        results.append(picked)
+    return results
+
+
+def select_trains(train_data, installations, now, default_min_train_time, limit=3, use_numpy=None):
+    """Picks the departures each installation shows from one shared train board.
+
+    Installations with identical settings are evaluated once.
+
+    Args:
+        train_data (dict): The train board, as returned by TransportAPI.
+        installations (list): Installations subscribed to the board.
+        now (datetime): The current, timezone-aware UK time.
+        default_min_train_time (int): Used for installations without `min_train_time`.
+        limit (int): Departures to keep per installation.
+        use_numpy (bool, optional): See `evaluate_filters`.
+
+    Returns:
+        dict: For each installation's primary key, indices into `departures.all`
+              to show, as `build_payload` would select them.
+    """
+    columns = TrainColumns(train_data['departures'].get('all', []), now)
+    filters = {}
+    for installation in installations:
+        minimum = (
+            installation.min_train_time
+            if installation.min_train_time is not None
+            else default_min_train_time
+        )
+        filters.setdefault(((installation.train_destination or '').lower(), minimum), []).append(installation.id)
+    results = evaluate_filters(columns, list(filters), limit, use_numpy)
+    return {
+        installation_id: picked
+        for ids, picked in zip(filters.values(), results)
+        for installation_id in ids
+    }
+
+
+def _synthetic_board(rng, departures, now):
+    """Generates a busy train board for the benchmark.
+
+    Args:
+        rng (random.Random): The random generator.
+        departures (int): Number of departures.
+        now (datetime): The current UK time.
+
+    Returns:
+        dict: The board.
+    """
+    destinations = ['London Liverpool Street', 'Cambridge', 'Norwich', 'Stansted Airport',
+                    'Ipswich', 'Colchester', 'Southend Victoria', 'Harwich International']
+    operators = ['Greater Anglia'] * 3 + ['CrossCountry', 'c2c']
+    return {'departures': {'all': [
+        {
+            'destination_name': rng.choice(destinations),
+            'aimed_departure_time': (now + timedelta(minutes=rng.randrange(180))).strftime('%H:%M'),
+            'status': 'ON TIME',
+            'operator_name': rng.choice(operators),
+            'platform': str(rng.randrange(1, 10)),
+        }
+        for _ in range(departures)
+    ]}}
+
+
+def benchmark(subscribers=500, departures=80, repeat=5, seed=0):
+    """Times per-installation filtering against the batch evaluator on one busy board.
+
+    Both run on the same synthetic board and installations; the per-installation
+    loop is `build_payload` itself. Results are checked to be identical.
+
+    Args:
+        subscribers (int): Installations subscribed to the board.
+        departures (int): Departures on the board.
+        repeat (int): Timed runs of each method; the best is reported.
+        seed (int): Seed of the synthetic board and settings.
+
+    Returns:
+        dict: Best milliseconds for `loop_ms`, `python_ms` and `numpy_ms`
+              (None without NumPy), and whether every method `matches`.
+    """
+    from .main import build_payload
+    from .models import Installation
+
+    rng = random.Random(seed)
+    now = uk_timezone().localize(datetime(2026, 3, 2, 8, 0))
+    board = _synthetic_board(rng, departures, now)
+    choices = ['', '', 'london', 'cambridge', 'norwich', 'airport', 'ips']
+    installations = [
+        Installation(id=i + 1, train_station='LST', train_destination=rng.choice(choices),
+                     min_train_time=rng.choice((None, rng.randrange(61))))
+        for i in range(subscribers)
+    ]
+    default = Installation.min_train_time.default.arg
+    all_trains = board['departures']['all']
+
+    def loop():
+        return {
+            installation.id: build_payload(installation, None, board, now)['trains']
+            for installation in installations
+        }
+
+    def batch(use_numpy):
+        def run():
+            selections = select_trains(board, installations, now, default, use_numpy=use_numpy)
+            return {
+                installation_id: [
+                    {'destination': all_trains[i]['destination_name'],
+                     'time': all_trains[i].get('aimed_departure_time'),
+                     'status': all_trains[i].get('status'),
+                     'platform': all_trains[i].get('platform')}
+                    for i in picked
+                ]
+                for installation_id, picked in selections.items()
+            }
+        return run
+
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings), result
+
+    loop_ms, expected = best(loop)
+    python_ms, python_result = best(batch(False))
+    numpy_ms, numpy_result = best(batch(True)) if _numpy() is not None else (None, expected)
+    return {
+        'subscribers': subscribers,
+        'departures': departures,
+        'loop_ms': round(loop_ms, 3),
+        'python_ms': round(python_ms, 3),
+        'numpy_ms': round(numpy_ms, 3) if numpy_ms is not None else None,
+        'matches': python_result == expected and numpy_result == expected,
+    }
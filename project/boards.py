@@ -0,0 +1,380 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from .caches import ByteBudgetCache, register_cache
+from .upstream import key_digest
+
+BUS = 'bus'
+TRAIN = 'train'
+
+_EXTENSION_KEY = 'boards'
+
+# The settings that affect an installation's payload. The App Key is only
+# kept as a digest, since fingerprints are written to snapshots.
+SettingsFingerprint = namedtuple('SettingsFingerprint', [
+    'bus_stop', 'bus_direction', 'train_station', 'train_destination', 'min_train_time', 'app_id', 'app_key_hash',
+])
+
+
+def board_keys(installation):
+    """Returns the upstream boards an installation depends on.
+
+    A board is identified by `(kind, app_id, code)`. The TransportAPI App ID is
+    part of the key so that each board is always fetched with the credentials
+    (and quota) of the installations reading it.
+
+    Args:
+        installation (Installation or SettingsFingerprint): The installation, or
+            the fingerprint of its settings, to inspect.
+
+    Returns:
+        list: Board keys, bus board first, for every stop/station configured.
+    """
+    keys = []
+    if installation.bus_stop:
+        keys.append((BUS, installation.app_id or '', installation.bus_stop))
+    if installation.train_station:
+        keys.append((TRAIN, installation.app_id or '', installation.train_station))
+    return keys
+
+
+def settings_fingerprint(installation):
+    """Returns a tuple of every setting that affects an installation's payload.
+
+    Stored alongside each materialized payload so that a payload computed from
+    outdated settings (e.g. saved on another worker) is never served.
+
+    Args:
+        installation (Installation): The installation to fingerprint.
+
+    Returns:
+        SettingsFingerprint: The relevant settings, with the App Key hashed.
+    """
+    return SettingsFingerprint(
+        installation.bus_stop,
+        installation.bus_direction,
+        installation.train_station,
+        installation.train_destination,
+        installation.min_train_time,
+        installation.app_id,
+        key_digest(installation.app_key),
+    )
+
+
+def fingerprint_board_keys(fingerprint):
+    """Returns the board keys of the installation a `settings_fingerprint` was taken from.
+
+    Args:
+        fingerprint (sequence): The settings fingerprint, e.g. as read back from a snapshot.
+
+    Returns:
+        list: Board keys, as `board_keys` would return them.
+    """
+    return board_keys(SettingsFingerprint(*fingerprint))
+
+
+def payload_hash(payload):
+    """Returns a stable digest of a payload, used to detect changes.
+
+    `valid_until` is left out: it moves with every board refresh, while the
+    digest should only change when what the device displays does.
+
+    Args:
+        payload (dict): The `/api/data` response body.
+
+    Returns:
+        str: A hex digest that only changes when the displayed payload does.
+    """
+    shown = {name: value for name, value in payload.items() if name != 'valid_until'}
+    encoded = json.dumps(shown, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def valid_until(payload):
+    """Returns the time a payload's `valid_until` hint refers to.
+
+    Args:
+        payload (dict): The `/api/data` response body.
+
+    Returns:
+        datetime or None: The timezone-aware time, or None if the payload has no hint.
+    """
+    value = payload.get('valid_until')
+    return datetime.fromisoformat(value) if value else None
+
+
+class BoardStore:
+    """In-memory store of upstream boards and materialized installation payloads.
+
+    The store keeps three structures:
+
+    * ``boards``: board key -> ``{'data', 'fetched_at', 'expires_at'}``, the raw
+      upstream response for a stop or station.
+    * ``subscriptions``: board key -> set of installation IDs that read it.
+    * ``payloads``: installation ID -> ``{'payload', 'hash', 'fingerprint',
+      'computed_at', 'served_at'}``, the filtered `/api/data` response for that
+      installation.
+
+    When a board is refreshed every subscribed installation's payload is
+    recomputed in one batch, so a device poll is normally a dictionary read.
+    Times are wall-clock (`time.time`) so entries keep their meaning across
+    processes. ``boards`` and ``payloads`` are `ByteBudgetCache` instances, so
+    the least recently used entries are dropped once they exceed their byte
+    budgets; a dropped board is fetched again and a dropped payload recomputed.
+
+    Attributes:
+        ttl (int): How long a fetched board stays fresh, in seconds.
+        lock (threading.RLock): Guards all structures.
+        loaded (bool): Whether the subscription map has been seeded from the database.
+        snapshot_at (float): Wall-clock time of the last snapshot written by this process.
+    """
+
+    def __init__(self, ttl, clock=time.time, board_bytes=None, payload_bytes=None):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.snapshot_at = 0.0
+        self.boards = ByteBudgetCache('boards', board_bytes)
+        self.subscriptions = {}
+        self.payloads = ByteBudgetCache('payloads', payload_bytes)
+        self._installation_keys = {}
+
+    def subscribe(self, installation_id, keys):
+        """Points an installation at the given boards, replacing earlier subscriptions.
+
+        Args:
+            installation_id (int): The installation's primary key.
+            keys (list): The board keys it now depends on.
+
+        Returns:
+            bool: True if the installation's subscriptions changed.
+        """
+        keys = frozenset(keys)
+        with self.lock:
+            previous = self._installation_keys.get(installation_id, frozenset())
+            if previous == keys:
+                return False
+            for key in previous - keys:
+                subscribers = self.subscriptions.get(key)
+                if subscribers is not None:
+                    subscribers.discard(installation_id)
+                    if not subscribers:
+                        del self.subscriptions[key]
+            for key in keys - previous:
+                self.subscriptions.setdefault(key, set()).add(installation_id)
+            self._installation_keys[installation_id] = keys
+            return True
+
+    def unsubscribe(self, installation_id):
+        """Forgets an installation and its materialized payload.
+
+        Args:
+            installation_id (int): The installation's primary key.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.subscribe(installation_id, ())
+            self._installation_keys.pop(installation_id, None)
+            self.payloads.pop(installation_id, None)
+
+    def subscribers(self, key):
+        """Returns the installation IDs subscribed to a board.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            set: A copy of the subscriber IDs.
+        """
+        with self.lock:
+            return set(self.subscriptions.get(key, ()))
+
+    def board(self, key):
+        """Returns a cached board entry, fresh or not.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            dict or None: The board entry, or None if it was never fetched.
+        """
+        with self.lock:
+            return self.boards.lookup(key)
+
+    def is_fresh(self, key):
+        """Checks whether a board is cached and inside its TTL.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            bool: True if the board does not need refreshing.
+        """
+        entry = self.board(key)
+        return entry is not None and entry['expires_at'] > self.clock()
+
+    def put_board(self, key, data, fetched_at=None, ttl=None):
+        """Stores a fetched board.
+
+        Args:
+            key (tuple): The board key.
+            data (dict): The upstream response.
+            fetched_at (float, optional): When it was fetched, if not just now
+                                          (e.g. by another node).
+            ttl (float, optional): How long it stays fresh, if not the store's `ttl`.
+
+        Returns:
+            dict or None: The stored board entry, or None if the board alone is
+                          larger than the cache's byte budget and was not stored
+                          (any older copy is dropped too).
+        """
+        now = self.clock() if fetched_at is None else fetched_at
+        entry = {'data': data, 'fetched_at': now, 'expires_at': now + (self.ttl if ttl is None else ttl)}
+        with self.lock:
+            stored = self.boards.put(key, entry)
+        return entry if stored else None
+
+    def payload(self, installation_id, fingerprint):
+        """Returns a materialized payload if it matches the installation's settings.
+
+        Args:
+            installation_id (int): The installation's primary key.
+            fingerprint (tuple): The installation's current `settings_fingerprint`.
+
+        Returns:
+            dict or None: The payload, or None if it must be recomputed.
+        """
+        with self.lock:
+            entry = self.payloads.lookup(installation_id)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            return None
+        return entry['payload']
+
+    def put_payload(self, installation_id, fingerprint, payload):
+        """Stores a materialized payload for an installation.
+
+        Args:
+            installation_id (int): The installation's primary key.
+            fingerprint (tuple): The settings the payload was computed from.
+            payload (dict): The `/api/data` response body.
+
+        Returns:
+            None
+        """
+        entry = {
+            'payload': payload,
+            'hash': payload_hash(payload),
+            'fingerprint': fingerprint,
+            'computed_at': self.clock(),
+            'served_at': None,
+        }
+        with self.lock:
+            previous = self.payloads.get(installation_id)
+            if previous is not None:
+                entry['served_at'] = previous.get('served_at')
+            self.payloads[installation_id] = entry
+
+    def payload_hash(self, installation_id):
+        """Returns the digest of an installation's stored payload.
+
+        Args:
+            installation_id (int): The installation's primary key.
+
+        Returns:
+            str or None: The digest, or None if no payload is stored.
+        """
+        with self.lock:
+            entry = self.payloads.get(installation_id)
+            return entry['hash'] if entry is not None else None
+
+    def recently_served(self, installation_id, fingerprint, window):
+        """Returns the payload last served to an installation if it was served within `window`.
+
+        Args:
+            installation_id (int): The installation's primary key.
+            fingerprint (tuple): The installation's current `settings_fingerprint`.
+            window (int): The minimum refresh interval in seconds.
+
+        Returns:
+            dict or None: The payload, or None if the window has passed or the
+                          settings have changed since.
+        """
+        with self.lock:
+            entry = self.payloads.lookup(installation_id)
+        if entry is None or entry['fingerprint'] != fingerprint or entry.get('served_at') is None:
+            return None
+        if self.clock() - entry['served_at'] >= window:
+            return None
+        return entry['payload']
+
+    def mark_served(self, installation_id):
+        """Records that an installation's payload has just been served.
+
+        Args:
+            installation_id (int): The installation's primary key.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            entry = self.payloads.get(installation_id)
+            if entry is not None:
+                entry['served_at'] = self.clock()
+
+    def discard_payload(self, installation_id):
+        """Drops an installation's materialized payload.
+
+        Args:
+            installation_id (int): The installation's primary key.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.payloads.pop(installation_id, None)
+
+
+def init_boards(app):
+    """Creates the board store for `app`.
+
+    Reads `BOARD_TTL_SECONDS` and the `BOARD_CACHE_MAX_BYTES` and
+    `PAYLOAD_CACHE_MAX_BYTES` budgets from the app configuration. If
+    `SNAPSHOT_PATH` is set and the file exists, unexpired boards and payloads
+    are restored from it so a restarted worker does not refetch everything at once.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        BoardStore: The new store.
+    """
+    store = BoardStore(
+        app.config.get('BOARD_TTL_SECONDS', 300),
+        board_bytes=app.config.get('BOARD_CACHE_MAX_BYTES'),
+        payload_bytes=app.config.get('PAYLOAD_CACHE_MAX_BYTES'),
+    )
+    register_cache(app, store.boards)
+    register_cache(app, store.payloads)
+    if app.config.get('SNAPSHOT_PATH'):
+        from .snapshot import load_snapshot
+        load_snapshot(store, app.config['SNAPSHOT_PATH'])
+    app.extensions[_EXTENSION_KEY] = store
+    return store
+
+
+def get_board_store(app):
+    """Returns the board store of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        BoardStore: The app's store.
+    """
+    return app.extensions[_EXTENSION_KEY]
@@ -0,0 +1,274 @@
+import heapq
+import sys
+import threading
+from collections import OrderedDict
+
+_EXTENSION_KEY = 'caches'
+
+_CONTAINERS = (list, tuple, set, frozenset)
+
+
+def estimate_size(obj):
+    """Estimates the memory held by an object and everything it references.
+
+    Follows dicts, lists, tuples, sets and instance `__dict__`s, counting each
+    object once. Objects shared with the rest of the process (interned
+    strings, small ints) are counted too, so the estimate errs on the high side.
+
+    Args:
+        obj (object): The object to measure.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, _CONTAINERS):
+            stack.extend(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, type):
+            stack.append(vars(item))
+    return size
+
+
+def _default_label(key):
+    """Formats a cache key for reports.
+
+    Args:
+        key (object): The key.
+
+    Returns:
+        str: Tuples joined with ':', anything else as `str()`.
+    """
+    if isinstance(key, tuple):
+        return ':'.join(str(part) for part in key)
+    return str(key)
+
+
+class ByteBudgetCache:
+    """A least-recently-used cache bounded by the estimated bytes it holds.
+
+    Each entry's size (key plus value) is estimated with `estimate_size`
+    when it is stored; values mutated in place afterwards keep their original
+    estimate. Storing an entry evicts the least recently used ones until the
+    total fits in `max_bytes`, and an entry larger than the whole budget is
+    not stored. Only `lookup` counts towards the hit ratio and refreshes an
+    entry's recency; the dict-style accessors are for maintenance such as
+    snapshots.
+
+    Attributes:
+        name (str): The name shown in reports.
+        max_bytes (int or None): The byte budget; unbounded if None.
+        max_entries (int or None): An optional cap on the number of entries.
+        bytes (int): Estimated bytes currently held.
+        hits (int): Lookups that found an entry.
+        misses (int): Lookups that did not.
+        evictions (int): Entries dropped to stay within budget.
+    """
+
+    def __init__(self, name, max_bytes=None, max_entries=None, sizer=estimate_size, label=_default_label):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizer = sizer
+        self.label = label
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+
+    def lookup(self, key):
+        """Returns a cached value, counting the hit or miss.
+
+        Args:
+            key (object): The key.
+
+        Returns:
+            object or None: The value, or None if it is not cached.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Stores a value, evicting least recently used entries to make room.
+
+        Args:
+            key (object): The key.
+            value (object): The value.
+
+        Returns:
+            bool: False if the entry alone exceeds the budget and was not stored.
+        """
+        size = self.sizer(key) + self.sizer(value)
+        with self._lock:
+            self.pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return False
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.bytes += size
+            while self._entries and (
+                (self.max_bytes is not None and self.bytes > self.max_bytes)
+                or (self.max_entries is not None and len(self._entries) > self.max_entries)
+            ):
+                oldest, _ = self._entries.popitem(last=False)
+                self.bytes -= self._sizes.pop(oldest)
+                self.evictions += 1
+            return True
+
+    def pop(self, key, default=None):
+        """Removes an entry.
+
+        Args:
+            key (object): The key.
+            default (object): Returned if the key is not cached.
+
+        Returns:
+            object: The removed value, or `default`.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self.bytes -= self._sizes.pop(key)
+            return self._entries.pop(key)
+
+    def setdefault(self, key, value):
+        """Stores a value unless the key is already cached.
+
+        Args:
+            key (object): The key.
+            value (object): The value to store if the key is missing.
+
+        Returns:
+            object: The cached value.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.put(key, value)
+            return self._entries.get(key, value)
+
+    def get(self, key, default=None):
+        """Returns a cached value without counting it as a lookup.
+
+        Args:
+            key (object): The key.
+            default (object): Returned if the key is not cached.
+
+        Returns:
+            object: The value, or `default`.
+        """
+        with self._lock:
+            return self._entries.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._entries[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        """Returns a snapshot of the cached keys.
+
+        Returns:
+            list: The keys, least recently used first.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def values(self):
+        """Returns a snapshot of the cached values.
+
+        Returns:
+            list: The values, least recently used first.
+        """
+        with self._lock:
+            return list(self._entries.values())
+
+    def items(self):
+        """Returns a snapshot of the cached entries.
+
+        Returns:
+            list: `(key, value)` pairs, least recently used first.
+        """
+        with self._lock:
+            return list(self._entries.items())
+
+    def stats(self, top=5):
+        """Summarizes the cache for reports.
+
+        Args:
+            top (int): How many of the largest entries to list.
+
+        Returns:
+            dict: `name`, `entries`, `bytes`, `max_bytes`, `hits`, `misses`,
+                  `hit_ratio`, `evictions` and `largest` (label and bytes).
+        """
+        with self._lock:
+            largest = heapq.nlargest(top, self._sizes.items(), key=lambda item: item[1])
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'largest': [{'key': self.label(key), 'bytes': size} for key, size in largest],
+            }
+
+
+def register_cache(app, cache):
+    """Adds a cache to the caches reported for `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+        cache (ByteBudgetCache): The cache.
+
+    Returns:
+        ByteBudgetCache: The cache.
+    """
+    app.extensions.setdefault(_EXTENSION_KEY, {})[cache.name] = cache
+    return cache
+
+
+def get_caches(app):
+    """Returns the caches registered for `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        list: The caches, in registration order.
+    """
+    return list(app.extensions.get(_EXTENSION_KEY, {}).values())
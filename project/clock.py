@@ -0,0 +1,60 @@
+from datetime import datetime
+
+_EXTENSION_KEY = 'clock'
+
+
+def uk_timezone():
+    """Returns the Europe/London timezone, importing `pytz` on first use.
+
+    Returns:
+        datetime.tzinfo: The pytz timezone for Europe/London.
+    """
+    import pytz
+    return pytz.timezone('Europe/London')
+
+
+def uk_now():
+    """Returns the current, timezone-aware UK time from the system clock.
+
+    Returns:
+        datetime: The current time in Europe/London.
+    """
+    return datetime.now(uk_timezone())
+
+
+def set_clock(app, clock):
+    """Runs `app` on another clock, e.g. simulated time.
+
+    Every component of `app` that keeps time (the board store, rate
+    limiter, upstream error cache and lease manager) is pointed at `clock`,
+    and `project.main` reads the current time from it instead of the system
+    clock. Only `app` is affected; other apps in the process keep theirs.
+
+    Args:
+        app (Flask): The Flask application instance.
+        clock (function): Returns the current Unix time in seconds.
+
+    Returns:
+        None
+    """
+    from .boards import get_board_store
+    from .leases import get_leases
+    from .ratelimit import get_rate_limiter
+    from .upstream import get_upstream_errors
+
+    for component in (get_board_store(app), get_rate_limiter(app), get_upstream_errors(app), get_leases(app)):
+        if component is not None:
+            component.clock = clock
+    app.extensions[_EXTENSION_KEY] = clock
+
+
+def get_clock(app):
+    """Returns the clock set for `app` with `set_clock`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        function or None: The clock, or None to use the system clock.
+    """
+    return app.extensions.get(_EXTENSION_KEY)
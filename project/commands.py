@@ -0,0 +1,292 @@
+import os
+import click
+
+
+class LazyMigrateGroup(click.Group):
+    """The Flask-Migrate `db` command group, set up only when a `db` command is used.
+
+    Importing Flask-Migrate pulls in Alembic, a large part of the cold-start
+    cost, so `Migrate` is attached to the app on first use of the group
+    rather than in `create_app`.
+
+    Attributes:
+        app (Flask): The application whose database is migrated.
+    """
+
+    def __init__(self, app):
+        super().__init__('db', help="Perform database migrations.")
+        self.app = app
+
+    def _group(self):
+        """Sets up Flask-Migrate on the app if needed and returns its command group.
+
+        Returns:
+            click.Group: Flask-Migrate's `db` group.
+        """
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_group
+        from .models import db
+
+        if 'migrate' not in self.app.extensions:
+            Migrate(self.app, db)
+        return db_group
+
+    def list_commands(self, ctx):
+        return self._group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._group().get_command(ctx, name)
+
+
+def init_migrate_command(app):
+    """Registers the lazily loaded `flask db` migration commands on `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        None
+    """
+    app.cli.add_command(LazyMigrateGroup(app))
+
+
+def init_commands(app):
+    """Registers the project's `flask` CLI commands on `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        None
+    """
+
+    @app.cli.command('startup-time')
+    @click.option('--profile', default=None, help="App profile to measure (defaults to APP_PROFILE).")
+    @click.option('--runs', default=5, show_default=True, help="Number of fresh interpreters to sample.")
+    def startup_time(profile, runs):
+        """Measures cold-start time and checks it against STARTUP_BUDGET_MS."""
+        from .startup import measure_cold_start
+
+        profile = profile or app.config['APP_PROFILE']
+        budget = app.config['STARTUP_BUDGET_MS']
+        result = measure_cold_start(profile, runs)
+        click.echo(
+            f"{profile}: import {result['import_ms']:.0f}ms + create_app "
+            f"{result['create_ms']:.0f}ms = {result['total_ms']:.0f}ms (budget {budget}ms)"
+        )
+        if result['heavy_modules']:
+            click.echo(f"Heavy modules loaded at start-up: {', '.join(result['heavy_modules'])}")
+        if result['total_ms'] > budget:
+            raise click.ClickException('Cold start is over budget.')
+
+    @app.cli.command('benchmark-filters')
+    @click.option('--subscribers', default=500, show_default=True, help="Installations sharing the board.")
+    @click.option('--departures', default=80, show_default=True, help="Departures on the board.")
+    @click.option('--repeat', default=5, show_default=True, help="Timed runs of each method.")
+    def benchmark_filters(subscribers, departures, repeat):
+        """Compares per-installation train filtering with the batch evaluator."""
+        from .batch import benchmark
+
+        result = benchmark(subscribers, departures, repeat)
+        numpy_ms = f"{result['numpy_ms']:.1f}ms" if result['numpy_ms'] is not None else 'not installed'
+        click.echo(
+            f"{subscribers} subscribers x {departures} departures: per-installation loop "
+            f"{result['loop_ms']:.1f}ms, batch (Python) {result['python_ms']:.1f}ms, "
+            f"batch (NumPy) {numpy_ms}"
+        )
+        if not result['matches']:
+            raise click.ClickException('Batch results differ from the per-installation loop.')
+
+    @app.cli.command('simulate-day')
+    @click.option('--population', 'population_path', default=None,
+                  help="JSON file of installations and poll schedules (default: synthetic).")
+    @click.option('--installations', default=30, show_default=True, help="Size of the synthetic population.")
+    @click.option('--interval', default=900, show_default=True, help="Seconds between synthetic polls.")
+    @click.option('--policies', 'policies_path', default=None,
+                  help="JSON file of policies by name (default: the built-in comparison).")
+    @click.option('--daily-limit', default=0, show_default=True,
+                  help="Upstream calls per App ID per day, e.g. 30 for TransportAPI's free plan (0: none).")
+    @click.option('--latency', default=0.3, show_default=True, help="Mean simulated upstream latency, in seconds.")
+    @click.option('--seed', default=0, show_default=True, help="Seed of the synthetic population and latencies.")
+    @click.option('--max-calls-per-key', default=None, type=int,
+                  help="Fail if any policy calls one board more often than this.")
+    @click.option('--json', 'as_json', is_flag=True, help="Print the full reports as JSON.")
+    def simulate_day_command(population_path, installations, interval, policies_path, daily_limit,
+                             latency, seed, max_calls_per_key, as_json):
+        """Replays a simulated day of polls to compare TTL, refresh and quota policies."""
+        import json
+
+        from .simulate import compare_policies, load_population, synthetic_population
+
+        if population_path:
+            population = load_population(population_path)
+        else:
+            population = synthetic_population(installations, interval=interval, seed=seed)
+        policies = None
+        if policies_path:
+            with open(policies_path, encoding='utf-8') as fh:
+                policies = json.load(fh)
+        reports = compare_policies(population, policies, latency=latency, daily_limit=daily_limit, seed=seed)
+        if as_json:
+            click.echo(json.dumps(reports, indent=2))
+        else:
+            for name, report in reports.items():
+                busiest = max(report['calls_per_key'].values(), default=0)
+                exhausted = report['quota_exhausted_at']
+                if exhausted:
+                    # Once a quota runs out the remaining figures mostly measure the backoff.
+                    first = min(exhausted.values())
+                    click.echo(
+                        f"{name}: QUOTA EXHAUSTED for {len(exhausted)} of {len(report['calls_per_app_id'])} "
+                        f"App IDs, first after {first // 3600}h{first % 3600 // 60:02d}m"
+                    )
+                click.echo(
+                    f"{name}: {report['polls']} polls, {report['upstream_calls']} upstream calls "
+                    f"(busiest board {busiest}, over quota {sum(report['over_quota'].values())}), "
+                    f"staleness p50/p90/max {report['staleness'].get('p50', 0):.0f}/"
+                    f"{report['staleness'].get('p90', 0):.0f}/{report['staleness'].get('max', 0):.0f}s, "
+                    f"latency p50/p95 {report['latency_ms'].get('p50', 0):.0f}/"
+                    f"{report['latency_ms'].get('p95', 0):.0f}ms"
+                )
+        if max_calls_per_key is not None:
+            over = [
+                name for name, report in reports.items()
+                if max(report['calls_per_key'].values(), default=0) > max_calls_per_key
+            ]
+            if over:
+                raise click.ClickException(
+                    f"Over {max_calls_per_key} calls per board under: {', '.join(over)}."
+                )
+
+    @app.cli.command('refresh-boards')
+    @click.option('--force', is_flag=True, help="Also refresh boards that are still fresh.")
+    def refresh_boards_command(force):
+        """Refreshes subscribed boards and recomputes dependent payloads."""
+        from .boards import get_board_store
+        from .main import refresh_all_boards
+        from .push import get_pusher
+
+        refreshed = refresh_all_boards(get_board_store(app), force=force)
+        click.echo(f"Refreshed {refreshed} board(s).")
+        pusher = get_pusher(app)
+        if pusher is not None and pusher.drain():
+            raise click.ClickException('Some pushes were still pending.')
+
+    @app.cli.command('warm-cache')
+    @click.option('--from-db', is_flag=True, help="Ignore the snapshot and fetch every board in the DB's stop list.")
+    def warm_cache(from_db):
+        """Warms the board cache and writes a snapshot for workers to load at start."""
+        from .boards import get_board_store
+        from .main import refresh_all_boards
+        from .snapshot import load_snapshot, write_snapshot
+
+        store = get_board_store(app)
+        path = app.config.get('SNAPSHOT_PATH')
+        if not path:
+            raise click.ClickException('SNAPSHOT_PATH is not configured.')
+        if not from_db:
+            click.echo(f"Restored {load_snapshot(store, path)} board(s) from {path}.")
+        refreshed = refresh_all_boards(store, force=from_db)
+        size = write_snapshot(store, path)
+        click.echo(f"Fetched {refreshed} board(s); wrote {size} bytes to {path}.")
+
+    @app.cli.command('set-limits')
+    @click.argument('trmnl_installation_id')
+    @click.option('--per-minute', type=int, default=None, help="Sustained /api/data requests per minute.")
+    @click.option('--burst', type=int, default=None, help="Burst size.")
+    @click.option('--min-refresh', type=int, default=None, help="Minimum seconds between recomputed payloads.")
+    @click.option('--reset', is_flag=True, help="Clear the installation's limits and use the defaults.")
+    def set_limits(trmnl_installation_id, per_minute, burst, min_refresh, reset):
+        """Sets the polling limits of one installation."""
+        from .models import db, Installation
+
+        installation = Installation.query.filter_by(trmnl_installation_id=trmnl_installation_id).first()
+        if installation is None:
+            raise click.ClickException(f"No installation {trmnl_installation_id}.")
+        if reset:
+            installation.poll_rate_per_minute = None
+            installation.poll_burst = None
+            installation.min_refresh_seconds = None
+        if per_minute is not None:
+            installation.poll_rate_per_minute = per_minute
+        if burst is not None:
+            installation.poll_burst = burst
+        if min_refresh is not None:
+            installation.min_refresh_seconds = min_refresh
+        db.session.commit()
+        click.echo(
+            f"{trmnl_installation_id}: per_minute={installation.poll_rate_per_minute} "
+            f"burst={installation.poll_burst} min_refresh={installation.min_refresh_seconds}"
+        )
+
+    @app.cli.command('sweep-installs')
+    @click.option('--max-batches', type=int, default=None, help="Stop after this many batches.")
+    def sweep_installs(max_batches):
+        """Deletes pending installs older than INSTALL_STATE_TTL_SECONDS."""
+        from .sweeper import get_sweeper
+
+        sweeper = get_sweeper(app)
+        deleted = sweeper.sweep(max_batches=max_batches)
+        click.echo(f"Deleted {deleted} abandoned install(s) in batches of {sweeper.batch_size}.")
+
+    @app.cli.command('cache-stats')
+    @click.option('--url', default=None, help="Base URL of a running worker to query instead of this process.")
+    @click.option('--top', default=5, show_default=True, help="Largest entries to list per cache.")
+    def cache_stats(url, top):
+        """Reports cache sizes, budgets, hit ratios and largest keys."""
+        if url:
+            import requests
+
+            response = requests.get(
+                f"{url.rstrip('/')}/admin/caches",
+                params={'top': top},
+                headers={'Authorization': f"Bearer {app.config.get('ADMIN_TOKEN') or ''}"},
+                timeout=10,
+            )
+            if response.status_code != 200:
+                raise click.ClickException(f"{url} answered HTTP {response.status_code}.")
+            report = response.json()
+        else:
+            from .caches import get_caches
+
+            report = {'pid': os.getpid(), 'caches': [cache.stats(top) for cache in get_caches(app)]}
+        click.echo(f"Worker {report['pid']}:")
+        for stats in report['caches']:
+            budget = stats['max_bytes'] if stats['max_bytes'] is not None else 'unbounded'
+            ratio = f"{stats['hit_ratio']:.1%}" if stats['hit_ratio'] is not None else 'n/a'
+            click.echo(
+                f"  {stats['name']}: {stats['entries']} entries, {stats['bytes']} / {budget} bytes, "
+                f"hit ratio {ratio}, {stats['evictions']} evicted"
+            )
+            for entry in stats['largest']:
+                click.echo(f"    {entry['bytes']:>10}  {entry['key']}")
+
+    @app.cli.command('import-timetable')
+    @click.argument('source', type=click.Path(exists=True))
+    @click.option('--output', default=None, help="Store to write (defaults to TIMETABLE_PATH).")
+    def import_timetable(source, output):
+        """Imports a GTFS feed (zip or directory) into the static timetable store."""
+        from .timetable import import_gtfs
+
+        output = output or app.config['TIMETABLE_PATH']
+        count = import_gtfs(source, output)
+        click.echo(f"Imported {count} departures into {output}.")
+
+    @app.cli.command('profile-token')
+    def profile_token():
+        """Prints a signed X-Profile-Token header value that forces profiling."""
+        from .profiling import make_profile_token
+
+        click.echo(make_profile_token(app))
+
+    @app.cli.command('profile-aggregate')
+    @click.option('--output', default='profile.folded', show_default=True, help="Collapsed-stack file to write.")
+    def profile_aggregate(output):
+        """Merges request profiles into a flamegraph-ready collapsed-stack file."""
+        from .profiling import aggregate_profiles
+
+        directory = app.config['PROFILE_DIR']
+        if not os.path.isdir(directory):
+            raise click.ClickException(f"No profiles in {directory}.")
+        count = aggregate_profiles(directory, output)
+        click.echo(f"Aggregated {count} profile(s) into {output}.")
@@ -1,15 +1,26 @@
+import hmac
+import math
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, current_app, abort, g
 from .models import Installation
+from .metrics import get_metrics
+from .ratelimit import get_rate_limiter
 
 def token_required(f):
     """Decorator to require a valid Bearer token for a route.
 
     This decorator checks for the 'Authorization' header in the request.
     It expects the header to be in the format 'Bearer <token>'.
-    It verifies the token against the `Installation` database.
+    Before touching the database it charges the token's rate-limit bucket and
+    returns a 429 Too Many Requests response with `Retry-After` if it is empty.
+    A token without a bucket (not seen by this worker yet) is looked up in the
+    `Installation` database unless its client address has used up its
+    allowance of failed authentications; a valid token then gets a bucket with
+    that installation's own rate limits, an invalid one is charged to the
+    address.
     If the token is missing or invalid, it returns a 401 Unauthorized response.
-    If valid, it passes the corresponding `Installation` object to the decorated function.
+    If valid, it passes the corresponding `Installation` object to the decorated function
+    (and records it as `g.installation`, e.g. for tagging profiles).
 
     Args:
         f (function): The view function to decorate.
@@ -35,10 +46,60 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
+        limiter = get_rate_limiter(current_app)
+        retry_after = limiter.check(token)
+        if retry_after is None:
+            # Unknown tokens only get a bucket once they authenticate; until then
+            # only addresses with too many failed attempts are turned away.
+            retry_after = limiter.check_address(request.remote_addr)
+        if retry_after:
+            get_metrics(current_app).incr('api_throttled_total', reason='rate_limit')
+            response = jsonify({'message': 'Too many requests!'})
+            response.headers['Retry-After'] = str(max(1, math.ceil(min(retry_after, 3600))))
+            return response, 429
+
         installation = Installation.query.filter_by(access_token=token).first()
 
         if not installation:
+            limiter.charge_address(request.remote_addr)
             return jsonify({'message': 'Token is invalid!'}), 401
 
+        limiter.configure(token, installation.poll_rate_per_minute, installation.poll_burst)
+        g.installation = installation
+
         return f(installation, *args, **kwargs)
     return decorated
+
+def admin_required(f):
+    """Decorator to restrict a route to operators holding `ADMIN_TOKEN`.
+
+    The request must carry an 'Authorization: Bearer <ADMIN_TOKEN>' header.
+    If `ADMIN_TOKEN` is not configured the route behaves as if it does not
+    exist and returns 404; a wrong or missing token returns 401.
+
+    Args:
+        f (function): The view function to decorate.
+
+    Returns:
+        function: The wrapped function that includes the admin check.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        """The wrapper function performing the admin check.
+
+        Args:
+            *args: Positional arguments for the view function.
+            **kwargs: Keyword arguments for the view function.
+
+        Returns:
+            Response: A Flask response object (JSON error or the result of the view function).
+        """
+        admin_token = current_app.config.get('ADMIN_TOKEN')
+        if not admin_token:
+            abort(404)
+        header = request.headers.get('Authorization', '')
+        token = header.split(' ', 1)[1] if ' ' in header else ''
+        if not hmac.compare_digest(token.encode(), admin_token.encode()):
+            return jsonify({'message': 'Token is invalid!'}), 401
+        return f(*args, **kwargs)
+    return decorated
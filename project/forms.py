@@ -0,0 +1,71 @@
+from flask import current_app
+from flask_wtf import FlaskForm
+from wtforms import StringField, IntegerField, SubmitField, ValidationError
+from .stops import get_stop_directory
+
+def _validate_code(field, kind, label):
+    """Checks a stop/station code against the local reference dataset.
+
+    Empty values are allowed, and nothing is checked if no dataset is
+    configured for `kind`. Valid codes are normalized to upper case.
+
+    Args:
+        field (Field): The form field holding the code.
+        kind (str): 'bus' or 'train'.
+        label (str): How to refer to the code in the error message.
+
+    Raises:
+        ValidationError: If the code is not in the dataset.
+    """
+    code = (field.data or '').strip()
+    if not code:
+        return
+    index = get_stop_directory(current_app).index(kind)
+    if index is None:
+        return
+    if code not in index:
+        raise ValidationError(f'Unknown {label} "{code}".')
+    field.data = code.upper()
+
+class SettingsForm(FlaskForm):
+    """Form for configuring the plugin settings.
+
+    This module is imported lazily by the `/manage` route so that processes
+    which never render the settings page do not pay for Flask-WTF and WTForms.
+    Bus stop and station codes are validated against the NaPTAN/CRS reference
+    data when it is configured.
+
+    Attributes:
+        bus_stop (StringField): The ATCO code for the bus stop.
+        bus_direction (StringField): Optional filter for bus direction.
+        train_station (StringField): The CRS code for the train station.
+        train_destination (StringField): Optional filter for train destination.
+        min_train_time (IntegerField): Minimum minutes before departure to show a train.
+        app_id (StringField): TransportAPI Application ID.
+        app_key (StringField): TransportAPI Application Key.
+        submit (SubmitField): The submit button.
+    """
+    bus_stop = StringField('Bus Stop ATCO Code')
+    bus_direction = StringField('Bus Direction (Optional)')
+    train_station = StringField('Train Station CRS Code')
+    train_destination = StringField('Train Destination (Optional)')
+    min_train_time = IntegerField('Minimum Train Time (mins)')
+    app_id = StringField('App ID')
+    app_key = StringField('App Key')
+    submit = SubmitField('Save Settings')
+
+    def validate_bus_stop(self, field):
+        """Validates the bus stop ATCO code.
+
+        Args:
+            field (StringField): The bus stop field.
+        """
+        _validate_code(field, 'bus', 'bus stop ATCO code')
+
+    def validate_train_station(self, field):
+        """Validates the train station CRS code.
+
+        Args:
+            field (StringField): The train station field.
+        """
+        _validate_code(field, 'train', 'station CRS code')
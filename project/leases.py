@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from bisect import bisect_right
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Node, BoardLease
+
+_EXTENSION_KEY = 'leases'
+
+
+def board_key_name(key):
+    """Returns the string form of a board key used in the lease table.
+
+    Args:
+        key (tuple): The board key, `(kind, app_id, code)`.
+
+    Returns:
+        str: `kind:app_id:code`.
+    """
+    return ':'.join(key)
+
+
+def _ring_hash(value):
+    """Hashes a string onto the ring, identically in every process.
+
+    Args:
+        value (str): The node replica or board key.
+
+    Returns:
+        int: A 64-bit position on the ring.
+    """
+    return int.from_bytes(hashlib.sha1(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """A consistent-hashing ring assigning board keys to nodes.
+
+    Each node is placed on the ring `replicas` times, so adding or removing
+    a node only moves about `1/len(nodes)` of the keys.
+
+    Attributes:
+        nodes (frozenset): The nodes on the ring.
+    """
+
+    def __init__(self, nodes, replicas=64):
+        self.nodes = frozenset(nodes)
+        points = sorted((_ring_hash(f'{node}#{i}'), node) for node in self.nodes for i in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, name):
+        """Returns the node a key belongs to.
+
+        Args:
+            name (str): The board key name.
+
+        Returns:
+            str or None: The owning node, or None if the ring is empty.
+        """
+        if not self._points:
+            return None
+        i = bisect_right(self._points, _ring_hash(name)) % len(self._points)
+        return self._owners[i]
+
+
+class LeaseManager:
+    """Decides which node refreshes each board, using the database.
+
+    Every node heartbeats into the `node` table; the nodes seen within
+    `node_timeout` seconds form a `HashRing`, and a board's owner on that
+    ring is the node expected to refresh it. Before fetching, a node takes a
+    time-limited lease on the board's `board_lease` row with a conditional
+    update, so at most one node fetches a board at a time even while nodes
+    disagree about membership. The fetched board is published to the same
+    row for the other nodes to read.
+
+    A node that is not a board's owner only steps in once the published
+    board is `lease_seconds` overdue, which covers an owner that has died but
+    not yet dropped off the ring, or one that never receives polls for the
+    board. A dead node's leases simply lapse.
+
+    Leases are held per process (see `holder`), not per node: every worker
+    of a node shares its `NODE_ID`, but only one of them may fetch a board.
+
+    Attributes:
+        node_id (str): This node's name.
+        lease_seconds (int): How long a lease is held while fetching.
+        node_timeout (int): Nodes silent for longer are dropped from the ring.
+    """
+
+    def __init__(self, node_id, lease_seconds=30, node_timeout=90, replicas=64, clock=time.time):
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.node_timeout = node_timeout
+        self.replicas = replicas
+        self.clock = clock
+        self._ring = HashRing((node_id,), replicas)
+        self._ring_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def holder(self):
+        """The lease holder name of this process, `node_id/pid`.
+
+        Worked out on each use, so workers forked after the manager was
+        created still hold leases under their own name.
+
+        Returns:
+            str: The holder name.
+        """
+        return f'{self.node_id}/{os.getpid()}'
+
+    def heartbeat(self):
+        """Records that this node is alive and reloads the live node set.
+
+        Returns:
+            HashRing: The ring built from the live nodes.
+        """
+        now = self.clock()
+        nodes = Node.__table__
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                nodes.update().where(nodes.c.name == self.node_id).values(heartbeat_at=now)
+            ).rowcount
+            if not updated:
+                conn.execute(nodes.insert().values(name=self.node_id, heartbeat_at=now))
+            live = [
+                row[0] for row in conn.execute(
+                    select(nodes.c.name).where(nodes.c.heartbeat_at > now - self.node_timeout)
+                )
+            ]
+        with self._lock:
+            if frozenset(live) != self._ring.nodes:
+                self._ring = HashRing(live, self.replicas)
+            self._ring_at = now
+            return self._ring
+
+    def ring(self):
+        """Returns the current ring, heartbeating first if it is a third of `node_timeout` old.
+
+        Returns:
+            HashRing: The ring.
+        """
+        with self._lock:
+            ring, ring_at = self._ring, self._ring_at
+        if ring_at is None or self.clock() - ring_at >= self.node_timeout / 3:
+            ring = self.heartbeat()
+        return ring
+
+    def owner(self, key):
+        """Returns the node expected to refresh a board.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            str: The owning node.
+        """
+        return self.ring().owner(board_key_name(key))
+
+    def read(self, key):
+        """Returns the board most recently published by any node.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            dict or None: `data`, `fetched_at` and `expires_at`, or None if the
+                          board has never been published.
+        """
+        leases = BoardLease.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(leases.c.data, leases.c.fetched_at, leases.c.expires_at)
+                .where(leases.c.key == board_key_name(key))
+            ).first()
+        if row is None or row[0] is None:
+            return None
+        return {'data': json.loads(row[0]), 'fetched_at': row[1], 'expires_at': row[2]}
+
+    def acquire(self, key, overdue):
+        """Tries to take the refresh lease on a board.
+
+        Args:
+            key (tuple): The board key.
+            overdue (float): Seconds since the published board went stale
+                             (infinite if it was never published).
+
+        Returns:
+            bool: True if this process now holds the lease and should fetch the board.
+        """
+        if self.owner(key) != self.node_id and overdue < self.lease_seconds:
+            return False
+        holder = self.holder
+        now = self.clock()
+        name = board_key_name(key)
+        leases = BoardLease.__table__
+        with db.engine.begin() as conn:
+            taken = conn.execute(
+                leases.update()
+                .where(leases.c.key == name)
+                .where(or_(leases.c.holder == holder, leases.c.lease_expires_at <= now))
+                .values(holder=holder, lease_expires_at=now + self.lease_seconds)
+            ).rowcount
+        if taken:
+            return True
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(leases.insert().values(
+                    key=name, holder=holder, lease_expires_at=now + self.lease_seconds
+                ))
+        except IntegrityError:
+            # The row exists and another process holds the lease.
+            return False
+        return True
+
+    def publish(self, key, entry):
+        """Shares a freshly fetched board and releases its lease.
+
+        Args:
+            key (tuple): The board key.
+            entry (dict): The board entry stored by `BoardStore.put_board`.
+
+        Returns:
+            None
+        """
+        leases = BoardLease.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                leases.update()
+                .where(leases.c.key == board_key_name(key))
+                .values(
+                    data=json.dumps(entry['data'], separators=(',', ':')),
+                    fetched_at=entry['fetched_at'],
+                    expires_at=entry['expires_at'],
+                    lease_expires_at=0.0,
+                )
+            )
+
+    def release(self, key):
+        """Gives up a lease without publishing, e.g. after a failed fetch.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            None
+        """
+        leases = BoardLease.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                leases.update()
+                .where(leases.c.key == board_key_name(key))
+                .where(leases.c.holder == self.holder)
+                .values(lease_expires_at=0.0)
+            )
+
+
+def init_leases(app):
+    """Creates the lease manager for `app` if `LEASES_ENABLED` is set.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        LeaseManager or None: The manager, or None if every node refreshes on its own.
+    """
+    if not app.config.get('LEASES_ENABLED'):
+        return None
+    manager = LeaseManager(
+        app.config.get('NODE_ID') or f'{socket.gethostname()}-{os.getpid()}',
+        lease_seconds=app.config.get('LEASE_SECONDS', 30),
+        node_timeout=app.config.get('NODE_TIMEOUT_SECONDS', 90),
+    )
+    app.extensions[_EXTENSION_KEY] = manager
+    return manager
+
+
+def get_leases(app):
+    """Returns the lease manager of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        LeaseManager or None: The manager, or None if leases are disabled.
+    """
+    return app.extensions.get(_EXTENSION_KEY)
@@ -1,15 +1,43 @@
-from flask import Blueprint, request, jsonify, redirect, url_for, render_template, flash, session
-import requests
+from flask import Blueprint, request, jsonify, redirect, url_for, render_template, flash, session, current_app
 from datetime import datetime, timedelta
+import logging
 import os
-from dateutil import parser
-import pytz
 from .oauth import oauth
-from .decorators import token_required
+from .decorators import token_required, admin_required
 import uuid
 from .models import db, User, Installation
-
+from .boards import BUS, TRAIN, board_keys, get_board_store, settings_fingerprint, valid_until
+from .batch import select_trains
+from .snapshot import maybe_snapshot
+from .metrics import get_metrics
+from .caches import get_caches
+from .providers import get_provider
+from .push import get_pusher, webhook_url
+from .leases import get_leases
+from .sweeper import get_sweeper
+from .clock import get_clock, uk_timezone
+from .upstream import AUTH, DESCRIPTIONS, UpstreamError, credential_key, get_upstream_errors
+from .stops import get_stop_directory
+
+logger = logging.getLogger(__name__)
+
+# Routes for the install flow, webhooks and settings page.
 main = Blueprint('main', __name__)
+# The device polling route; this is all a data-only worker registers.
+api = Blueprint('api', __name__)
+
+def _uk_now():
+    """Returns the current, timezone-aware UK time from the app's clock.
+
+    That is the system clock unless another was set with `project.clock.set_clock`.
+
+    Returns:
+        datetime: The current time in Europe/London.
+    """
+    clock = get_clock(current_app)
+    if clock is None:
+        return datetime.now(uk_timezone())
+    return datetime.fromtimestamp(clock(), uk_timezone())
 
 @main.route('/install')
 def install():
@@ -17,6 +45,7 @@ def install():
 
     This route generates a unique state for the installation, creates a temporary
     `Installation` record, and redirects the user to the TRMNL authorization URL.
+    Temporary records whose flow was abandoned are swept in bounded batches.
 
     Returns:
         Response: A redirect to the TRMNL authorization page.
@@ -29,6 +58,9 @@ def install():
     db.session.add(installation)
     db.session.commit()
 
+    # Clear out abandoned attempts now and then, since each visit adds a row.
+    get_sweeper(current_app).maybe_sweep()
+
     return oauth.trmnl.authorize_redirect(redirect_uri, state=state)
 
 @main.route('/callback')
@@ -97,43 +129,20 @@ def webhook_uninstall():
     if installation_id:
         installation = Installation.query.filter_by(trmnl_installation_id=installation_id).first()
         if installation:
+            get_board_store(current_app).unsubscribe(installation.id)
             db.session.delete(installation)
             db.session.commit()
             return jsonify({"status": "success"}), 200
     return jsonify({"status": "success"}), 200
 
-from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, SubmitField
-
-class SettingsForm(FlaskForm):
-    """Form for configuring the plugin settings.
-
-    Attributes:
-        bus_stop (StringField): The ATCO code for the bus stop.
-        bus_direction (StringField): Optional filter for bus direction.
-        train_station (StringField): The CRS code for the train station.
-        train_destination (StringField): Optional filter for train destination.
-        min_train_time (IntegerField): Minimum minutes before departure to show a train.
-        app_id (StringField): TransportAPI Application ID.
-        app_key (StringField): TransportAPI Application Key.
-        submit (SubmitField): The submit button.
-    """
-    bus_stop = StringField('Bus Stop ATCO Code')
-    bus_direction = StringField('Bus Direction (Optional)')
-    train_station = StringField('Train Station CRS Code')
-    train_destination = StringField('Train Destination (Optional)')
-    min_train_time = IntegerField('Minimum Train Time (mins)')
-    app_id = StringField('App ID')
-    app_key = StringField('App Key')
-    submit = SubmitField('Save Settings')
-
 @main.route('/manage', methods=['GET', 'POST'])
 @token_required
 def manage(installation):
     """Handles the settings management page for the plugin.
 
-    This route renders a form to update the plugin settings.
-    It requires a valid authentication token.
+    This route renders a form to update the plugin settings, along with the
+    last upstream error of the installation's bus stop and train station, if
+    they are failing. It requires a valid authentication token.
 
     Args:
         installation (Installation): The current installation object (injected by decorator).
@@ -141,13 +150,58 @@ def manage(installation):
     Returns:
         Response: The rendered HTML template or a redirect after successful update.
     """
+    from .forms import SettingsForm
+
     form = SettingsForm(obj=installation)
+    errors = get_upstream_errors(current_app)
     if form.validate_on_submit():
         form.populate_obj(installation)
         db.session.commit()
+        store = get_board_store(current_app)
+        keys = board_keys(installation)
+        # New codes or credentials deserve a fresh attempt.
+        for key in keys:
+            errors.clear(key)
+            errors.clear(credential_key(key, installation.app_key))
+        store.subscribe(installation.id, keys)
+        recompute_payloads(store, [installation.id])
         flash('Settings saved successfully!')
         return redirect(url_for('main.manage'))
-    return render_template('manage.html', installation=installation, form=form)
+    upstream_errors = {}
+    for key in board_keys(installation):
+        entry = errors.status(credential_key(key, installation.app_key)) or errors.status(key)
+        if entry is not None:
+            upstream_errors[key[0]] = dict(
+                entry,
+                description=DESCRIPTIONS[entry['kind']],
+                retry_in=max(0, int(entry['retry_at'] - errors.clock())),
+            )
+    return render_template('manage.html', installation=installation, form=form,
+                           upstream_errors=upstream_errors)
+
+@main.route('/api/stops', methods=['GET'])
+def lookup_stops():
+    """Typeahead lookup of bus stops or train stations for the manage page.
+
+    Answers from the local NaPTAN/CRS index and never calls TransportAPI.
+
+    Query Args:
+        kind (str): 'bus' (default) or 'train'.
+        q (str): The code or name prefix typed so far.
+        limit (int): Maximum number of results (at most 50). Defaults to 10.
+
+    Returns:
+        Response: A JSON list of `{code, name, locality}` objects, or 404 if no
+                  dataset is configured for `kind`.
+    """
+    kind = request.args.get('kind', 'bus')
+    if kind not in ('bus', 'train'):
+        return jsonify({'message': 'Unknown kind!'}), 400
+    index = get_stop_directory(current_app).index(kind)
+    if index is None:
+        return jsonify({'message': 'No reference data configured!'}), 404
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify(index.search(request.args.get('q', ''), limit))
 
 # Mock data for testing without keys
 MOCK_BUS_DATA = {
@@ -177,8 +231,49 @@ MOCK_TRAIN_DATA = {
     }
 }
 
+def _guarded_fetch(kind, app_id, app_key, code, lookup):
+    """Runs an upstream lookup unless it is backing off from an earlier failure.
+
+    Failures are classified (see `project.upstream`) and recorded per App ID
+    and stop, so a broken stop or revoked key is retried with exponential
+    backoff rather than on every poll. Authentication failures are recorded
+    per App Key too, so they only hold back installations using that key.
+
+    Args:
+        kind (str): The board kind, `BUS` or `TRAIN`.
+        app_id (str): TransportAPI App ID.
+        app_key (str): TransportAPI App Key.
+        code (str): The stop or station code.
+        lookup (function): Performs the lookup; may raise `UpstreamError`.
+
+    Returns:
+        dict or None: The board, or None if the lookup failed or was skipped.
+    """
+    errors = get_upstream_errors(current_app)
+    metrics = get_metrics(current_app)
+    key = (kind, app_id or '', code)
+    auth_key = credential_key(key, app_key)
+    if errors.blocked(key) is not None or errors.blocked(auth_key) is not None:
+        metrics.incr('upstream_skipped_total', kind=kind)
+        return None
+    try:
+        data = lookup()
+    except UpstreamError as e:
+        entry = errors.record(auth_key if e.kind == AUTH else key, e)
+        metrics.incr('upstream_errors_total', kind=kind, error=e.kind)
+        logger.warning("Error fetching %s data for %s (%s, failure %d): %s",
+                       kind, code, e.kind, entry['failures'], e)
+        return None
+    errors.clear(key)
+    errors.clear(auth_key)
+    return data
+
 def fetch_bus_data(app_id, app_key, stop_id):
-    """Fetches live bus departure data from TransportAPI.
+    """Fetches bus departure data from the configured bus provider.
+
+    By default this is TransportAPI's live `stop_timetables` endpoint; with
+    `BUS_PROVIDER = 'static'` scheduled departures come from the local
+    timetable store instead (see `project.providers`).
 
     Args:
         app_id (str): TransportAPI App ID.
@@ -186,30 +281,20 @@ def fetch_bus_data(app_id, app_key, stop_id):
         stop_id (str): The ATCO code of the bus stop.
 
     Returns:
-        dict or None: The parsed JSON response from the API, or None if an error occurs
-                      or credentials are missing (returns mock data if missing).
+        dict or None: The board, or None if an error occurs or the stop is backing off
+                      from one (returns mock data if credentials are missing and the
+                      provider needs them).
     """
-    if not app_id or not app_key:
+    provider = get_provider(current_app, BUS)
+    if provider.needs_credentials and (not app_id or not app_key):
         return MOCK_BUS_DATA
-    
-    url = f"https://transportapi.com/v3/uk/bus/stop_timetables/{stop_id}.json"
-    params = {
-        "app_id": app_id,
-        "app_key": app_key,
-        "group": "no", # Don't group by route, just get all? Actually 'no' might not be valid. 
-        # "nextbuses": "yes" ?
-        # Examples used default.
-    }
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"Error fetching bus data: {e}")
-        return None
+    return _guarded_fetch(BUS, app_id, app_key, stop_id, lambda: provider.departures(app_id, app_key, stop_id))
 
 def fetch_train_data(app_id, app_key, station_code):
-    """Fetches live train departure data from TransportAPI.
+    """Fetches live train departure data from the configured train provider.
+
+    This is TransportAPI's `live.json` endpoint, hedged to a Darwin feed when
+    `TRAIN_SECONDARY = 'darwin'` (see `project.providers`).
 
     Args:
         app_id (str): TransportAPI App ID.
@@ -217,44 +302,33 @@ def fetch_train_data(app_id, app_key, station_code):
         station_code (str): The CRS code of the train station.
 
     Returns:
-        dict or None: The parsed JSON response from the API, or None if an error occurs
-                      or credentials are missing (returns mock data if missing).
+        dict or None: The board, or None if an error occurs or the station is backing
+                      off from one (returns mock data if credentials are missing).
     """
-    if not app_id or not app_key:
+    provider = get_provider(current_app, TRAIN)
+    if provider.needs_credentials and (not app_id or not app_key):
         return MOCK_TRAIN_DATA
+    return _guarded_fetch(TRAIN, app_id, app_key, station_code,
+                          lambda: provider.departures(app_id, app_key, station_code))
 
-    url = f"https://transportapi.com/v3/uk/train/station/{station_code}/live.json"
-    params = {
-        "app_id": app_id,
-        "app_key": app_key,
-        "darwin": "true",
-        "train_status": "passenger"
-    }
-    try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"Error fetching train data: {e}")
-        return None
-
-@main.route('/api/data', methods=['GET'])
-@token_required
-def get_data(installation):
-    """API endpoint to retrieve formatted bus and train data for the plugin.
+def build_payload(installation, bus_data, train_data, now, train_selection=None):
+    """Filters upstream boards into the payload for one installation.
 
-    This route fetches data based on the installation's settings, filters it
-    (e.g., by operator, direction, minimum time), and returns a JSON payload
-    formatted for the TRMNL device.
+    Filters the boards by operator, direction, destination and minimum time,
+    and keeps the next three departures of each kind.
 
     Args:
-        installation (Installation): The current installation object (injected by decorator).
+        installation (Installation): The installation whose settings to apply.
+        bus_data (dict or None): The bus stop board, if any.
+        train_data (dict or None): The train station board, if any.
+        now (datetime): The current, timezone-aware UK time.
+        train_selection (list, optional): Indices into the train board's
+            `departures.all` already picked for this installation by
+            `project.batch.select_trains`, in display order.
 
     Returns:
-        Response: A JSON response containing lists of bus and train departures.
+        dict: The payload with `buses` and `trains` lists.
     """
-    app_id = installation.app_id
-    app_key = installation.app_key
     bus_stop_id = installation.bus_stop
     bus_direction = (installation.bus_direction or '').lower()
     train_station_code = installation.train_station
@@ -264,15 +338,11 @@ def get_data(installation):
         if installation.min_train_time is not None
         else Installation.min_train_time.default.arg
     )
-    
-    # Ensure UK time for accurate comparison
-    uk_tz = pytz.timezone('Europe/London')
-    now = datetime.now(uk_tz)
-    
+    uk_tz = uk_timezone()
+
     # Process Bus Data
     buses = []
     if bus_stop_id:
-        bus_data = fetch_bus_data(app_id, app_key, bus_stop_id)
         if bus_data and 'departures' in bus_data:
             all_departures = []
             # departures is a dict keyed by line name
@@ -308,74 +378,77 @@ def get_data(installation):
     # Process Train Data
     trains = []
     if train_station_code:
-        train_data = fetch_train_data(app_id, app_key, train_station_code)
         if train_data and 'departures' in train_data:
             # departures might have keys 'all', or 'from', etc.
             # TransportAPI usually returns { "departures": { "all": [...] } }
             all_trains = train_data['departures'].get('all', [])
-            
-            filtered_trains = []
-            for train in all_trains:
-                # Filter operator: Greater Anglia/Trainline
-                # "Trainline" is not an operator. Greater Anglia is.
-                # But user said "train times from Greater Anglia/Trainline".
-                # I will include all trains but maybe prioritize GA?
-                # Or strict filter? "Train times from Greater Anglia".
-                # Let's strict filter for now if it's easy, otherwise include all.
-                # The prompt says "Bus info must be from First Bus company, and train times from Greater Anglia/Trainline."
-                # This implies strict filtering.
-                op_name = train.get('operator_name', '')
-                # Check for Greater Anglia (might be abbreviated)
-                if 'Greater Anglia' not in op_name and 'Trainline' not in op_name: # Trainline won't be there
-                     # Wait, if user buys from Trainline, they see all trains.
-                     # Maybe "Greater Anglia" is the operator they care about.
-                     # I'll filter for "Greater Anglia".
-                     # But to be safe, I'll comment this out or make it optional.
-                     # The prompt is specific. I'll filter.
-                     if 'Greater Anglia' not in op_name:
-                         continue
+
+            if train_selection is not None:
+                # Already picked for a whole batch of subscribers (see `project.batch`).
+                filtered_trains = [all_trains[i] for i in train_selection]
+            else:
+                filtered_trains = []
+                for train in all_trains:
+                    # Filter operator: Greater Anglia/Trainline
+                    # "Trainline" is not an operator. Greater Anglia is.
+                    # But user said "train times from Greater Anglia/Trainline".
+                    # I will include all trains but maybe prioritize GA?
+                    # Or strict filter? "Train times from Greater Anglia".
+                    # Let's strict filter for now if it's easy, otherwise include all.
+                    # The prompt says "Bus info must be from First Bus company, and train times from Greater Anglia/Trainline."
+                    # This implies strict filtering.
+                    op_name = train.get('operator_name', '')
+                    # Check for Greater Anglia (might be abbreviated)
+                    if 'Greater Anglia' not in op_name and 'Trainline' not in op_name: # Trainline won't be there
+                         # Wait, if user buys from Trainline, they see all trains.
+                         # Maybe "Greater Anglia" is the operator they care about.
+                         # I'll filter for "Greater Anglia".
+                         # But to be safe, I'll comment this out or make it optional.
+                         # The prompt is specific. I'll filter.
+                         if 'Greater Anglia' not in op_name:
+                             continue
                 
-                # Filter by destination if specified
-                if train_destination and train_destination not in train.get('destination_name', '').lower():
-                    continue
-
-                # Time filtering
-                # "only show train times after a set amount of time (default 30 mins)"
-                aimed_time_str = train.get('aimed_departure_time') or train.get('expected_departure_time')
-                if aimed_time_str:
-                    try:
-                        # TransportAPI returns HH:MM local time. We construct a timezone-aware datetime.
-                        # Parse time string
-                        t_obj = datetime.strptime(aimed_time_str, "%H:%M").time()
+                    # Filter by destination if specified
+                    if train_destination and train_destination not in train.get('destination_name', '').lower():
+                        continue
+
+                    # Time filtering
+                    # "only show train times after a set amount of time (default 30 mins)"
+                    aimed_time_str = train.get('aimed_departure_time') or train.get('expected_departure_time')
+                    if aimed_time_str:
+                        try:
+                            # TransportAPI returns HH:MM local time. We construct a timezone-aware datetime.
+                            # Parse time string
+                            t_obj = datetime.strptime(aimed_time_str, "%H:%M").time()
                         
-                        # Combine with today's date and localize
-                        train_time = uk_tz.localize(datetime.combine(now.date(), t_obj))
+                            # Combine with today's date and localize
+                            train_time = uk_tz.localize(datetime.combine(now.date(), t_obj))
                         
-                        # Handle midnight crossover? 
-                        # If train_time is significantly in the past (e.g. > 12 hours ago), maybe it's actually tomorrow? 
-                        # But simpler: if train_time < now, check if the difference is huge or small.
-                        # However, usually lists are for near future.
-                        # If train time is 00:10 and now is 23:50, train_time (today 00:10) < now.
-                        # We should add a day.
-                        if train_time < now and (now - train_time).total_seconds() > 43200: # 12 hours
-                             train_time = train_time + timedelta(days=1)
+                            # Handle midnight crossover? 
+                            # If train_time is significantly in the past (e.g. > 12 hours ago), maybe it's actually tomorrow? 
+                            # But simpler: if train_time < now, check if the difference is huge or small.
+                            # However, usually lists are for near future.
+                            # If train time is 00:10 and now is 23:50, train_time (today 00:10) < now.
+                            # We should add a day.
+                            if train_time < now and (now - train_time).total_seconds() > 43200: # 12 hours
+                                 train_time = train_time + timedelta(days=1)
                         
-                        # Calculate minutes from now
-                        diff = (train_time - now).total_seconds() / 60
+                            # Calculate minutes from now
+                            diff = (train_time - now).total_seconds() / 60
                         
-                        if diff >= min_train_time:
-                            filtered_trains.append(train)
-                    except ValueError:
-                        pass
+                            if diff >= min_train_time:
+                                filtered_trains.append(train)
+                        except ValueError:
+                            pass
             
-            # Sort filtered trains by time
-            def parse_train_time(t_str):
-                try:
-                     return datetime.strptime(t_str, "%H:%M").time()
-                except:
-                     return datetime.max.time()
+                # Sort filtered trains by time
+                def parse_train_time(t_str):
+                    try:
+                         return datetime.strptime(t_str, "%H:%M").time()
+                    except:
+                         return datetime.max.time()
 
-            filtered_trains.sort(key=lambda x: parse_train_time(x.get('aimed_departure_time') or x.get('expected_departure_time') or '23:59'))
+                filtered_trains.sort(key=lambda x: parse_train_time(x.get('aimed_departure_time') or x.get('expected_departure_time') or '23:59'))
 
             # Take top 3
             for train in filtered_trains[:3]:
@@ -386,7 +459,470 @@ def get_data(installation):
                     "platform": train.get('platform')
                 })
 
-    return jsonify({
+    return {
         "buses": buses,
         "trains": trains
-    })
+    }
+
+def _departure_at(time_str, now):
+    """Converts an `HH:MM` departure time to the nearest matching datetime.
+
+    Times more than 12 hours in the past are taken to be tomorrow, as in
+    `build_payload`.
+
+    Args:
+        time_str (str): The departure time.
+        now (datetime): The current, timezone-aware UK time.
+
+    Returns:
+        datetime or None: The departure, or None if the time cannot be parsed.
+    """
+    try:
+        t_obj = datetime.strptime(time_str, "%H:%M").time()
+    except (TypeError, ValueError):
+        return None
+    when = uk_timezone().localize(datetime.combine(now.date(), t_obj))
+    if when < now and (now - when).total_seconds() > 43200:
+        when = when + timedelta(days=1)
+    return when
+
+def board_lifetime(kind, data, now, ttl, quiet_ttl):
+    """Returns how long a freshly fetched board stays fresh.
+
+    Normally `ttl`. In quiet periods, when nothing on a bus board leaves
+    within the next two TTLs, the board is kept until one TTL before its first
+    departure, up to `quiet_ttl`. Train boards carry live status, so a train
+    board is only kept longer when nothing on it is still to depart. An empty
+    board is kept for `quiet_ttl`.
+
+    Args:
+        kind (str): The board kind, `BUS` or `TRAIN`.
+        data (dict): The upstream response.
+        now (datetime): The current, timezone-aware UK time.
+        ttl (float): The normal board TTL, in seconds.
+        quiet_ttl (float): The longest TTL of a quiet board, in seconds.
+
+    Returns:
+        float: The TTL in seconds.
+    """
+    departures = (data or {}).get('departures') or {}
+    if kind == BUS:
+        listed = [dep for deps in departures.values() for dep in deps]
+    else:
+        listed = departures.get('all', [])
+    upcoming = [
+        when for when in (
+            _departure_at(dep.get('aimed_departure_time') or dep.get('expected_departure_time'), now)
+            for dep in listed
+        )
+        if when is not None and when >= now
+    ]
+    if not upcoming:
+        return max(ttl, quiet_ttl)
+    if kind == TRAIN:
+        return ttl
+    first = (min(upcoming) - now).total_seconds()
+    if first <= 2 * ttl:
+        return ttl
+    return max(ttl, min(first - ttl, quiet_ttl))
+
+def next_change(store, installation, payload, now):
+    """Returns when an installation's payload can next change.
+
+    That is the earliest of: the first bus shown leaving, the first train
+    shown coming within `min_train_time`, and a board it is built from
+    expiring.
+
+    Args:
+        store (BoardStore): The board store.
+        installation (Installation): The installation.
+        payload (dict): The payload just built for it.
+        now (datetime): The current, timezone-aware UK time.
+
+    Returns:
+        datetime: The time after which the payload should be recomputed.
+    """
+    min_train_time = (
+        installation.min_train_time
+        if installation.min_train_time is not None
+        else Installation.min_train_time.default.arg
+    )
+    candidates = [_departure_at(bus['time'], now) for bus in payload['buses']]
+    candidates += [
+        when - timedelta(minutes=min_train_time)
+        for when in (_departure_at(train['time'], now) for train in payload['trains'])
+        if when is not None
+    ]
+    clock = store.clock()
+    for key in board_keys(installation):
+        entry = store.board(key)
+        if entry is not None:
+            candidates.append(now + timedelta(seconds=round(entry['expires_at'] - clock)))
+    future = [when for when in candidates if when is not None and when > now]
+    return min(future) if future else now + timedelta(seconds=store.ttl)
+
+def _payload_response(payload, now):
+    """Returns a payload as JSON with caching headers derived from its `valid_until`.
+
+    Args:
+        payload (dict): The `/api/data` response body.
+        now (datetime): The current, timezone-aware UK time.
+
+    Returns:
+        Response: The JSON response.
+    """
+    response = jsonify(payload)
+    until = valid_until(payload)
+    if until is not None:
+        response.cache_control.private = True
+        response.cache_control.max_age = max(0, int((until - now).total_seconds()))
+        response.expires = until
+    return response
+
+def _board_data(store, key, boards=None):
+    """Returns the cached upstream data for a board key, if any.
+
+    Args:
+        store (BoardStore): The board store.
+        key (tuple or None): The board key.
+        boards (dict, optional): Boards too large for the store, by key, used instead of it.
+
+    Returns:
+        dict or None: The board data.
+    """
+    if key and boards and key in boards:
+        return boards[key]
+    entry = store.board(key) if key else None
+    return entry['data'] if entry else None
+
+def materialize_payload(store, installation, now, train_selection=None, boards=None):
+    """Computes and stores one installation's payload from cached boards.
+
+    Never calls upstream; sections whose board is not cached come out empty.
+    The payload's `valid_until` is set from `next_change`.
+
+    Args:
+        store (BoardStore): The board store.
+        installation (Installation): The installation to compute.
+        now (datetime): The current, timezone-aware UK time.
+        train_selection (list, optional): Train departures already picked for it
+                                          (see `build_payload`).
+        boards (dict, optional): Fetched boards the store refused, by key (see `update_board`).
+
+    Returns:
+        dict: The payload.
+    """
+    keys = dict((key[0], key) for key in board_keys(installation))
+    payload = build_payload(
+        installation,
+        _board_data(store, keys.get(BUS), boards),
+        _board_data(store, keys.get(TRAIN), boards),
+        now,
+        train_selection,
+    )
+    payload['valid_until'] = next_change(store, installation, payload, now).isoformat(timespec='seconds')
+    store.put_payload(installation.id, settings_fingerprint(installation), payload)
+    return payload
+
+def select_shared_trains(store, installations, now, boards=None):
+    """Picks train departures for installations sharing a board, a board at a time.
+
+    Installations reading the same train board have their destination and
+    minimum-time filters evaluated together by `project.batch.select_trains`
+    (vectorized with NumPy when it is installed) instead of one loop each.
+    Boards read by a single installation are left to `build_payload`.
+
+    Args:
+        store (BoardStore): The board store.
+        installations (list): The installations being recomputed.
+        now (datetime): The current, timezone-aware UK time.
+        boards (dict, optional): Fetched boards the store refused, by key.
+
+    Returns:
+        dict: Train departure indices by installation primary key.
+    """
+    groups = {}
+    for installation in installations:
+        if installation.train_station:
+            key = (TRAIN, installation.app_id or '', installation.train_station)
+            groups.setdefault(key, []).append(installation)
+    selections = {}
+    for key, members in groups.items():
+        data = _board_data(store, key, boards)
+        if len(members) < 2 or not data or 'departures' not in data:
+            continue
+        selections.update(select_trains(data, members, now, Installation.min_train_time.default.arg))
+    return selections
+
+def recompute_payloads(store, installation_ids, push_ids=(), boards=None):
+    """Recomputes the payloads of several installations in one batch.
+
+    Train departures of installations sharing a board are picked together
+    by `select_shared_trains`. When push mode is enabled, installations in
+    `push_ids` whose payload differs from the one last pushed to them (as
+    recorded in `Installation.pushed_hash`, so by any process) are pushed to
+    their TRMNL webhook.
+
+    Args:
+        store (BoardStore): The board store.
+        installation_ids (iterable): Primary keys of the installations to recompute.
+        push_ids (set, optional): Primary keys of the installations that may be pushed.
+        boards (dict, optional): Fetched boards too large for the store, by key,
+                                 to compute from directly (see `update_board`).
+
+    Returns:
+        int: The number of payloads recomputed.
+    """
+    installation_ids = list(installation_ids)
+    if not installation_ids:
+        return 0
+    now = _uk_now()
+    installations = Installation.query.filter(Installation.id.in_(installation_ids)).all()
+    selections = select_shared_trains(store, installations, now, boards)
+    changed = []
+    for installation in installations:
+        payload = materialize_payload(store, installation, now, selections.get(installation.id), boards)
+        if installation.id in push_ids and store.payload_hash(installation.id) != installation.pushed_hash:
+            changed.append((installation, payload))
+    push_payloads(store, changed)
+    return len(installations)
+
+def push_payloads(store, changed):
+    """Queues changed payloads for delivery to TRMNL webhooks in push mode.
+
+    Does nothing unless `PUSH_ENABLED` is set. Installations without a
+    webhook URL (see `project.push.webhook_url`) are skipped. The hash of
+    each queued payload is recorded as the installation's `pushed_hash`.
+
+    Args:
+        store (BoardStore): The board store.
+        changed (list): `(installation, payload)` pairs whose payload changed.
+
+    Returns:
+        int: The number of pushes queued.
+    """
+    pusher = get_pusher(current_app)
+    if pusher is None:
+        return 0
+    batch = []
+    for installation, payload in changed:
+        url = webhook_url(current_app, installation)
+        if url:
+            batch.append((installation.id, url, payload))
+            installation.pushed_hash = store.payload_hash(installation.id)
+    if batch:
+        db.session.commit()
+    pusher.dispatch(batch)
+    return len(batch)
+
+def load_subscriptions(store):
+    """Seeds the subscription map from every configured installation, once.
+
+    Args:
+        store (BoardStore): The board store.
+
+    Returns:
+        None
+    """
+    if store.loaded:
+        return
+    configured = Installation.query.filter(
+        db.or_(Installation.bus_stop.isnot(None), Installation.train_station.isnot(None))
+    )
+    for installation in configured:
+        store.subscribe(installation.id, board_keys(installation))
+    store.loaded = True
+
+def update_board(store, key, installation):
+    """Brings one board up to date, from upstream or from the node refreshing it.
+
+    Without leases every node fetches its own boards. With `LEASES_ENABLED`,
+    a board another node has already published is read from the database,
+    and the board is only fetched if this node gets its refresh lease;
+    otherwise the newest copy available keeps being served. A board too
+    large for the store's byte budget is not cached; it is handed back for
+    the caller to compute payloads from directly.
+
+    Args:
+        store (BoardStore): The board store.
+        key (tuple): The board key.
+        installation (Installation): The installation whose credentials to fetch with.
+
+    Returns:
+        tuple: `(source, refused)`. `source` is 'upstream' if the board was
+               fetched by this process, 'shared' if another node's copy was
+               used, or None if the board did not change; `refused` is the
+               new board's data if the store could not hold it, else None.
+    """
+    leases = get_leases(current_app)
+    metrics = get_metrics(current_app)
+    if leases is not None:
+        shared = leases.read(key)
+        overdue = store.clock() - shared['expires_at'] if shared else float('inf')
+        if overdue < 0 or not leases.acquire(key, overdue):
+            local = store.board(key)
+            if shared is None or (local is not None and local['fetched_at'] >= shared['fetched_at']):
+                metrics.incr('board_updates_total', source='deferred')
+                return None, None
+            entry = store.put_board(key, shared['data'], fetched_at=shared['fetched_at'],
+                                    ttl=shared['expires_at'] - shared['fetched_at'])
+            metrics.incr('board_updates_total', source='shared')
+            return 'shared', shared['data'] if entry is None else None
+
+    kind, _, code = key
+    fetch = fetch_bus_data if kind == BUS else fetch_train_data
+    data = fetch(installation.app_id, installation.app_key, code)
+    if data is None:
+        if leases is not None:
+            leases.release(key)
+        return None, None
+    ttl = board_lifetime(
+        kind, data, _uk_now(), store.ttl,
+        current_app.config.get('QUIET_BOARD_TTL_SECONDS', store.ttl),
+    )
+    entry = store.put_board(key, data, ttl=ttl)
+    if entry is None:
+        logger.warning("Board %s is larger than BOARD_CACHE_MAX_BYTES and was not cached", ':'.join(key))
+    if leases is not None:
+        fetched_at = store.clock()
+        leases.publish(key, entry or {'data': data, 'fetched_at': fetched_at, 'expires_at': fetched_at + ttl})
+    metrics.incr('board_updates_total', source='upstream')
+    return 'upstream', data if entry is None else None
+
+def refresh_boards(store, keys, installation):
+    """Fetches boards from upstream and recomputes every dependent installation.
+
+    If a fetch fails the previously cached board, if any, keeps being served.
+    Only subscribers of boards this process fetched from upstream are pushed
+    (see `recompute_payloads`), so a board picked up from another node is
+    pushed once, by the node that fetched it. A snapshot of the store is
+    written afterwards if one is due.
+
+    Args:
+        store (BoardStore): The board store.
+        keys (list): The board keys to refresh.
+        installation (Installation): The installation whose credentials to fetch with.
+
+    Returns:
+        int: The number of payloads recomputed.
+    """
+    dependents = set()
+    fetched = set()
+    refused = {}
+    for key in keys:
+        source, data = update_board(store, key, installation)
+        if source:
+            dependents |= store.subscribers(key)
+        if source == 'upstream':
+            fetched |= store.subscribers(key)
+        if data is not None:
+            refused[key] = data
+    recomputed = recompute_payloads(store, dependents, fetched, refused)
+    maybe_snapshot(store, current_app.config.get('SNAPSHOT_PATH'),
+                   current_app.config.get('SNAPSHOT_INTERVAL_SECONDS', 60))
+    return recomputed
+
+def refresh_all_boards(store, force=False):
+    """Refreshes every subscribed board, e.g. from a scheduled job.
+
+    Args:
+        store (BoardStore): The board store.
+        force (bool): Refresh boards that are still inside their TTL too.
+
+    Returns:
+        int: The number of boards refreshed.
+    """
+    load_subscriptions(store)
+    refreshed = 0
+    for key in list(store.subscriptions):
+        if not force and store.is_fresh(key):
+            continue
+        subscribers = store.subscribers(key)
+        installation = db.session.get(Installation, min(subscribers)) if subscribers else None
+        if installation is None:
+            continue
+        refresh_boards(store, [key], installation)
+        refreshed += 1
+    return refreshed
+
+@api.route('/api/data', methods=['GET'])
+@token_required
+def get_data(installation):
+    """API endpoint to retrieve formatted bus and train data for the plugin.
+
+    This route serves the installation's materialized payload. Boards that
+    are missing or past their TTL are fetched first, which recomputes the
+    payload of every installation subscribed to them in one batch. The payload
+    is filtered (e.g., by operator, direction, minimum time) and formatted for
+    the TRMNL device. Polls arriving within the installation's minimum refresh
+    window get the previously served payload without any of that work.
+
+    The payload carries a `valid_until` time before which it cannot change,
+    also sent as `Cache-Control: max-age` and `Expires` so that pollers and
+    caches can skip refreshes; a stored payload past it is recomputed.
+
+    Args:
+        installation (Installation): The current installation object (injected by decorator).
+
+    Returns:
+        Response: A JSON response containing lists of bus and train departures.
+    """
+    store = get_board_store(current_app)
+    metrics = get_metrics(current_app)
+    fingerprint = settings_fingerprint(installation)
+    window = (
+        installation.min_refresh_seconds
+        if installation.min_refresh_seconds is not None
+        else current_app.config.get('MIN_REFRESH_SECONDS', 0)
+    )
+    if window:
+        payload = store.recently_served(installation.id, fingerprint, window)
+        if payload is not None:
+            metrics.incr('api_throttled_total', reason='min_refresh')
+            return _payload_response(payload, _uk_now())
+
+    load_subscriptions(store)
+    keys = board_keys(installation)
+    store.subscribe(installation.id, keys)
+
+    stale = [key for key in keys if not store.is_fresh(key)]
+    if stale:
+        refresh_boards(store, stale, installation)
+
+    now = _uk_now()
+    payload = store.payload(installation.id, fingerprint)
+    if payload is None or (valid_until(payload) or now) <= now:
+        payload = materialize_payload(store, installation, now)
+    store.mark_served(installation.id)
+    metrics.incr('api_polls_total', outcome='refreshed' if stale else 'cached')
+    return _payload_response(payload, now)
+
+@api.route('/metrics', methods=['GET'])
+@admin_required
+def metrics_endpoint():
+    """Exposes this worker's counters in the Prometheus text format.
+
+    Requires the `ADMIN_TOKEN` bearer token.
+
+    Returns:
+        Response: A plain-text response with one line per counter.
+    """
+    return current_app.response_class(
+        get_metrics(current_app).render(), mimetype='text/plain; version=0.0.4'
+    )
+
+@api.route('/admin/caches', methods=['GET'])
+@admin_required
+def cache_stats():
+    """Reports this worker's caches: size, budget, entry count, hit ratio and largest keys.
+
+    Requires the `ADMIN_TOKEN` bearer token.
+
+    Query Args:
+        top (int): How many of the largest entries to list per cache. Defaults to 5.
+
+    Returns:
+        Response: A JSON object with the worker's `pid` and a `caches` list.
+    """
+    top = min(request.args.get('top', 5, type=int), 100)
+    return jsonify({'pid': os.getpid(), 'caches': [cache.stats(top) for cache in get_caches(current_app)]})
@@ -0,0 +1,87 @@
+import threading
+
+_EXTENSION_KEY = 'metrics'
+
+
+class Metrics:
+    """Process-local counters exposed in the Prometheus text format.
+
+    Counters are identified by a name and an optional set of labels, e.g.
+    ``metrics.incr('api_throttled_total', reason='rate_limit')``. Values are
+    per worker process; a scraper sums them across workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._counters = {}
+
+    def incr(self, name, amount=1, **labels):
+        """Increments a counter.
+
+        Args:
+            name (str): The metric name.
+            amount (int or float): How much to add. Defaults to 1.
+            **labels: Label names and values identifying the series.
+
+        Returns:
+            None
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def value(self, name, **labels):
+        """Returns the current value of a counter.
+
+        Args:
+            name (str): The metric name.
+            **labels: Label names and values identifying the series.
+
+        Returns:
+            int or float: The counter value, 0 if it was never incremented.
+        """
+        with self.lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        """Renders every counter in the Prometheus text exposition format.
+
+        Returns:
+            str: One `name{labels} value` line per series.
+        """
+        with self.lock:
+            items = sorted(self._counters.items())
+        lines = []
+        for (name, labels), value in items:
+            if labels:
+                label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{name}{{{label_str}}} {value}')
+            else:
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Creates the metrics registry for `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        Metrics: The new registry.
+    """
+    metrics = Metrics()
+    app.extensions[_EXTENSION_KEY] = metrics
+    return metrics
+
+
+def get_metrics(app):
+    """Returns the metrics registry of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        Metrics: The app's registry.
+    """
+    return app.extensions[_EXTENSION_KEY]
@@ -1,7 +1,16 @@
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+def utcnow():
+    """Returns the current UTC time as a naive datetime, as stored in the database.
+
+    Returns:
+        datetime: The current UTC time without tzinfo.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(db.Model):
     """Represents a user in the system.
 
@@ -36,12 +45,32 @@ class Installation(db.Model):
         min_train_time (int): The minimum time (in minutes) for a train departure to be displayed. Defaults to 30.
         app_id (str): The TransportAPI Application ID.
         app_key (str): The TransportAPI Application Key.
+        poll_rate_per_minute (int): Sustained `/api/data` requests per minute allowed for this
+                                    installation's token. Uses `RATE_LIMIT_PER_MINUTE` if None.
+        poll_burst (int): Burst size of this installation's rate limit. Uses `RATE_LIMIT_BURST` if None.
+        pushed_hash (str): `payload_hash` of the payload last pushed to the installation's webhook,
+                           kept in the database so any process can tell whether a payload is new.
+        min_refresh_seconds (int): Polls within this many seconds of the last one get the previous
+                                   payload without recomputation. Uses `MIN_REFRESH_SECONDS` if None.
+        created_at (datetime): When the row was created (UTC). Pending installs older than
+                               `INSTALL_STATE_TTL_SECONDS` are deleted by the install sweeper.
     """
+    __table_args__ = (
+        # Only pending installs are indexed, so the sweeper's scan stays small
+        # however many finished installations there are.
+        db.Index(
+            'ix_installation_pending_created_at', 'created_at',
+            sqlite_where=db.text('install_state IS NOT NULL'),
+            postgresql_where=db.text('install_state IS NOT NULL'),
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     trmnl_installation_id = db.Column(db.String(80), unique=True, nullable=True)
     install_state = db.Column(db.String(80), unique=True, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    access_token = db.Column(db.String(200), nullable=True)
+    access_token = db.Column(db.String(200), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
 
     # Plugin-specific settings
     bus_stop = db.Column(db.String(100))
@@ -51,3 +80,47 @@ class Installation(db.Model):
     min_train_time = db.Column(db.Integer, default=30)
     app_id = db.Column(db.String(100))
     app_key = db.Column(db.String(100))
+
+    # Operator-controlled polling limits
+    poll_rate_per_minute = db.Column(db.Integer, nullable=True)
+    poll_burst = db.Column(db.Integer, nullable=True)
+    min_refresh_seconds = db.Column(db.Integer, nullable=True)
+
+    # Push mode
+    pushed_hash = db.Column(db.String(64), nullable=True)
+
+class Node(db.Model):
+    """Represents an app node taking part in board refresh ownership.
+
+    Nodes heartbeat into this table; the ones seen within
+    `NODE_TIMEOUT_SECONDS` make up the consistent-hashing ring that decides
+    which node refreshes which board.
+
+    Attributes:
+        name (str): The node's `NODE_ID` (primary key).
+        heartbeat_at (float): Wall-clock time of the node's last heartbeat.
+    """
+    name = db.Column(db.String(200), primary_key=True)
+    heartbeat_at = db.Column(db.Float, nullable=False)
+
+class BoardLease(db.Model):
+    """Represents the refresh lease and shared copy of one upstream board.
+
+    Only the node holding an unexpired lease fetches the board from upstream;
+    it publishes the result here so every other node can read it instead of
+    fetching it again.
+
+    Attributes:
+        key (str): The board key, `kind:app_id:code` (primary key).
+        holder (str): `NODE_ID/pid` of the worker process that last held the lease.
+        lease_expires_at (float): Wall-clock time the lease lapses; 0 once released.
+        data (str): The last published upstream response, as JSON.
+        fetched_at (float): Wall-clock time `data` was fetched.
+        expires_at (float): Wall-clock time `data` goes stale.
+    """
+    key = db.Column(db.String(300), primary_key=True)
+    holder = db.Column(db.String(200), nullable=True)
+    lease_expires_at = db.Column(db.Float, nullable=False, default=0.0)
+    data = db.Column(db.Text, nullable=True)
+    fetched_at = db.Column(db.Float, nullable=True)
+    expires_at = db.Column(db.Float, nullable=True)
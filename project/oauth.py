@@ -1,14 +1,84 @@
-from authlib.integrations.flask_client import OAuth
 import os
+from flask import current_app
 
-oauth = OAuth()
+_EXTENSION_KEY = 'trmnl_oauth'
+
+
+class LazyOAuth:
+    """Proxy around Authlib's OAuth registry that defers all of its setup.
+
+    Importing Authlib pulls in `cryptography` and a large part of its client
+    machinery, which is only ever needed by the install/callback flow. This
+    proxy keeps that cost out of application start-up: Authlib is imported and
+    the TRMNL provider is registered the first time an attribute (e.g.
+    `oauth.trmnl`) is accessed inside an application context.
+    """
+
+    def __init__(self):
+        self._registry = None
+
+    def _load(self):
+        """Imports Authlib, creating the shared registry on first use.
+
+        Returns:
+            authlib.integrations.flask_client.OAuth: The underlying registry.
+        """
+        if self._registry is None:
+            from authlib.integrations.flask_client import OAuth
+            self._registry = OAuth()
+        return self._registry
+
+    def _ensure_registered(self, app):
+        """Binds the registry to `app` and registers TRMNL, once per app.
+
+        Args:
+            app (Flask): The application that requested OAuth.
+
+        Returns:
+            authlib.integrations.flask_client.OAuth: The registry bound to `app`.
+        """
+        registry = self._load()
+        state = app.extensions.get(_EXTENSION_KEY)
+        if state is None:
+            raise RuntimeError('OAuth has not been enabled for this application.')
+        if not state['registered'] or registry.app is not app:
+            registry.init_app(app)
+            registry.register(
+                name='trmnl',
+                client_id=os.environ.get('TRMNL_CLIENT_ID'),
+                client_secret=os.environ.get('TRMNL_CLIENT_SECRET'),
+                access_token_url='https://usetrmnl.com/api/oauth/token',
+                authorize_url='https://usetrmnl.com/api/oauth/authorize',
+                api_base_url='https://usetrmnl.com/api/',
+                client_kwargs={'scope': 'read write'},
+            )
+            state['registered'] = True
+        return registry
+
+    def __getattr__(self, name):
+        """Resolves registry attributes, performing deferred setup if needed.
+
+        Args:
+            name (str): The attribute being looked up (usually a provider name).
+
+        Returns:
+            object: The attribute of the underlying Authlib registry.
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+        registry = self._ensure_registered(current_app._get_current_object())
+        return getattr(registry, name)
+
+
+oauth = LazyOAuth()
 
 def init_oauth(app):
-    """Initialize the OAuth extension with the TRMNL provider.
+    """Enable the OAuth extension with the TRMNL provider for `app`.
 
-    This function configures the `authlib` OAuth registry with the TRMNL client details.
-    It reads `TRMNL_CLIENT_ID` and `TRMNL_CLIENT_SECRET` from environment variables.
-    It sets up the access token URL, authorize URL, base API URL, and scopes.
+    The `authlib` OAuth registry itself is configured lazily by `LazyOAuth` the
+    first time it is used. When that happens it reads `TRMNL_CLIENT_ID` and
+    `TRMNL_CLIENT_SECRET` from environment variables and sets up the access
+    token URL, authorize URL, base API URL, and scopes.
 
     Args:
         app (Flask): The Flask application instance to initialize OAuth for.
@@ -16,13 +86,4 @@ def init_oauth(app):
     Returns:
         None
     """
-    oauth.init_app(app)
-    oauth.register(
-        name='trmnl',
-        client_id=os.environ.get('TRMNL_CLIENT_ID'),
-        client_secret=os.environ.get('TRMNL_CLIENT_SECRET'),
-        access_token_url='https://usetrmnl.com/api/oauth/token',
-        authorize_url='https://usetrmnl.com/api/oauth/authorize',
-        api_base_url='https://usetrmnl.com/api/',
-        client_kwargs={'scope': 'read write'},
-    )
+    app.extensions[_EXTENSION_KEY] = {'registered': False}
@@ -0,0 +1,231 @@
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Token'
+_SALT = 'trmnl-profile'
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def _signer(app):
+    """Returns the signer used for profiling request tokens.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        itsdangerous.TimestampSigner: A signer keyed with the app's `SECRET_KEY`.
+    """
+    from itsdangerous import TimestampSigner
+    return TimestampSigner(app.config['SECRET_KEY'], salt=_SALT)
+
+
+def make_profile_token(app):
+    """Creates a signed value for the `X-Profile-Token` header.
+
+    A request carrying a valid token is always profiled, whatever the
+    sampling configuration. Tokens expire after `PROFILE_TOKEN_MAX_AGE`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        str: The header value.
+    """
+    return _signer(app).sign('profile').decode()
+
+
+def _has_valid_token(app):
+    """Checks the current request for a valid, unexpired profiling token.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        bool: True if the request asked to be profiled.
+    """
+    token = request.headers.get(PROFILE_HEADER)
+    if not token:
+        return False
+    from itsdangerous import BadSignature
+    try:
+        _signer(app).unsign(token, max_age=app.config.get('PROFILE_TOKEN_MAX_AGE', 3600))
+    except BadSignature:
+        return False
+    return True
+
+
+def _dump_path(app, response):
+    """Builds the file a request's profile is written to.
+
+    Dumps are grouped in one directory per endpoint and their names are
+    tagged with the installation and its stop/station when known.
+
+    Args:
+        app (Flask): The Flask application instance.
+        response (Response): The response being returned.
+
+    Returns:
+        str: The destination path.
+    """
+    route = _UNSAFE.sub('_', request.endpoint or 'unknown')
+    installation = g.get('installation')
+    tags = [f'{time.time():.6f}', str(os.getpid()), str(response.status_code)]
+    if installation is not None:
+        tags += [
+            f'i{installation.id}',
+            f'bus-{installation.bus_stop or "none"}',
+            f'train-{installation.train_station or "none"}',
+        ]
+    directory = os.path.join(app.config.get('PROFILE_DIR', 'profiles'), route)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, _UNSAFE.sub('_', '-'.join(tags)) + '.prof')
+
+
+def init_profiling(app):
+    """Installs the opt-in request profiler on `app`.
+
+    When `PROFILE_ENABLED` is set, a `PROFILE_SAMPLE_RATE` fraction of requests
+    is run under cProfile. Requests carrying a valid signed `X-Profile-Token`
+    header (see `make_profile_token`) are always profiled. Each profile is
+    written in pstats format to `PROFILE_DIR/<endpoint>/`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        None
+    """
+    enabled = app.config.get('PROFILE_ENABLED', False)
+    rate = app.config.get('PROFILE_SAMPLE_RATE', 0.01)
+
+    @app.before_request
+    def start_profiler():
+        """Starts profiling the request if it is sampled or asked for."""
+        if (enabled and random.random() < rate) or _has_valid_token(app):
+            g._profiler = cProfile.Profile()
+            g._profiler.enable()
+
+    @app.after_request
+    def stop_profiler(response):
+        """Stops the request's profiler, if any, and writes its dump.
+
+        A dump that cannot be written is logged and dropped; the request is
+        never failed because of profiling.
+
+        Args:
+            response (Response): The response being returned.
+
+        Returns:
+            Response: The unchanged response.
+        """
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            try:
+                profiler.dump_stats(_dump_path(app, response))
+            except OSError as e:
+                logger.warning("Could not write request profile: %s", e)
+        return response
+
+    @app.teardown_request
+    def discard_profiler(exc):
+        """Makes sure a profiler is never left running after a failed request.
+
+        Args:
+            exc (Exception or None): The exception that ended the request, if any.
+        """
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+
+def _label(func):
+    """Formats a pstats function key as a flamegraph frame name.
+
+    Args:
+        func (tuple): `(filename, line, name)` as used by pstats.
+
+    Returns:
+        str: A frame name without the separators used by collapsed stacks.
+    """
+    filename, line, name = func
+    if filename == '~':
+        frame = name
+    else:
+        frame = f'{os.path.basename(filename)}:{line}:{name}'
+    return frame.replace(';', ',').replace(' ', '_')
+
+
+def collapse_stats(stats, prefix=(), max_depth=64):
+    """Converts pstats data to collapsed stacks (`a;b;c weight`).
+
+    cProfile records caller/callee edges rather than full stacks, so each
+    function's own time is attributed up the call graph, split between its
+    callers in proportion to the time spent under each of them.
+
+    Args:
+        stats (pstats.Stats): The (possibly merged) profile data.
+        prefix (tuple): Frames to prepend to every stack, e.g. the route.
+        max_depth (int): Stacks are cut off at this many frames.
+
+    Returns:
+        dict: Stack string -> weight in microseconds.
+    """
+    raw = stats.stats
+    stacks = {}
+
+    def walk(func, weight, path):
+        callers = raw[func][4]
+        parents = [(c, edge[3]) for c, edge in callers.items() if c in raw and c not in path]
+        total = sum(t for _, t in parents)
+        # Stop splitting once a share is negligible to keep large call graphs tractable.
+        if not parents or total <= 0 or len(path) >= max_depth or weight < 1:
+            key = ';'.join(list(prefix) + [_label(f) for f in reversed(path)])
+            stacks[key] = stacks.get(key, 0) + weight
+            return
+        for caller, cumulative in parents:
+            walk(caller, weight * cumulative / total, path + (caller,))
+
+    for func, (_, _, tottime, _, _) in raw.items():
+        if tottime > 0:
+            walk(func, tottime * 1e6, (func,))
+    return stacks
+
+
+def aggregate_profiles(directory, output):
+    """Merges every dump under `directory` into one flamegraph-ready file.
+
+    Dumps are merged per endpoint directory and written as collapsed stacks,
+    one `route;frame;...;frame microseconds` line each, suitable for
+    `flamegraph.pl` or speedscope.
+
+    Args:
+        directory (str): The `PROFILE_DIR` to read.
+        output (str): The collapsed-stack file to write.
+
+    Returns:
+        int: The number of dumps aggregated.
+    """
+    count = 0
+    lines = []
+    for route in sorted(os.listdir(directory)):
+        route_dir = os.path.join(directory, route)
+        if not os.path.isdir(route_dir):
+            continue
+        dumps = [os.path.join(route_dir, name) for name in sorted(os.listdir(route_dir)) if name.endswith('.prof')]
+        if not dumps:
+            continue
+        stacks = collapse_stats(pstats.Stats(*dumps), prefix=(route,))
+        lines += [f'{stack} {round(weight)}' for stack, weight in sorted(stacks.items()) if round(weight) > 0]
+        count += len(dumps)
+    with open(output, 'w') as fh:
+        fh.write('\n'.join(lines) + ('\n' if lines else ''))
+    return count
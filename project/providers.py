@@ -0,0 +1,556 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .clock import uk_now
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_KEY = 'providers'
+
+TRANSPORTAPI_URL = 'https://transportapi.com/v3/uk'
+
+
+class DepartureProvider:
+    """Base class for sources of departure boards.
+
+    A provider answers with a board in the shape of the corresponding
+    TransportAPI response, so the filtering in `build_payload` works the same
+    whichever provider produced it.
+
+    Attributes:
+        name (str): Short identifier used in configuration and logs.
+        needs_credentials (bool): Whether the provider uses the installation's
+                                  TransportAPI App ID and Key.
+    """
+    name = 'base'
+    needs_credentials = True
+
+    def departures(self, app_id, app_key, code):
+        """Fetches the board for a stop or station.
+
+        Args:
+            app_id (str): TransportAPI App ID.
+            app_key (str): TransportAPI App Key.
+            code (str): The stop's ATCO code or station's CRS code.
+
+        Returns:
+            dict or None: The board, or None if it could not be fetched.
+
+        Raises:
+            UpstreamError: If a network lookup failed, classified by cause.
+        """
+        raise NotImplementedError
+
+
+class TransportAPIBusProvider(DepartureProvider):
+    """Bus departures from TransportAPI's `stop_timetables` endpoint.
+
+    Attributes:
+        timeout (float): Request timeout, in seconds.
+        base_url (str): The TransportAPI base URL.
+    """
+    name = 'transportapi'
+
+    def __init__(self, timeout=10.0, base_url=TRANSPORTAPI_URL):
+        self.timeout = timeout
+        self.base_url = base_url
+
+    def departures(self, app_id, app_key, code):
+        """Fetches bus departure data from TransportAPI.
+
+        Args:
+            app_id (str): TransportAPI App ID.
+            app_key (str): TransportAPI App Key.
+            code (str): The ATCO code of the bus stop.
+
+        Returns:
+            dict: The parsed JSON response from the API.
+
+        Raises:
+            UpstreamError: If the request fails, classified by cause.
+        """
+        from .upstream import request_json
+
+        url = f"{self.base_url}/bus/stop_timetables/{code}.json"
+        params = {
+            "app_id": app_id,
+            "app_key": app_key,
+            "group": "no", # Don't group by route, just get all? Actually 'no' might not be valid.
+            # "nextbuses": "yes" ?
+            # Examples used default.
+        }
+        return request_json(url, params, self.timeout)
+
+
+class TransportAPITrainProvider(DepartureProvider):
+    """Live train departures from TransportAPI's `station/{code}/live.json` endpoint.
+
+    Attributes:
+        timeout (float): Request timeout, in seconds.
+        base_url (str): The TransportAPI base URL.
+    """
+    name = 'transportapi'
+
+    def __init__(self, timeout=10.0, base_url=TRANSPORTAPI_URL):
+        self.timeout = timeout
+        self.base_url = base_url
+
+    def departures(self, app_id, app_key, code):
+        """Fetches live train departure data from TransportAPI.
+
+        Args:
+            app_id (str): TransportAPI App ID.
+            app_key (str): TransportAPI App Key.
+            code (str): The CRS code of the train station.
+
+        Returns:
+            dict: The parsed JSON response from the API.
+
+        Raises:
+            UpstreamError: If the request fails, classified by cause.
+        """
+        from .upstream import request_json
+
+        url = f"{self.base_url}/train/station/{code}/live.json"
+        params = {
+            "app_id": app_id,
+            "app_key": app_key,
+            "darwin": "true",
+            "train_status": "passenger"
+        }
+        return request_json(url, params, self.timeout)
+
+
+def _darwin_status(etd):
+    """Maps a Darwin estimated departure (`etd`) to a TransportAPI status.
+
+    Args:
+        etd (str): 'On time', 'Cancelled', 'Delayed' or an `HH:MM` estimate.
+
+    Returns:
+        str: 'ON TIME', 'CANCELLED', 'LATE' or 'NO REPORT'.
+    """
+    etd = (etd or '').strip().lower()
+    if etd == 'on time':
+        return 'ON TIME'
+    if etd == 'cancelled':
+        return 'CANCELLED'
+    if etd == 'delayed' or ':' in etd:
+        return 'LATE'
+    return 'NO REPORT'
+
+
+class DarwinTrainProvider(DepartureProvider):
+    """Live train departures from a Darwin departure board JSON feed.
+
+    Speaks the JSON shape of the common Darwin (LDBWS) REST proxies, such as
+    Huxley: `trainServices` entries with `std`, `etd`, `platform`, `operator`
+    and `destination`. Boards are converted to TransportAPI's `live.json`
+    shape. Uses the feed's own access token rather than the installation's
+    TransportAPI credentials.
+
+    Attributes:
+        url (str): Board URL template with a `{code}` placeholder.
+        token (str or None): Darwin access token, sent as `accessToken`.
+        timeout (float): Request timeout, in seconds.
+    """
+    name = 'darwin'
+    needs_credentials = False
+
+    def __init__(self, url, token=None, timeout=10.0):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def departures(self, app_id, app_key, code):
+        """Fetches a station's departure board from the Darwin feed.
+
+        Args:
+            app_id (str): Unused.
+            app_key (str): Unused.
+            code (str): The CRS code of the train station.
+
+        Returns:
+            dict: A `live.json`-shaped board.
+
+        Raises:
+            UpstreamError: If the request fails, classified by cause.
+        """
+        from .upstream import request_json
+
+        params = {'accessToken': self.token} if self.token else {}
+        board = request_json(self.url.format(code=code), params, self.timeout)
+        departures = []
+        for service in board.get('trainServices') or []:
+            etd = service.get('etd') or ''
+            destinations = service.get('destination') or [{}]
+            departures.append({
+                "destination_name": ' & '.join(d.get('locationName', '') for d in destinations),
+                "aimed_departure_time": service.get('std'),
+                "expected_departure_time": etd if ':' in etd else service.get('std'),
+                "status": _darwin_status(etd),
+                "platform": service.get('platform'),
+                "operator_name": service.get('operator', ''),
+            })
+        return {"station_code": code, "source": "darwin", "departures": {"all": departures}}
+
+
+class LatencyTracker:
+    """Recent latencies of a provider, for choosing when to hedge.
+
+    Attributes:
+        window (int): How many recent samples are kept.
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Adds a latency sample.
+
+        Args:
+            seconds (float): How long a request took.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, min_samples=10):
+        """Returns a quantile of the recent latencies.
+
+        Args:
+            q (float): The quantile, e.g. 0.9.
+            min_samples (int): Fewer samples than this give no answer.
+
+        Returns:
+            float or None: The latency in seconds, or None if there is too little data.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgedProvider(DepartureProvider):
+    """Sends a backup request to a secondary provider when the primary is slow.
+
+    The primary is asked first. If it has not answered after its recent p90
+    latency (clamped to `min_delay`..`max_delay`; `max_delay` until enough
+    samples exist), counted from when the call starts running rather than
+    from when it was queued, or fails before then, the secondary is asked too
+    and the first valid board wins. Definitive primary errors (a rejected App
+    Key or an unknown code) are raised without hedging. Hedges are paid for
+    from a budget: every request earns `budget` of a hedge (up to `burst`
+    saved up), so at most about `budget` * 100% extra upstream requests are
+    made.
+
+    A losing call is cancelled if it has not started. A running primary
+    cannot be, so it is left to finish and its latency is still recorded; no
+    hedge is sent while `max_abandoned` such calls are outstanding, so slow
+    primaries cannot fill the pool.
+
+    Attributes:
+        primary (DepartureProvider): The preferred provider.
+        secondary (DepartureProvider): The backup provider.
+        budget (float): Hedges allowed per primary request.
+        latency (LatencyTracker): The primary's recent latencies.
+        max_abandoned (int): Losing calls allowed to run on after a request returns.
+    """
+    name = 'hedged'
+
+    def __init__(self, primary, secondary, budget=0.1, burst=5.0, min_delay=0.05, max_delay=2.0,
+                 max_workers=8, max_abandoned=None, on_result=None, clock=time.monotonic):
+        self.primary = primary
+        self.secondary = secondary
+        self.needs_credentials = primary.needs_credentials
+        self.budget = budget
+        self.burst = burst
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_abandoned = max_workers // 2 if max_abandoned is None else max_abandoned
+        self.on_result = on_result
+        self.clock = clock
+        self.latency = LatencyTracker()
+        self._tokens = burst
+        self._abandoned = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trmnl-hedge')
+
+    def hedge_delay(self):
+        """Returns how long to wait for the primary before hedging.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        p90 = self.latency.quantile(0.9)
+        if p90 is None:
+            return self.max_delay
+        return min(max(p90, self.min_delay), self.max_delay)
+
+    def _timed(self, started, app_id, app_key, code):
+        """Calls the primary and records how long it took, whatever the outcome.
+
+        Args:
+            started (threading.Event): Set once the call starts running.
+            app_id (str): TransportAPI App ID.
+            app_key (str): TransportAPI App Key.
+            code (str): The stop or station code.
+
+        Returns:
+            dict or None: The primary's board.
+        """
+        started.set()
+        began = self.clock()
+        try:
+            return self.primary.departures(app_id, app_key, code)
+        finally:
+            self.latency.record(self.clock() - began)
+
+    def _spend(self):
+        """Takes one hedge from the budget, if there is one and the pool has room.
+
+        Returns:
+            bool: True if a hedge may be sent.
+        """
+        with self._lock:
+            if self._tokens >= 1 and self._abandoned < self.max_abandoned:
+                self._tokens -= 1
+                return True
+            return False
+
+    def _abandon(self, future):
+        """Cancels a losing call or, if it is already running, counts it until it ends.
+
+        Args:
+            future (Future): The losing call.
+
+        Returns:
+            None
+        """
+        if future.cancel() or future.done():
+            return
+        with self._lock:
+            self._abandoned += 1
+
+        def release(_):
+            with self._lock:
+                self._abandoned -= 1
+
+        future.add_done_callback(release)
+
+    def _report(self, outcome):
+        """Passes a request outcome to the `on_result` callback, if any.
+
+        Args:
+            outcome (str): 'primary', 'primary_failed', 'hedged_primary',
+                           'hedged_secondary', 'hedged_failed' or 'budget_exhausted'.
+
+        Returns:
+            None
+        """
+        if self.on_result is not None:
+            self.on_result(outcome)
+
+    def departures(self, app_id, app_key, code):
+        """Returns the first valid board from the primary or, if it is slow, the secondary.
+
+        Args:
+            app_id (str): TransportAPI App ID.
+            app_key (str): TransportAPI App Key.
+            code (str): The stop or station code.
+
+        Returns:
+            dict or None: The winning board.
+
+        Raises:
+            UpstreamError: If the primary failed definitively, or every provider
+                           asked failed; the primary's error is raised.
+        """
+        from .upstream import AUTH, NOT_FOUND, UpstreamError
+
+        def definitive(future):
+            error = future.exception() if future.done() else None
+            return isinstance(error, UpstreamError) and error.kind in (AUTH, NOT_FOUND)
+
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.budget)
+        started = threading.Event()
+        primary = self._executor.submit(self._timed, started, app_id, app_key, code)
+        started.wait()
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None and primary.result() is not None:
+            self._report('primary')
+            return primary.result()
+        if definitive(primary):
+            self._report('primary_failed')
+            return primary.result()
+        if not self._spend():
+            self._report('budget_exhausted')
+            return primary.result()
+
+        secondary = self._executor.submit(self.secondary.departures, app_id, app_key, code)
+        names = {primary: 'hedged_primary', secondary: 'hedged_secondary'}
+        pending = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if primary in done and definitive(primary):
+                for future in pending:
+                    self._abandon(future)
+                self._report('primary_failed')
+                return primary.result()
+            for future in done:
+                if future.exception() is None and future.result() is not None:
+                    for loser in pending:
+                        self._abandon(loser)
+                    self._report(names[future])
+                    return future.result()
+        self._report('hedged_failed')
+        return primary.result()
+
+
+class StaticTimetableProvider(DepartureProvider):
+    """Scheduled bus departures answered from a local `TimetableStore`.
+
+    No network is used for stops the feed covers. Stops it does not cover,
+    and stops listed in `live_stops`, are delegated to `fallback` (normally
+    TransportAPI) when the installation has credentials.
+
+    Attributes:
+        store (TimetableStore): The imported timetable.
+        fallback (DepartureProvider or None): Provider for uncovered or live stops.
+        live_stops (frozenset): ATCO codes that should always use `fallback`.
+        limit (int): How many departures to return per stop.
+    """
+    name = 'static'
+    needs_credentials = False
+
+    def __init__(self, store, fallback=None, live_stops=(), limit=20, clock=uk_now):
+        self.store = store
+        self.fallback = fallback
+        self.live_stops = frozenset(live_stops)
+        self.limit = limit
+        self.clock = clock
+
+    def departures(self, app_id, app_key, code):
+        """Returns the next departures from a stop, preferring the local timetable.
+
+        Args:
+            app_id (str): TransportAPI App ID, used only by the fallback.
+            app_key (str): TransportAPI App Key, used only by the fallback.
+            code (str): The ATCO code of the bus stop.
+
+        Returns:
+            dict or None: A `stop_timetables`-shaped board, or None if neither
+                          the timetable nor the fallback can answer.
+
+        Raises:
+            UpstreamError: If the fallback was used and failed.
+        """
+        from .timetable import TimetableError
+
+        try:
+            covered = code not in self.live_stops and self.store.has_stop(code)
+        except TimetableError as e:
+            logger.warning("Error reading timetable: %s", e)
+            covered = False
+        if covered:
+            grouped = {}
+            for when, line, direction, operator in self.store.next_departures(code, self.clock(), self.limit):
+                grouped.setdefault(line, []).append({
+                    "line_name": line,
+                    "direction": direction,
+                    "aimed_departure_time": when.strftime("%H:%M"),
+                    "operator_name": operator,
+                })
+            return {"atcocode": code, "source": "static", "departures": grouped}
+        if self.fallback is None or (self.fallback.needs_credentials and not (app_id and app_key)):
+            return None
+        return self.fallback.departures(app_id, app_key, code)
+
+
+def init_providers(app, metrics=None):
+    """Builds the departure providers configured for `app`.
+
+    `BUS_PROVIDER` selects the bus provider: 'transportapi' (default) or
+    'static', which answers from the store at `TIMETABLE_PATH` and falls back
+    to TransportAPI for stops the feed does not cover or that are listed in
+    `LIVE_BUS_STOPS`. Trains come from TransportAPI; with
+    `TRAIN_SECONDARY = 'darwin'`, slow requests are hedged to the Darwin feed
+    at `DARWIN_URL`.
+
+    Args:
+        app (Flask): The Flask application instance.
+        metrics (Metrics, optional): Registry that counts hedging outcomes in `train_hedge_total`.
+
+    Returns:
+        dict: The providers, keyed by board kind.
+
+    Raises:
+        ValueError: If `BUS_PROVIDER` or `TRAIN_SECONDARY` is unknown, or the
+                    Darwin feed is selected without a `DARWIN_URL`.
+    """
+    timeout = app.config.get('UPSTREAM_TIMEOUT_SECONDS', 10.0)
+    base_url = app.config.get('TRANSPORTAPI_URL') or TRANSPORTAPI_URL
+    bus = TransportAPIBusProvider(timeout=timeout, base_url=base_url)
+    choice = app.config.get('BUS_PROVIDER', 'transportapi')
+    if choice == 'static':
+        from .timetable import TimetableStore
+        bus = StaticTimetableProvider(
+            TimetableStore(app.config['TIMETABLE_PATH']),
+            fallback=bus,
+            live_stops=app.config.get('LIVE_BUS_STOPS', ()),
+            limit=app.config.get('TIMETABLE_DEPARTURE_LIMIT', 20),
+        )
+    elif choice != 'transportapi':
+        raise ValueError(f"Unknown bus provider: {choice!r}")
+
+    train = TransportAPITrainProvider(timeout=timeout, base_url=base_url)
+    secondary = app.config.get('TRAIN_SECONDARY')
+    if secondary == 'darwin':
+        if not app.config.get('DARWIN_URL'):
+            raise ValueError("TRAIN_SECONDARY is 'darwin' but DARWIN_URL is not set")
+        train = HedgedProvider(
+            train,
+            DarwinTrainProvider(app.config['DARWIN_URL'], app.config.get('DARWIN_TOKEN'), timeout=timeout),
+            budget=app.config.get('HEDGE_BUDGET', 0.1),
+            on_result=(lambda outcome: metrics.incr('train_hedge_total', outcome=outcome)) if metrics else None,
+        )
+    elif secondary:
+        raise ValueError(f"Unknown secondary train provider: {secondary!r}")
+    providers = {'bus': bus, 'train': train}
+    app.extensions[_EXTENSION_KEY] = providers
+    return providers
+
+
+def get_provider(app, kind):
+    """Returns the departure provider of `app` for a board kind.
+
+    Args:
+        app (Flask): The Flask application instance.
+        kind (str): The board kind, 'bus' or 'train'.
+
+    Returns:
+        DepartureProvider: The configured provider.
+    """
+    return app.extensions[_EXTENSION_KEY][kind]
+
+
+def set_provider(app, kind, provider):
+    """Replaces the departure provider of `app` for a board kind, e.g. with a stub.
+
+    Args:
+        app (Flask): The Flask application instance.
+        kind (str): The board kind, 'bus' or 'train'.
+        provider (DepartureProvider): The provider to use.
+
+    Returns:
+        None
+    """
+    app.extensions[_EXTENSION_KEY][kind] = provider
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_KEY = 'pusher'
+
+# Statuses worth retrying; any other 4xx means the push itself is wrong.
+_RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class PushDispatcher:
+    """Delivers changed payloads to TRMNL webhooks with bounded concurrency.
+
+    Each batch is spread over a fixed-size thread pool, so at most
+    `max_workers` webhook requests are in flight per worker process however
+    many installations changed. At most one push per installation waits in
+    the queue: a newer payload replaces one that has not been sent yet, and
+    a push still being retried gives up once a newer one is queued. Failed
+    pushes are retried with exponential backoff, honouring `Retry-After`
+    (capped at `max_backoff`).
+
+    Attributes:
+        max_workers (int): Maximum concurrent webhook requests.
+        retries (int): Retries after the first attempt.
+        backoff (float): Initial delay between attempts, in seconds.
+        max_backoff (float): Longest delay between attempts, in seconds.
+        timeout (float): Per-request timeout, in seconds.
+    """
+
+    def __init__(self, max_workers=4, retries=3, backoff=0.5, max_backoff=30.0, timeout=10.0,
+                 on_result=None, sleep=time.sleep):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.on_result = on_result
+        self.sleep = sleep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trmnl-push')
+        self._pending = set()
+        # Installation ID -> (future, url, merge_variables) of pushes not yet started.
+        self._queued = {}
+        self._lock = threading.Lock()
+
+    def _deliver(self, installation_id, url, merge_variables):
+        """Posts one payload, retrying transient failures.
+
+        Args:
+            installation_id (int): The installation's primary key, for logging.
+            url (str): The installation's webhook URL.
+            merge_variables (dict): The payload to deliver.
+
+        Returns:
+            bool: True if the webhook accepted the payload.
+        """
+        import requests
+
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                response = requests.post(url, json={'merge_variables': merge_variables}, timeout=self.timeout)
+                if response.status_code < 400:
+                    self._report('ok' if attempt == 0 else 'ok_after_retry')
+                    return True
+                if response.status_code not in _RETRY_STATUSES:
+                    logger.warning("Push to installation %s rejected: HTTP %s", installation_id, response.status_code)
+                    self._report('rejected')
+                    return False
+                retry_after = response.headers.get('Retry-After')
+            except requests.RequestException as e:
+                logger.info("Push to installation %s failed: %s", installation_id, e)
+            if attempt == self.retries:
+                break
+            if installation_id in self._queued:
+                # A newer payload is waiting; retrying this one would only overwrite it.
+                self._report('superseded')
+                return False
+            try:
+                wait_for = float(retry_after) if retry_after else delay
+            except ValueError:
+                wait_for = delay
+            self._report('retried')
+            self.sleep(min(wait_for, self.max_backoff))
+            delay = min(delay * 2, self.max_backoff)
+        self._report('failed')
+        return False
+
+    def _report(self, outcome):
+        """Passes a delivery outcome to the `on_result` callback, if any.
+
+        Args:
+            outcome (str): 'ok', 'ok_after_retry', 'retried', 'superseded', 'rejected' or 'failed'.
+
+        Returns:
+            None
+        """
+        if self.on_result is not None:
+            self.on_result(outcome)
+
+    def dispatch(self, batch):
+        """Queues a batch of pushes without waiting for them.
+
+        A push for an installation that already has one waiting replaces
+        the waiting payload and shares its future.
+
+        Args:
+            batch (list): `(installation_id, url, merge_variables)` tuples.
+
+        Returns:
+            list: One future per push, resolving to True on success.
+        """
+        futures = []
+        submitted = []
+        with self._lock:
+            for installation_id, url, merge_variables in batch:
+                queued = self._queued.get(installation_id)
+                if queued is not None:
+                    future = queued[0]
+                    self._report('superseded')
+                else:
+                    future = self._executor.submit(self._deliver_latest, installation_id)
+                    self._pending.add(future)
+                    submitted.append(future)
+                self._queued[installation_id] = (future, url, merge_variables)
+                futures.append(future)
+        for future in submitted:
+            future.add_done_callback(self._forget)
+        return futures
+
+    def _deliver_latest(self, installation_id):
+        """Sends the newest payload queued for an installation.
+
+        Args:
+            installation_id (int): The installation's primary key.
+
+        Returns:
+            bool: True if the webhook accepted the payload.
+        """
+        with self._lock:
+            _, url, merge_variables = self._queued.pop(installation_id)
+        return self._deliver(installation_id, url, merge_variables)
+
+    def _forget(self, future):
+        """Drops a finished push from the pending set.
+
+        Args:
+            future (Future): The finished push.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._pending.discard(future)
+
+    def drain(self, timeout=None):
+        """Waits for every queued push to finish.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait.
+
+        Returns:
+            int: The number of pushes still pending afterwards.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return len(not_done)
+
+
+def webhook_url(app, installation):
+    """Returns the webhook an installation's payloads are pushed to.
+
+    Always derived from `PUSH_WEBHOOK_URL_TEMPLATE` and the installation's
+    `trmnl_installation_id`, never from anything a client sent, so pushes
+    can only go to the configured TRMNL host.
+
+    Args:
+        app (Flask): The Flask application instance.
+        installation (Installation): The installation.
+
+    Returns:
+        str or None: The URL, or None if the installation cannot be pushed to.
+    """
+    template = app.config.get('PUSH_WEBHOOK_URL_TEMPLATE')
+    if template and installation.trmnl_installation_id:
+        return template.format(installation_id=installation.trmnl_installation_id)
+    return None
+
+
+def init_push(app, metrics=None):
+    """Creates the push dispatcher for `app` if `PUSH_ENABLED` is set.
+
+    Args:
+        app (Flask): The Flask application instance.
+        metrics (Metrics, optional): Registry that counts outcomes in `push_total`.
+
+    Returns:
+        PushDispatcher or None: The dispatcher, or None if push mode is off.
+    """
+    if not app.config.get('PUSH_ENABLED'):
+        return None
+    on_result = (lambda outcome: metrics.incr('push_total', outcome=outcome)) if metrics is not None else None
+    pusher = PushDispatcher(
+        max_workers=app.config.get('PUSH_MAX_WORKERS', 4),
+        retries=app.config.get('PUSH_RETRIES', 3),
+        backoff=app.config.get('PUSH_BACKOFF_SECONDS', 0.5),
+        timeout=app.config.get('PUSH_TIMEOUT_SECONDS', 10.0),
+        on_result=on_result,
+    )
+    app.extensions[_EXTENSION_KEY] = pusher
+    return pusher
+
+
+def get_pusher(app):
+    """Returns the push dispatcher of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        PushDispatcher or None: The dispatcher, or None if push mode is off.
+    """
+    return app.extensions.get(_EXTENSION_KEY)
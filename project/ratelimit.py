@@ -0,0 +1,230 @@
+import threading
+import time
+from .caches import ByteBudgetCache, register_cache
+
+_EXTENSION_KEY = 'rate_limiter'
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate` tokens per second.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (int): Bucket capacity, i.e. the largest burst allowed.
+        tokens (float): Tokens currently available.
+        updated_at (float): When `tokens` was last brought up to date.
+    """
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = now
+
+    def _refill(self, now):
+        """Adds the tokens accrued since the last update.
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            None
+        """
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def take(self, now):
+        """Consumes one token if available.
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise the number of
+                   seconds until a token will be available.
+        """
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+    def wait(self, now):
+        """Returns how long until a token is available, without consuming one.
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            float: 0 if a token is available, otherwise the number of seconds
+                   until one will be.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets for inbound requests, per access token and per client address.
+
+    A token only gets a bucket once it has authenticated (see `configure`),
+    with its installation's own limits, so the check for a known token never
+    needs the database. Failed authentications are charged to a bucket for
+    the client address instead (see `charge_address`), and an address whose
+    bucket is empty is refused before any lookup: a flood of made-up tokens
+    only fills the address buckets and cannot evict the buckets of real
+    tokens, while valid tokens arriving through a shared address (e.g. from
+    TRMNL's backend) are never charged to it. Both sets of buckets are
+    capped by count and by estimated bytes; the least recently used are
+    dropped first.
+
+    Attributes:
+        per_minute (float): Default sustained requests (or failed authentications) per minute
+                            per token (or address).
+        burst (int): Default burst size per token or address.
+        max_tokens (int): Maximum number of token buckets kept.
+        buckets (ByteBudgetCache): The token buckets, keyed by access token.
+        addresses (ByteBudgetCache): Buckets of failed authentications, keyed by client address.
+    """
+
+    def __init__(self, per_minute, burst, max_tokens=10000, max_bytes=None, max_addresses=1000,
+                 clock=time.monotonic):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.max_tokens = max_tokens
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Tokens are credentials, so reports only show their first characters.
+        self.buckets = ByteBudgetCache('rate_limit_buckets', max_bytes, max_entries=max_tokens,
+                                       label=lambda token: f'{token[:4]}...')
+        self.addresses = ByteBudgetCache('rate_limit_addresses', max_entries=max_addresses)
+
+    def _bucket(self, cache, key, now):
+        """Returns the bucket for `key`, creating it with the defaults if needed.
+
+        Args:
+            cache (ByteBudgetCache): `buckets` or `addresses`.
+            key (str): The access token or client address.
+            now (float): The current time.
+
+        Returns:
+            TokenBucket: The bucket.
+        """
+        bucket = cache.lookup(key)
+        if bucket is None:
+            bucket = TokenBucket(self.per_minute / 60.0, self.burst, now)
+            cache.put(key, bucket)
+        return bucket
+
+    def check(self, token):
+        """Consumes one request from the bucket of an authenticated token.
+
+        Args:
+            token (str): The access token.
+
+        Returns:
+            float or None: None if the token has no bucket (it has not
+                           authenticated yet, or is invalid), 0 if the request
+                           may proceed, otherwise the suggested `Retry-After`
+                           in seconds.
+        """
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.lookup(token)
+            return bucket.take(now) if bucket is not None else None
+
+    def check_address(self, address):
+        """Checks whether a client address may try an unknown token, without charging it.
+
+        Args:
+            address (str): The client address.
+
+        Returns:
+            float: 0 if the request may proceed, otherwise the suggested
+                   `Retry-After` in seconds.
+        """
+        now = self.clock()
+        with self.lock:
+            bucket = self.addresses.lookup(address or '')
+            return bucket.wait(now) if bucket is not None else 0.0
+
+    def charge_address(self, address):
+        """Charges a failed authentication to the bucket of a client address.
+
+        Args:
+            address (str): The client address.
+
+        Returns:
+            None
+        """
+        now = self.clock()
+        with self.lock:
+            self._bucket(self.addresses, address or '', now).take(now)
+
+    def configure(self, token, per_minute=None, burst=None):
+        """Applies an installation's own limits to its token's bucket, creating it if needed.
+
+        Call only once the token has been authenticated. A new bucket is
+        charged for the request that authenticated it.
+
+        Args:
+            token (str): The access token.
+            per_minute (int, optional): Sustained requests per minute; the default if None.
+            burst (int, optional): Burst size; the default if None.
+
+        Returns:
+            None
+        """
+        rate = (per_minute if per_minute is not None else self.per_minute) / 60.0
+        burst = burst if burst is not None else self.burst
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.lookup(token)
+            if bucket is None:
+                bucket = TokenBucket(rate, burst, now)
+                bucket.take(now)
+                self.buckets.put(token, bucket)
+                return
+            if bucket.rate != rate or bucket.burst != burst:
+                bucket._refill(now)
+                bucket.rate = rate
+                bucket.burst = burst
+                bucket.tokens = min(bucket.tokens, burst)
+
+
+def init_rate_limiter(app):
+    """Creates the inbound rate limiter for `app`.
+
+    Reads `RATE_LIMIT_PER_MINUTE`, `RATE_LIMIT_BURST` and the `RATE_LIMIT_MAX_BYTES`
+    budget from the app configuration.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        RateLimiter: The new limiter.
+    """
+    limiter = RateLimiter(
+        app.config.get('RATE_LIMIT_PER_MINUTE', 6),
+        app.config.get('RATE_LIMIT_BURST', 10),
+        max_bytes=app.config.get('RATE_LIMIT_MAX_BYTES'),
+    )
+    register_cache(app, limiter.buckets)
+    register_cache(app, limiter.addresses)
+    app.extensions[_EXTENSION_KEY] = limiter
+    return limiter
+
+
+def get_rate_limiter(app):
+    """Returns the inbound rate limiter of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        RateLimiter: The app's limiter.
+    """
+    return app.extensions[_EXTENSION_KEY]
@@ -0,0 +1,395 @@
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from config import Config
+from .boards import BUS, TRAIN, board_keys, get_board_store
+from .clock import set_clock, uk_timezone
+from .main import refresh_all_boards
+from .providers import DepartureProvider, set_provider
+from .upstream import QUOTA, UpstreamError
+
+DAY_SECONDS = 86400
+
+# Policies compared when none are given: the shipped defaults, longer TTLs,
+# and boards refreshed by a scheduled `flask refresh-boards` instead of polls.
+DEFAULT_POLICIES = {
+    'default': {},
+    'ttl-30m': {'config': {'BOARD_TTL_SECONDS': 1800}},
+    'ttl-1h': {'config': {'BOARD_TTL_SECONDS': 3600}},
+    'scheduled-1h': {'config': {'BOARD_TTL_SECONDS': 3600}, 'refresh_every': 3600},
+}
+
+
+class SimClock:
+    """A settable clock standing in for wall-clock time during a simulation.
+
+    Attributes:
+        now (float): The current simulated Unix time.
+    """
+
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        """Returns the simulated Unix time.
+
+        Returns:
+            float: Seconds since the epoch.
+        """
+        return self.now
+
+
+class StubUpstream:
+    """A synthetic TransportAPI that counts calls and enforces a daily quota.
+
+    Boards are generated from the simulated time: a departure every
+    `headway` minutes between 05:00 and midnight, listing the next two
+    hours. Every call adds a simulated latency (not slept) to `pending`,
+    which the simulator charges to the poll that triggered it. Calls beyond
+    `daily_limit` for one App ID in one UK day fail with a quota error, as
+    TransportAPI's do; the count starts again at midnight.
+
+    Attributes:
+        calls (Counter): Calls per board key name (`kind:app_id:code`), including rejected ones.
+        app_calls (Counter): Calls per App ID, including rejected ones.
+        rejected (Counter): Calls per App ID refused for being over quota.
+        exhausted_at (dict): Per App ID, the simulated Unix time its quota first ran out.
+        pending (float): Simulated upstream seconds since the simulator last reset it.
+    """
+
+    def __init__(self, clock, latency=0.3, headway=10, daily_limit=0, seed=0):
+        self.clock = clock
+        self.latency = latency
+        self.headway = headway
+        self.daily_limit = daily_limit
+        self.calls = Counter()
+        self.rejected = Counter()
+        self.exhausted_at = {}
+        self.pending = 0.0
+        self.app_calls = Counter()
+        self._day_calls = Counter()
+        self._random = random.Random(seed)
+
+    def departures(self, kind, app_id, code):
+        """Answers one lookup.
+
+        Args:
+            kind (str): The board kind, `BUS` or `TRAIN`.
+            app_id (str): TransportAPI App ID.
+            code (str): The stop or station code.
+
+        Returns:
+            dict: The board, shaped like TransportAPI's response.
+
+        Raises:
+            UpstreamError: If the App ID is over its daily quota.
+        """
+        now = datetime.fromtimestamp(self.clock.time(), uk_timezone())
+        self.calls[f'{kind}:{app_id}:{code}'] += 1
+        self.pending += self.latency * self._random.uniform(0.5, 1.5)
+        self.app_calls[app_id] += 1
+        self._day_calls[app_id, now.date()] += 1
+        if self.daily_limit and self._day_calls[app_id, now.date()] > self.daily_limit:
+            self.rejected[app_id] += 1
+            self.exhausted_at.setdefault(app_id, self.clock.time())
+            raise UpstreamError(QUOTA, 'Usage limits are exceeded', 429)
+        times = self._timetable(now, code)
+        if kind == BUS:
+            return {'atcocode': code, 'departures': {'19': [
+                {'line_name': '19', 'direction': 'East Garforth', 'aimed_departure_time': t,
+                 'operator_name': 'First Leeds'}
+                for t in times
+            ]}}
+        return {'station_code': code, 'departures': {'all': [
+            {'destination_name': 'London Liverpool Street', 'aimed_departure_time': t,
+             'status': 'ON TIME', 'operator_name': 'Greater Anglia', 'platform': '1'}
+            for t in times
+        ]}}
+
+    def _timetable(self, now, code):
+        """Lists the departure times of the next two hours.
+
+        Args:
+            now (datetime): The current UK time.
+            code (str): The stop or station; staggers the timetable between codes.
+
+        Returns:
+            list: `HH:MM` strings.
+        """
+        offset = sum(map(ord, code)) % self.headway
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        minute = now.hour * 60 + now.minute
+        times = []
+        for m in range(minute + 1, minute + 121):
+            if 5 * 60 <= m < 24 * 60 and m % self.headway == offset:
+                times.append((midnight + timedelta(minutes=m)).strftime('%H:%M'))
+        return times
+
+    def provider(self, kind):
+        """Returns a departure provider answering from this stub.
+
+        Args:
+            kind (str): The board kind, `BUS` or `TRAIN`.
+
+        Returns:
+            DepartureProvider: The provider.
+        """
+        upstream = self
+
+        class StubProvider(DepartureProvider):
+            name = 'stub'
+
+            def departures(self, app_id, app_key, code):
+                return upstream.departures(kind, app_id, code)
+
+        return StubProvider()
+
+
+def synthetic_population(count=30, stops=6, stations=4, app_ids=10, interval=900, sleeping=0.3, seed=0):
+    """Generates installations that share stops, stations and App IDs.
+
+    Popular stops are shared by many installations: codes are drawn with a
+    skew towards the first ones. A `sleeping` fraction of the devices do not
+    poll between 00:00 and 06:00.
+
+    Args:
+        count (int): Number of installations.
+        stops (int): Number of distinct bus stops.
+        stations (int): Number of distinct train stations.
+        app_ids (int): Number of distinct TransportAPI App IDs.
+        interval (int): Seconds between polls of each device.
+        sleeping (float): Fraction of devices with a night-time sleep window.
+        seed (int): Seed of the generator.
+
+    Returns:
+        list: Installation specs as accepted by `simulate_day`.
+    """
+    rng = random.Random(seed)
+    skewed = lambda n: min(int(rng.paretovariate(1.2)) - 1, n - 1)
+    population = []
+    for i in range(count):
+        population.append({
+            'app_id': f'app{i % app_ids}',
+            'bus_stop': f'450{skewed(stops):05d}' if rng.random() < 0.7 else None,
+            'train_station': ('LST', 'CBG', 'NRW', 'SSD', 'IPS', 'COL')[skewed(min(stations, 6))],
+            'interval': interval,
+            'offset': rng.randrange(interval),
+            'sleep': (0, 6) if rng.random() < sleeping else None,
+        })
+    return population
+
+
+def load_population(path):
+    """Reads installations and their poll schedules from a JSON file.
+
+    The file holds a list of installation specs: `app_id`, `bus_stop`,
+    `train_station`, optionally `train_destination` and `min_train_time`, and
+    either `polls` (seconds after midnight, e.g. recorded from access logs)
+    or `interval`, `offset` and `sleep` (`[start_hour, end_hour]`).
+
+    Args:
+        path (str): The JSON file.
+
+    Returns:
+        list: The installation specs.
+    """
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def poll_times(spec, duration=DAY_SECONDS):
+    """Lists when an installation polls.
+
+    Args:
+        spec (dict): The installation spec.
+        duration (int): Length of the simulated period, in seconds.
+
+    Returns:
+        list: Poll times, in seconds after the start.
+    """
+    if 'polls' in spec:
+        return sorted(t for t in spec['polls'] if 0 <= t < duration)
+    sleep = spec.get('sleep')
+    times = []
+    for t in range(spec.get('offset', 0), duration, spec.get('interval', 900)):
+        hour = (t // 3600) % 24
+        if sleep and sleep[0] <= hour < sleep[1]:
+            continue
+        times.append(t)
+    return times
+
+
+def _percentiles(values, points):
+    """Summarizes values by nearest-rank percentiles.
+
+    Args:
+        values (list): The values.
+        points (tuple): Percentiles to report, e.g. `(50, 95)`.
+
+    Returns:
+        dict: `p<N>` and `max`, rounded; empty if there are no values.
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {
+        f'p{p}': round(ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))], 3)
+        for p in points
+    }
+    summary['max'] = round(ordered[-1], 3)
+    return summary
+
+
+def _simulation_config(config_class, overrides):
+    """Builds the configuration of one simulated app.
+
+    Args:
+        config_class (type): The base configuration.
+        overrides (dict): The policy's configuration values.
+
+    Returns:
+        type: A configuration class with an in-memory database and side effects off.
+    """
+    settings = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SNAPSHOT_PATH': None,
+        'PUSH_ENABLED': False,
+        'LEASES_ENABLED': False,
+        'PROFILE_ENABLED': False,
+    }
+    settings.update(overrides)
+    return type('SimulationConfig', (config_class,), settings)
+
+
+def simulate_day(population, policy=None, start=None, duration=DAY_SECONDS, latency=0.3,
+                 daily_limit=0, config_class=Config, seed=0):
+    """Replays a day of polls against a stub upstream under one policy.
+
+    Builds a data-only app with the policy's configuration, creates the
+    installations, and polls `/api/data` for each one at its scheduled
+    times. The app runs on a `SimClock` (see `project.clock.set_clock`), so
+    nothing outside it is touched.
+    A policy is a dict with optional `config` (configuration overrides) and
+    `refresh_every` (seconds between scheduled `refresh-boards` runs).
+
+    Args:
+        population (list): Installation specs (see `synthetic_population`).
+        policy (dict, optional): The policy. Defaults to the base configuration.
+        start (datetime, optional): Aware start time. Defaults to the next UK midnight.
+        duration (int): Simulated seconds.
+        latency (float): Mean simulated upstream latency, in seconds.
+        daily_limit (int): Upstream calls allowed per App ID per day; 0 for no limit.
+        config_class (type): The base configuration.
+        seed (int): Seed of the stub's latency jitter.
+
+    Returns:
+        dict: `polls`, `throttled`, `upstream_calls`, `calls_per_key`,
+              `calls_per_app_id`, `over_quota` (rejected calls per App ID),
+              `quota_exhausted_at` (per App ID, the simulated seconds after
+              the start its quota first ran out), `staleness` and
+              `latency_ms` percentiles, and `elapsed_seconds` of real time.
+    """
+    from . import create_app, db
+    from .models import Installation, User
+
+    policy = policy or {}
+    if start is None:
+        tomorrow = datetime.now(uk_timezone()).date() + timedelta(days=1)
+        start = uk_timezone().localize(datetime.combine(tomorrow, datetime.min.time()))
+    clock = SimClock(start.timestamp())
+    upstream = StubUpstream(clock, latency=latency, daily_limit=daily_limit, seed=seed)
+
+    app = create_app(_simulation_config(config_class, policy.get('config', {})), profile='data')
+    set_provider(app, BUS, upstream.provider(BUS))
+    set_provider(app, TRAIN, upstream.provider(TRAIN))
+    set_clock(app, clock.time)
+    store = get_board_store(app)
+
+    events = []
+    staleness = []
+    latencies = []
+    throttled = 0
+    began = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        installations = []
+        for i, spec in enumerate(population):
+            installation = Installation(
+                user=User(trmnl_id=f'sim-user-{i}'),
+                access_token=f'sim-token-{i}',
+                trmnl_installation_id=f'sim-{i}',
+                app_id=spec.get('app_id', 'app'),
+                app_key=spec.get('app_key', 'key'),
+                bus_stop=spec.get('bus_stop'),
+                train_station=spec.get('train_station'),
+                train_destination=spec.get('train_destination'),
+                min_train_time=spec.get('min_train_time'),
+            )
+            db.session.add(installation)
+            installations.append(installation)
+            events.extend((t, 'poll', i) for t in poll_times(spec, duration))
+        db.session.commit()
+        tokens = [installation.access_token for installation in installations]
+        keys = [board_keys(installation) for installation in installations]
+        if policy.get('refresh_every'):
+            events.extend((t, 'refresh', None) for t in range(0, duration, policy['refresh_every']))
+        # Scheduled refreshes run before polls due at the same moment.
+        events.sort(key=lambda event: (event[0], event[1] == 'poll'))
+
+        client = app.test_client()
+        for offset, action, i in events:
+            clock.now = start.timestamp() + offset
+            if action == 'refresh':
+                refresh_all_boards(store)
+                continue
+            upstream.pending = 0.0
+            tick = time.perf_counter()
+            response = client.get('/api/data', headers={'Authorization': f'Bearer {tokens[i]}'})
+            latencies.append((time.perf_counter() - tick + upstream.pending) * 1000)
+            if response.status_code != 200:
+                throttled += 1
+                continue
+            ages = [
+                clock.now - entry['fetched_at']
+                for entry in (store.boards.get(key) for key in keys[i])
+                if entry is not None
+            ]
+            if ages:
+                staleness.append(max(ages))
+        db.session.remove()
+        db.drop_all()
+
+    return {
+        'polls': len(latencies),
+        'throttled': throttled,
+        'upstream_calls': sum(upstream.calls.values()),
+        'calls_per_key': dict(upstream.calls.most_common()),
+        'calls_per_app_id': dict(sorted(upstream.app_calls.items())),
+        'over_quota': dict(sorted(upstream.rejected.items())),
+        'quota_exhausted_at': {
+            app_id: round(when - start.timestamp())
+            for app_id, when in sorted(upstream.exhausted_at.items())
+        },
+        'staleness': _percentiles(staleness, (50, 90, 99)),
+        'latency_ms': _percentiles(latencies, (50, 95, 99)),
+        'elapsed_seconds': round(time.perf_counter() - began, 2),
+    }
+
+
+def compare_policies(population, policies=None, **kwargs):
+    """Runs `simulate_day` for each policy on the same population.
+
+    Args:
+        population (list): Installation specs.
+        policies (dict, optional): Policies by name. Defaults to `DEFAULT_POLICIES`.
+        **kwargs: Passed to `simulate_day`.
+
+    Returns:
+        dict: The report of each policy, by name.
+    """
+    policies = DEFAULT_POLICIES if policies is None else policies
+    return {name: simulate_day(population, policy, **kwargs) for name, policy in policies.items()}
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import struct
+import zlib
+from datetime import datetime, timezone
+from .boards import SettingsFingerprint, fingerprint_board_keys, payload_hash, valid_until
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TRMNLSNP'
+VERSION = 2
+# magic, format version, CRC-32 of the body, body length
+HEADER = struct.Struct('>8sHII')
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is malformed or has an unsupported version."""
+
+
+def encode_snapshot(store, written_at):
+    """Serializes the boards and payloads of a store into the snapshot format.
+
+    The file is a fixed header followed by a zlib-compressed JSON body. Boards
+    and payloads are stored as flat lists rather than objects to keep the
+    body compact.
+
+    Args:
+        store (BoardStore): The store to serialize.
+        written_at (float): Wall-clock time the snapshot is taken at.
+
+    Returns:
+        bytes: The encoded snapshot.
+    """
+    with store.lock:
+        boards = [
+            [kind, app_id, code, entry['fetched_at'], entry['expires_at'], entry['data']]
+            for (kind, app_id, code), entry in store.boards.items()
+        ]
+        payloads = [
+            [installation_id, list(entry['fingerprint']), entry['computed_at'], entry['payload']]
+            for installation_id, entry in store.payloads.items()
+        ]
+    body = json.dumps(
+        {'written_at': written_at, 'boards': boards, 'payloads': payloads},
+        separators=(',', ':'),
+    ).encode('utf-8')
+    body = zlib.compress(body)
+    return HEADER.pack(MAGIC, VERSION, zlib.crc32(body), len(body)) + body
+
+
+def decode_snapshot(buffer):
+    """Parses a snapshot produced by `encode_snapshot`.
+
+    Args:
+        buffer (bytes): The snapshot contents.
+
+    Returns:
+        dict: The decoded body with `written_at`, `boards` and `payloads`.
+
+    Raises:
+        SnapshotError: If the header, version or checksum does not match.
+    """
+    if len(buffer) < HEADER.size:
+        raise SnapshotError('Snapshot is truncated.')
+    magic, version, crc, length = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise SnapshotError('Not a snapshot file.')
+    if version != VERSION:
+        raise SnapshotError(f'Unsupported snapshot version {version}.')
+    body = buffer[HEADER.size:HEADER.size + length]
+    if len(body) != length or zlib.crc32(body) != crc:
+        raise SnapshotError('Snapshot checksum mismatch.')
+    return json.loads(zlib.decompress(body))
+
+
+def write_snapshot(store, path):
+    """Atomically writes a snapshot of `store` to `path`.
+
+    The snapshot is written to a temporary file next to `path` and renamed
+    over it, so concurrent readers never see a partial file.
+
+    Args:
+        store (BoardStore): The store to snapshot.
+        path (str): Destination file.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    now = store.clock()
+    data = encode_snapshot(store, now)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+    store.snapshot_at = now
+    return len(data)
+
+
+def load_snapshot(store, path):
+    """Reads a snapshot file and restores its unexpired entries into `store`.
+
+    Boards whose `expires_at` has already passed by the wall clock are
+    skipped, and so are payloads whose `valid_until` has passed or that are
+    built from a board not in the store after the restore. Entries already
+    present in the store are not overwritten.
+
+    Args:
+        store (BoardStore): The store to populate.
+        path (str): Snapshot file to read.
+
+    Returns:
+        int: The number of boards restored. Returns 0 if the file is missing,
+             unreadable or has an unsupported version.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            snapshot = decode_snapshot(fh.read())
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError, SnapshotError) as e:
+        logger.warning("Ignoring snapshot %s: %s", path, e)
+        return 0
+
+    now = store.clock()
+    restored = 0
+    with store.lock:
+        for kind, app_id, code, fetched_at, expires_at, data in snapshot['boards']:
+            key = (kind, app_id, code)
+            if expires_at <= now or key in store.boards:
+                continue
+            store.boards[key] = {'data': data, 'fetched_at': fetched_at, 'expires_at': expires_at}
+            restored += 1
+        now_at = datetime.fromtimestamp(now, timezone.utc)
+        for installation_id, fingerprint, computed_at, payload in snapshot['payloads']:
+            until = valid_until(payload)
+            if until is not None and until <= now_at:
+                continue
+            if any(key not in store.boards for key in fingerprint_board_keys(fingerprint)):
+                continue
+            store.payloads.setdefault(installation_id, {
+                'payload': payload,
+                'hash': payload_hash(payload),
+                'fingerprint': SettingsFingerprint(*fingerprint),
+                'computed_at': computed_at,
+                'served_at': None,
+            })
+    return restored
+
+
+def maybe_snapshot(store, path, interval):
+    """Writes a snapshot if the last one is older than `interval` seconds.
+
+    Args:
+        store (BoardStore): The store to snapshot.
+        path (str or None): Destination file; snapshots are disabled if empty.
+        interval (int): Minimum seconds between snapshots.
+
+    Returns:
+        bool: True if a snapshot was written.
+    """
+    if not path or store.clock() - store.snapshot_at < interval:
+        return False
+    try:
+        write_snapshot(store, path)
+    except OSError as e:
+        logger.warning("Could not write snapshot %s: %s", path, e)
+        return False
+    return True
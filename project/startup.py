@@ -0,0 +1,67 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Run in a fresh interpreter so every sample is a true cold start.
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from project import create_app
+imported = time.perf_counter()
+create_app(profile=sys.argv[1])
+built = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_ms": (built - imported) * 1000,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+# Modules a data-only worker must never load at start-up.
+HEAVY_MODULES = ('flask_wtf', 'wtforms', 'authlib', 'alembic', 'flask_migrate', 'dateutil')
+
+
+def measure_cold_start(profile='full', runs=5, root=None):
+    """Measures the cold-start time of `create_app` in fresh interpreters.
+
+    Each run starts a new Python process, imports `project` and builds the app
+    with the given profile, so module import caches from this process do not
+    skew the numbers.
+
+    Args:
+        profile (str): The app profile to build ('full' or 'data').
+        runs (int): How many fresh interpreters to sample.
+        root (str, optional): Directory containing the `project` package.
+                              Defaults to the repository root.
+
+    Returns:
+        dict: Median `import_ms`, `create_ms` and `total_ms` across the runs,
+              the raw `samples`, and `heavy_modules` listing any modules from
+              `HEAVY_MODULES` that were loaded during start-up.
+    """
+    root = root or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    loaded = set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', _PROBE, profile],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        sample = json.loads(out.stdout.strip().splitlines()[-1])
+        loaded.update(
+            name for name in sample.pop('modules')
+            if name.split('.')[0] in HEAVY_MODULES
+        )
+        sample['total_ms'] = sample['import_ms'] + sample['create_ms']
+        samples.append(sample)
+
+    return {
+        'profile': profile,
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'create_ms': statistics.median(s['create_ms'] for s in samples),
+        'total_ms': statistics.median(s['total_ms'] for s in samples),
+        'samples': samples,
+        'heavy_modules': sorted({name.split('.')[0] for name in loaded}),
+    }
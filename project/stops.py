@@ -0,0 +1,249 @@
+import csv
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+_EXTENSION_KEY = 'stops'
+
+# Column names accepted for each field, in order of preference.
+_NAPTAN_COLUMNS = {
+    'code': ('ATCOCode', 'atco_code', 'code'),
+    'name': ('CommonName', 'common_name', 'name'),
+    'locality': ('LocalityName', 'locality_name', 'locality'),
+}
+_CRS_COLUMNS = {
+    'code': ('CrsCode', 'crs', 'CRS', 'code'),
+    'name': ('StationName', 'station_name', 'name'),
+    'locality': ('Locality', 'locality'),
+}
+
+
+def _normalize(text):
+    """Normalizes text for prefix matching.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: Lower-case text with runs of whitespace collapsed.
+    """
+    return ' '.join((text or '').lower().split())
+
+
+class StopIndex:
+    """A compact prefix index over stop or station reference data.
+
+    Records are kept in parallel lists. Prefix search uses `bisect` over two
+    sorted arrays of interned strings, each paired with an `array` of record
+    numbers: one over codes and one over every word of every name (so
+    "liverpool" finds "London Liverpool Street"). Avoiding a tuple per index
+    entry matters for the ~400k-stop NaPTAN dataset. Exact code lookups use
+    a dict.
+
+    Attributes:
+        codes (list): Upper-cased codes, by record.
+        names (list): Display names, by record.
+        localities (list): Locality names, by record.
+    """
+
+    def __init__(self, records):
+        self.codes = []
+        self.names = []
+        self.localities = []
+        self._search_names = []
+        by_code = {}
+        for code, name, locality in records:
+            code = (code or '').strip().upper()
+            if not code or code in by_code:
+                continue
+            by_code[code] = len(self.codes)
+            self.codes.append(code)
+            self.names.append((name or '').strip())
+            self.localities.append((locality or '').strip())
+            self._search_names.append(' ' + _normalize(name))
+        self._by_code = by_code
+        self._code_keys, self._code_ids = self._sorted_keys(
+            (code.lower(), i) for code, i in by_code.items()
+        )
+        self._word_keys, self._word_ids = self._sorted_keys(
+            (sys.intern(word), i)
+            for i, name in enumerate(self._search_names)
+            for word in set(name.split())
+        )
+
+    @staticmethod
+    def _sorted_keys(pairs):
+        """Splits `(key, record)` pairs into a sorted key list and a record array.
+
+        Args:
+            pairs (iterable): `(key, record)` tuples.
+
+        Returns:
+            tuple: The sorted keys and an `array('I')` of matching record numbers.
+        """
+        pairs = sorted(pairs)
+        return [key for key, _ in pairs], array('I', (i for _, i in pairs))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return (code or '').strip().upper() in self._by_code
+
+    def get(self, code):
+        """Looks up one record by its exact code.
+
+        Args:
+            code (str): The ATCO or CRS code, in any case.
+
+        Returns:
+            dict or None: The record, or None if the code is unknown.
+        """
+        i = self._by_code.get((code or '').strip().upper())
+        return self._record(i) if i is not None else None
+
+    def _record(self, i):
+        """Returns record `i` as a JSON-ready dict.
+
+        Args:
+            i (int): The record number.
+
+        Returns:
+            dict: `code`, `name` and `locality`.
+        """
+        return {'code': self.codes[i], 'name': self.names[i], 'locality': self.localities[i]}
+
+    @staticmethod
+    def _scan(keys, ids, prefix, limit, seen, accept=None):
+        """Collects record numbers whose key starts with `prefix`.
+
+        Args:
+            keys (list): Sorted keys.
+            ids (array): Record numbers matching `keys`.
+            prefix (str): The normalized prefix.
+            limit (int): Stop once `seen` holds this many records.
+            seen (dict): Record numbers found so far, in insertion order; updated in place.
+            accept (function, optional): Extra check a record must pass.
+
+        Returns:
+            None
+        """
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(seen) < limit and keys[i].startswith(prefix):
+            record = ids[i]
+            if accept is None or accept(record):
+                seen.setdefault(record, None)
+            i += 1
+
+    def search(self, query, limit=10):
+        """Finds records whose code, or any run of words in whose name, starts with `query`.
+
+        Code matches are listed first.
+
+        Args:
+            query (str): What the user has typed so far.
+            limit (int): Maximum number of results.
+
+        Returns:
+            list: Matching records as dicts.
+        """
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+        seen = {}
+        self._scan(self._code_keys, self._code_ids, prefix, limit, seen)
+        accept = None
+        if ' ' in prefix:
+            needle = ' ' + prefix
+            accept = lambda i: needle in self._search_names[i]
+        self._scan(self._word_keys, self._word_ids, prefix.split(' ', 1)[0], limit, seen, accept)
+        return [self._record(i) for i in seen]
+
+
+def _read_csv(path, columns):
+    """Reads reference records from a CSV file.
+
+    Args:
+        path (str): The CSV file.
+        columns (dict): Accepted column names for `code`, `name` and `locality`.
+
+    Returns:
+        list: `(code, name, locality)` tuples.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        reader = csv.DictReader(fh)
+        fields = reader.fieldnames or []
+        picked = {
+            field: next((c for c in candidates if c in fields), None)
+            for field, candidates in columns.items()
+        }
+        if picked['code'] is None:
+            raise ValueError(f"{path} has no code column (expected one of {columns['code']}).")
+        return [
+            tuple(row[picked[f]] if picked[f] else '' for f in ('code', 'name', 'locality'))
+            for row in reader
+        ]
+
+
+class StopDirectory:
+    """The bus stop and train station indexes of one app, loaded on first use.
+
+    NaPTAN is large, so the CSVs are only read the first time a lookup or
+    validation needs them rather than at application start.
+
+    Attributes:
+        naptan_path (str or None): NaPTAN stops CSV.
+        crs_path (str or None): Railway station CRS CSV.
+    """
+
+    def __init__(self, naptan_path=None, crs_path=None):
+        self.naptan_path = naptan_path
+        self.crs_path = crs_path
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, kind):
+        """Returns the index for 'bus' or 'train', loading it if needed.
+
+        Args:
+            kind (str): 'bus' for NaPTAN stops, 'train' for CRS stations.
+
+        Returns:
+            StopIndex or None: The index, or None if no dataset is configured.
+        """
+        if kind not in self._indexes:
+            with self._lock:
+                if kind not in self._indexes:
+                    path, columns = {
+                        'bus': (self.naptan_path, _NAPTAN_COLUMNS),
+                        'train': (self.crs_path, _CRS_COLUMNS),
+                    }[kind]
+                    self._indexes[kind] = StopIndex(_read_csv(path, columns)) if path else None
+        return self._indexes[kind]
+
+
+def init_stops(app):
+    """Creates the stop directory for `app` from `NAPTAN_PATH` and `CRS_PATH`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        StopDirectory: The new directory.
+    """
+    directory = StopDirectory(app.config.get('NAPTAN_PATH'), app.config.get('CRS_PATH'))
+    app.extensions[_EXTENSION_KEY] = directory
+    return directory
+
+
+def get_stop_directory(app):
+    """Returns the stop directory of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        StopDirectory: The app's directory.
+    """
+    return app.extensions[_EXTENSION_KEY]
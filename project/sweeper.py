@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from .models import db, Installation, utcnow
+
+logger = logging.getLogger(__name__)
+
+_EXTENSION_KEY = 'install_sweeper'
+
+
+class InstallSweeper:
+    """Deletes installs whose OAuth flow was started but never completed.
+
+    Every visit to `/install` creates an `Installation` carrying only an
+    `install_state`. Rows still pending after `max_age` seconds, and that
+    never received an access token, are deleted in batches of `batch_size`
+    so each delete transaction stays short.
+
+    Attributes:
+        max_age (int): Seconds a pending install is kept.
+        batch_size (int): Rows deleted per transaction.
+        interval (int): Minimum seconds between opportunistic sweeps.
+    """
+
+    def __init__(self, max_age=3600, batch_size=500, interval=300, clock=time.monotonic):
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.interval = interval
+        self.clock = clock
+        self._last_run = None
+        self._lock = threading.Lock()
+
+    def sweep_batch(self, now=None):
+        """Deletes one batch of expired pending installs.
+
+        Args:
+            now (datetime, optional): The current UTC time. Defaults to `utcnow()`.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        cutoff = (now or utcnow()) - timedelta(seconds=self.max_age)
+        ids = [
+            row[0] for row in db.session.query(Installation.id)
+            .filter(Installation.install_state.isnot(None))
+            .filter(Installation.created_at < cutoff)
+            .filter(Installation.access_token.is_(None))
+            .order_by(Installation.created_at)
+            .limit(self.batch_size)
+        ]
+        if not ids:
+            return 0
+        Installation.query.filter(Installation.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        return len(ids)
+
+    def sweep(self, max_batches=None, now=None):
+        """Deletes expired pending installs batch by batch until none are left.
+
+        Args:
+            max_batches (int, optional): Stop after this many batches.
+            now (datetime, optional): The current UTC time. Defaults to `utcnow()`.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        now = now or utcnow()
+        deleted = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            count = self.sweep_batch(now)
+            deleted += count
+            batches += 1
+            if count < self.batch_size:
+                break
+        return deleted
+
+    def maybe_sweep(self):
+        """Runs one batch if the last opportunistic sweep is older than `interval`.
+
+        Errors are logged rather than raised, so a failed sweep never fails
+        the request that triggered it.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        with self._lock:
+            now = self.clock()
+            if self._last_run is not None and now - self._last_run < self.interval:
+                return 0
+            self._last_run = now
+        try:
+            return self.sweep_batch()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Sweeping pending installs failed")
+            return 0
+
+
+def init_sweeper(app):
+    """Creates the pending install sweeper for `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        InstallSweeper: The new sweeper.
+    """
+    sweeper = InstallSweeper(
+        max_age=app.config.get('INSTALL_STATE_TTL_SECONDS', 3600),
+        batch_size=app.config.get('INSTALL_SWEEP_BATCH_SIZE', 500),
+        interval=app.config.get('INSTALL_SWEEP_INTERVAL_SECONDS', 300),
+    )
+    app.extensions[_EXTENSION_KEY] = sweeper
+    return sweeper
+
+
+def get_sweeper(app):
+    """Returns the pending install sweeper of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        InstallSweeper: The app's sweeper.
+    """
+    return app.extensions[_EXTENSION_KEY]
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    """A local HTTP server standing in for an external service in tests.
+
+    Every request is recorded. Responses are taken from `responses`, a list
+    of `(status, body)` tuples consumed in order; once it is empty,
+    `default` is returned.
+
+    Attributes:
+        requests (list): `(method, path, parsed JSON body or None)` tuples.
+        responses (list): Scripted `(status, body)` responses.
+        default (tuple): Response used when `responses` is exhausted.
+        delay (float): Seconds to wait before answering each request.
+    """
+
+    def __init__(self, default=(200, {})):
+        self.requests = []
+        self.responses = []
+        self.default = default
+        self.delay = 0.0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                with server._lock:
+                    server.requests.append((self.command, self.path, json.loads(raw) if raw else None))
+                    status, body = server.responses.pop(0) if server.responses else server.default
+                if server.delay:
+                    time.sleep(server.delay)
+                encoded = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(encoded)))
+                    self.end_headers()
+                    self.wfile.write(encoded)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting, e.g. a timeout under test.
+                    pass
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        """str: The server's base URL."""
+        host, port = self._httpd.server_address
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
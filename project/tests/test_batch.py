@@ -0,0 +1,170 @@
+import random
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import pytz
+from project import create_app, db
+from project import main as main_module
+from project.batch import TrainColumns, _numpy, _synthetic_board, benchmark, evaluate_filters, select_trains
+from project.boards import TRAIN, get_board_store
+from project.main import build_payload, recompute_payloads
+from project.models import User, Installation
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+UK = pytz.timezone('Europe/London')
+
+def train(destination, time, operator='Greater Anglia'):
+    """Builds one TransportAPI train departure.
+
+    Args:
+        destination (str): The destination name.
+        time (str): The `HH:MM` aimed departure time.
+        operator (str): The operator name.
+
+    Returns:
+        dict: The departure.
+    """
+    return {'destination_name': destination, 'aimed_departure_time': time, 'status': 'ON TIME',
+            'operator_name': operator, 'platform': '1'}
+
+class TestBatchEvaluation(unittest.TestCase):
+    """Test case for evaluating many installations' train filters together."""
+
+    def setUp(self):
+        """Builds a board around 23:50, crossing midnight."""
+        self.now = UK.localize(datetime(2026, 3, 2, 23, 50))
+        self.board = {'departures': {'all': [
+            train('Cambridge', '00:20'),
+            train('London Liverpool Street', '23:55'),
+            train('Norwich', '00:05', operator='CrossCountry'),
+            train('London Liverpool Street', 'soon'),
+            train('Norwich', '00:45'),
+            {'destination_name': 'Ipswich', 'status': 'ON TIME', 'operator_name': 'Greater Anglia'},
+        ]}}
+
+    def test_columns(self):
+        """Tests that rows are ordered by time of day and only eligible ones are kept."""
+        columns = TrainColumns(self.board['departures']['all'], self.now)
+        self.assertEqual(columns.order[:3], [0, 4, 1])
+        self.assertEqual(columns.eligible.count(True), 3)
+        self.assertEqual(columns.minutes[:3], [30.0, 55.0, 5.0])
+
+    def test_filters(self):
+        """Tests destination substrings and minimum times, with a limit."""
+        columns = TrainColumns(self.board['departures']['all'], self.now)
+        filters = [('', 0), ('london', 0), ('', 40), ('nowhere', 0)]
+        self.assertEqual(evaluate_filters(columns, filters, limit=2, use_numpy=False),
+                         [[0, 4], [1], [4], []])
+
+    def test_matches_build_payload(self):
+        """Tests that batch selections equal `build_payload`'s on random boards and settings."""
+        rng = random.Random(1)
+        paths = [False] + ([True] if _numpy() is not None else [])
+        for hour in (7, 13, 23):
+            now = UK.localize(datetime(2026, 3, 2, hour, rng.randrange(60)))
+            board = _synthetic_board(rng, 40, now)
+            installations = [
+                Installation(id=i, train_station='LST',
+                             train_destination=rng.choice(('', 'london', 'CAM', 'airport', 'x')),
+                             min_train_time=rng.choice((None, 0, 15, 50)))
+                for i in range(1, 41)
+            ]
+            for use_numpy in paths:
+                selections = select_trains(board, installations, now, 30, use_numpy=use_numpy)
+                for installation in installations:
+                    self.assertEqual(
+                        build_payload(installation, None, board, now, selections[installation.id]),
+                        build_payload(installation, None, board, now),
+                    )
+
+    @unittest.skipUnless(_numpy() is not None, "NumPy is not installed")
+    def test_numpy_matches_python(self):
+        """Tests that the NumPy and pure-Python paths pick the same departures."""
+        rng = random.Random(2)
+        for hour in (0, 7, 23):
+            now = UK.localize(datetime(2026, 3, 2, hour, rng.randrange(60)))
+            board = _synthetic_board(rng, 60, now)
+            board['departures']['all'].append({'destination_name': 'Ipswich', 'aimed_departure_time': 'soon',
+                                               'operator_name': 'Greater Anglia'})
+            columns = TrainColumns(board['departures']['all'], now)
+            filters = [(destination, minimum)
+                       for destination in ('', 'london', 'cam', 'airport', 'nowhere')
+                       for minimum in (0, 15, 50, 200)]
+            for limit in (1, 3, 100):
+                self.assertEqual(evaluate_filters(columns, filters, limit, use_numpy=True),
+                                 evaluate_filters(columns, filters, limit, use_numpy=False))
+
+    @unittest.skipIf(_numpy() is not None, "NumPy is installed")
+    def test_numpy_required_when_forced(self):
+        """Tests that forcing the NumPy path without NumPy fails loudly."""
+        columns = TrainColumns(self.board['departures']['all'], self.now)
+        with self.assertRaises(RuntimeError):
+            evaluate_filters(columns, [('', 0)], use_numpy=True)
+
+    def test_benchmark(self):
+        """Tests that the benchmark's methods agree."""
+        result = benchmark(subscribers=20, departures=10, repeat=1)
+        self.assertTrue(result['matches'])
+        self.assertGreater(result['loop_ms'], 0)
+
+class TestBatchRecompute(unittest.TestCase):
+    """Test case for batch evaluation inside `recompute_payloads`."""
+
+    def setUp(self):
+        """Sets up the test environment with installations sharing a station."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.installations = [
+            Installation(user=User(trmnl_id=f'user{i}'), access_token=f'token{i}', app_id='id',
+                         app_key='key', train_station=station, train_destination=destination,
+                         min_train_time=0)
+            for i, (station, destination) in enumerate([('LST', 'london'), ('LST', ''), ('CBG', '')])
+        ]
+        db.session.add_all(self.installations)
+        db.session.commit()
+        self.now = UK.localize(datetime(2026, 3, 2, 12, 0))
+        store = get_board_store(self.app)
+        for code in ('LST', 'CBG'):
+            store.put_board((TRAIN, 'id', code), {'departures': {'all': [
+                train('Cambridge', '12:10'), train('London Liverpool Street', '12:20'),
+            ]}})
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_shared_boards_are_evaluated_together(self):
+        """Tests that only boards with several subscribers go through the batch evaluator."""
+        with patch('project.main.datetime') as mock_datetime, \
+                patch('project.main.select_trains', wraps=main_module.select_trains) as mock_select:
+            mock_datetime.now.return_value = self.now
+            mock_datetime.strptime.side_effect = datetime.strptime
+            mock_datetime.combine.side_effect = datetime.combine
+            mock_datetime.max = datetime.max
+            recompute_payloads(get_board_store(self.app), [i.id for i in self.installations])
+        self.assertEqual(mock_select.call_count, 1)
+        self.assertEqual({i.id for i in mock_select.call_args.args[1]}, {self.installations[0].id,
+                                                                          self.installations[1].id})
+        store = get_board_store(self.app)
+        trains = [store.payloads.get(i.id)['payload']['trains'] for i in self.installations]
+        self.assertEqual([t['destination'] for t in trains[0]], ['London Liverpool Street'])
+        self.assertEqual([t['destination'] for t in trains[1]], ['Cambridge', 'London Liverpool Street'])
+        self.assertEqual(len(trains[2]), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+import pytz
+from project import create_app, db
+from project.boards import BoardStore, get_board_store, payload_hash, BUS, TRAIN
+from project.main import board_lifetime
+from project.main import MOCK_TRAIN_DATA, MOCK_BUS_DATA
+from project.models import User, Installation
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    MIN_REFRESH_SECONDS = 0
+
+class TestBoardStore(unittest.TestCase):
+    """Test case for the subscription map of `BoardStore`."""
+
+    def test_subscribe_replaces_previous_boards(self):
+        """Tests that re-subscribing moves an installation between boards."""
+        store = BoardStore(ttl=60)
+        old = (TRAIN, 'id', 'LST')
+        new = (TRAIN, 'id', 'CBG')
+        self.assertTrue(store.subscribe(1, [old]))
+        self.assertFalse(store.subscribe(1, [old]))
+        store.subscribe(2, [old])
+        store.subscribe(1, [new])
+        self.assertEqual(store.subscribers(old), {2})
+        self.assertEqual(store.subscribers(new), {1})
+        store.unsubscribe(2)
+        self.assertNotIn(old, store.subscriptions)
+
+    def test_board_ttl(self):
+        """Tests that boards go stale once their TTL has passed."""
+        now = [1000.0]
+        store = BoardStore(ttl=60, clock=lambda: now[0])
+        key = (TRAIN, '', 'LST')
+        self.assertFalse(store.is_fresh(key))
+        store.put_board(key, {'departures': {}})
+        self.assertTrue(store.is_fresh(key))
+        now[0] += 61
+        self.assertFalse(store.is_fresh(key))
+
+    def test_oversize_board_is_refused(self):
+        """Tests that a board larger than the byte budget is not stored and drops the older copy."""
+        store = BoardStore(ttl=60, board_bytes=2000)
+        key = (TRAIN, 'id', 'LST')
+        self.assertIsNotNone(store.put_board(key, {'departures': {}}))
+        self.assertIsNone(store.put_board(key, MOCK_TRAIN_DATA))
+        self.assertIsNone(store.board(key))
+
+class TestMaterializedPayloads(unittest.TestCase):
+    """Test case for payloads materialized on board refresh."""
+
+    def setUp(self):
+        """Sets up the test environment with two installations sharing a station."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        user = User(trmnl_id='user123')
+        db.session.add(user)
+        for n in (1, 2):
+            db.session.add(Installation(
+                user=user,
+                access_token=f'token{n}',
+                trmnl_installation_id=f'inst{n}',
+                train_station='LST',
+                bus_stop='12345',
+                min_train_time=0,
+                app_id='id',
+                app_key='key',
+            ))
+        db.session.commit()
+        self.store = get_board_store(self.app)
+
+        # Fix "now" to 11:45 so the mock departures are all in the future.
+        patcher = patch('project.main.datetime')
+        mock_datetime = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_datetime = mock_datetime
+        mock_datetime.now.return_value = pytz.timezone('Europe/London').localize(datetime(2023, 10, 27, 11, 45))
+        mock_datetime.strptime = datetime.strptime
+        mock_datetime.combine = datetime.combine
+        mock_datetime.max = datetime.max
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _poll(self, token):
+        """Polls `/api/data` with the given token.
+
+        Args:
+            token (str): The access token.
+
+        Returns:
+            Response: The test client response.
+        """
+        return self.client.get('/api/data', headers={'Authorization': f'Bearer {token}'})
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    @patch('project.main.fetch_bus_data', return_value=MOCK_BUS_DATA)
+    def test_refresh_materializes_all_subscribers(self, mock_bus, mock_train):
+        """Tests that one board refresh serves every subscribed installation."""
+        first = self._poll('token1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(mock_train.call_count, 1)
+        self.assertEqual(mock_bus.call_count, 1)
+        self.assertEqual(len(self.store.payloads), 2)
+
+        second = self._poll('token2')
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(mock_train.call_count, 1)
+        self.assertEqual(mock_bus.call_count, 1)
+
+        # Once the board expires, the next poll refreshes it again.
+        for entry in self.store.boards.values():
+            entry['expires_at'] = 0
+        self._poll('token2')
+        self.assertEqual(mock_train.call_count, 2)
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    @patch('project.main.fetch_bus_data', return_value=MOCK_BUS_DATA)
+    def test_oversize_boards_are_served_uncached(self, mock_bus, mock_train):
+        """Tests that boards larger than the cache budget still reach every subscriber's payload."""
+        expected = self._poll('token1').json
+        for cache in (self.store.boards, self.store.payloads):
+            for key in cache.keys():
+                cache.pop(key)
+        self.store.boards.max_bytes = 100
+        response = self._poll('token2')
+        self.assertEqual(len(self.store.boards), 0)
+        self.assertEqual((response.json['buses'], response.json['trains']), (expected['buses'], expected['trains']))
+        self.assertNotEqual(response.json['trains'], [])
+        self.assertEqual(self.store.payloads.get(1)['payload']['trains'], expected['trains'])
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    @patch('project.main.fetch_bus_data', return_value=MOCK_BUS_DATA)
+    def test_manage_recomputes_only_that_installation(self, mock_bus, mock_train):
+        """Tests that saving settings recomputes one payload without calling upstream."""
+        self._poll('token1')
+        other = self.store.payloads[2]['computed_at']
+
+        response = self.client.post(
+            '/manage',
+            headers={'Authorization': 'Bearer token1'},
+            data={'train_station': 'LST', 'bus_stop': '12345', 'min_train_time': 0,
+                  'train_destination': 'norwich', 'app_id': 'id', 'app_key': 'key'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mock_train.call_count, 1)
+        self.assertEqual(self.store.payloads[2]['computed_at'], other)
+
+        destinations = [t['destination'] for t in self._poll('token1').json['trains']]
+        self.assertEqual(destinations, ['Norwich'])
+        self.assertEqual(mock_train.call_count, 1)
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    @patch('project.main.fetch_bus_data', return_value=MOCK_BUS_DATA)
+    def test_uninstall_unsubscribes(self, mock_bus, mock_train):
+        """Tests that uninstalling drops the installation's payload and subscriptions."""
+        self._poll('token1')
+        self.client.post('/webhook/uninstall', json={'id': 'inst1'})
+        self.assertNotIn(1, self.store.payloads)
+        self.assertEqual(self.store.subscribers((TRAIN, 'id', 'LST')), {2})
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    @patch('project.main.fetch_bus_data', return_value=MOCK_BUS_DATA)
+    def test_valid_until(self, mock_bus, mock_train):
+        """Tests the refresh hint in the payload and headers, and recomputation once it passes."""
+        # The live train board is kept for one TTL; the bus board until 11:55, before its first bus at 12:00.
+        response = self._poll('token1')
+        self.assertEqual(response.json['valid_until'], '2023-10-27T11:50:00+01:00')
+        self.assertEqual(response.headers['Cache-Control'], 'private, max-age=300')
+        self.assertEqual(response.headers['Expires'], 'Fri, 27 Oct 2023 10:50:00 GMT')
+
+        # Once it expires, only the train board is fetched again, for another TTL.
+        self.mock_datetime.now.return_value = pytz.timezone('Europe/London').localize(datetime(2023, 10, 27, 11, 51))
+        for key, entry in self.store.boards.items():
+            if key[0] == TRAIN:
+                entry['expires_at'] = 0
+        response = self._poll('token1')
+        self.assertEqual(response.json['valid_until'], '2023-10-27T11:56:00+01:00')
+        self.assertEqual(mock_train.call_count, 2)
+        self.assertEqual(mock_bus.call_count, 1)
+
+    def test_valid_until_follows_min_train_time(self):
+        """Tests that the hint is when the first train shown comes within `min_train_time`."""
+        installation = db.session.get(Installation, 1)
+        installation.min_train_time = 10
+        db.session.commit()
+        with patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA), \
+                patch('project.main.fetch_bus_data', return_value={'departures': {}}):
+            payload = self._poll('token1').json
+        self.assertEqual([t['time'] for t in payload['trains']], ['12:00', '12:15', '12:45'])
+        self.assertEqual(payload['valid_until'], '2023-10-27T11:50:00+01:00')
+
+    def test_hint_does_not_change_hash(self):
+        """Tests that payloads differing only in `valid_until` count as unchanged."""
+        self.assertEqual(
+            payload_hash({'buses': [], 'valid_until': '2023-10-27T11:55:00+01:00'}),
+            payload_hash({'buses': [], 'valid_until': '2023-10-27T12:00:00+01:00'}),
+        )
+
+    def test_quiet_boards_live_longer(self):
+        """Tests that boards with nothing leaving soon are kept for longer, and listed trains are not."""
+        now = pytz.timezone('Europe/London').localize(datetime(2023, 10, 27, 11, 45))
+        soon = {'departures': {'all': [{'aimed_departure_time': '11:50'}]}}
+        later = {'departures': {'all': [{'aimed_departure_time': '12:45'}]}}
+        tomorrow = {'departures': {'19': [{'aimed_departure_time': '06:00'}]}}
+        self.assertEqual(board_lifetime(TRAIN, soon, now, 300, 1800), 300)
+        self.assertEqual(board_lifetime(TRAIN, later, now, 300, 1800), 300)
+        self.assertEqual(board_lifetime(TRAIN, {'departures': {'all': []}}, now, 300, 1800), 1800)
+        self.assertEqual(board_lifetime(BUS, {'departures': {'19': later['departures']['all']}}, now, 300, 1800), 1800)
+        self.assertEqual(board_lifetime(BUS, tomorrow, now, 300, 1800), 1800)
+        self.assertEqual(board_lifetime(BUS, {'departures': {}}, now, 300, 1800), 1800)
+        self.assertEqual(board_lifetime(BUS, MOCK_BUS_DATA, now, 300, 1800), 600)
+        self.assertEqual(board_lifetime(BUS, {'departures': {}}, now, 300, 300), 300)
+
+if __name__ == '__main__':
+    unittest.main()
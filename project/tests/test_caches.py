@@ -0,0 +1,187 @@
+import gc
+import tracemalloc
+import unittest
+from unittest.mock import patch, MagicMock
+from project import create_app, db
+from project.boards import BUS, get_board_store
+from project.caches import ByteBudgetCache, estimate_size
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    ADMIN_TOKEN = 'admin-secret'
+
+def make_board(n, departures=20):
+    """Builds a bus board shaped like TransportAPI's, with strings unique to `n`.
+
+    Args:
+        n (int): Makes every string in the board distinct from other boards.
+        departures (int): Number of departures on the board.
+
+    Returns:
+        dict: The board.
+    """
+    return {
+        'atcocode': f'490{n:09d}',
+        'departures': {
+            'all': [
+                {
+                    'line': f'{n % 400}-{i}',
+                    'direction': f'Destination {n} via stop {i}',
+                    'aimed_departure_time': f'{i % 24:02d}:{n % 60:02d}',
+                    'best_departure_estimate': f'{i % 24:02d}:{(n + 1) % 60:02d}',
+                    'operator_name': f'Operator {n}-{i}',
+                }
+                for i in range(departures)
+            ]
+        },
+    }
+
+class TestByteBudgetCache(unittest.TestCase):
+    """Test case for byte-budgeted caches."""
+
+    def test_estimate_size_follows_references(self):
+        """Tests that nested containers count towards the estimate, shared objects once."""
+        leaf = 'x' * 1000
+        self.assertGreater(estimate_size({'a': [leaf]}), 1000)
+        self.assertLess(estimate_size([leaf, leaf]), estimate_size([leaf, 'y' * 1000]))
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Tests that storing past the budget drops the least recently used entries."""
+        size = estimate_size('a') + estimate_size('x' * 100)
+        cache = ByteBudgetCache('test', max_bytes=size * 2)
+        cache.put('a', 'x' * 100)
+        cache.put('b', 'y' * 100)
+        cache.lookup('a')
+        cache.put('c', 'z' * 100)
+        self.assertEqual(cache.keys(), ['a', 'c'])
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.bytes, cache.max_bytes)
+
+    def test_oversized_entry_is_not_stored(self):
+        """Tests that an entry larger than the whole budget is rejected without evicting others."""
+        cache = ByteBudgetCache('test', max_bytes=500)
+        self.assertTrue(cache.put('a', 'x'))
+        self.assertFalse(cache.put('b', 'x' * 1000))
+        self.assertEqual(cache.keys(), ['a'])
+        self.assertEqual(cache.evictions, 0)
+
+    def test_replacing_and_popping_keep_bytes_accurate(self):
+        """Tests that the byte total follows replaced and removed entries."""
+        cache = ByteBudgetCache('test')
+        cache.put('a', 'x' * 100)
+        cache['a'] = 'x' * 10
+        self.assertEqual(cache.bytes, estimate_size('a') + estimate_size('x' * 10))
+        cache.pop('a')
+        self.assertEqual(cache.bytes, 0)
+
+    def test_stats(self):
+        """Tests the hit ratio and the largest entries in the report."""
+        cache = ByteBudgetCache('test', label=lambda key: key.upper())
+        cache.put('small', 'x')
+        cache.put('big', 'x' * 1000)
+        cache.lookup('big')
+        cache.lookup('missing')
+        stats = cache.stats(top=1)
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+        self.assertEqual(stats['largest'][0]['key'], 'BIG')
+        self.assertEqual(stats['bytes'], sum(e['bytes'] for e in cache.stats(top=2)['largest']))
+
+class TestTracedMemory(unittest.TestCase):
+    """Test case checking the estimates against what `tracemalloc` sees."""
+
+    def setUp(self):
+        """Starts tracing allocations."""
+        gc.collect()
+        tracemalloc.start()
+
+    def tearDown(self):
+        """Stops tracing allocations."""
+        tracemalloc.stop()
+
+    def test_estimate_tracks_traced_allocation(self):
+        """Tests that a board's estimate is within a small factor of the memory it allocates."""
+        before = tracemalloc.get_traced_memory()[0]
+        board = make_board(1)
+        traced = tracemalloc.get_traced_memory()[0] - before
+        estimate = estimate_size(board)
+        self.assertGreater(estimate, traced * 0.5)
+        self.assertLess(estimate, traced * 2)
+
+    def test_growth_is_bounded_by_budget(self):
+        """Tests that filling a cache far past its budget only retains about the budget."""
+        budget = 256 * 1024
+        cache = ByteBudgetCache('boards', max_bytes=budget)
+        before = tracemalloc.get_traced_memory()[0]
+        for n in range(500):
+            cache.put((BUS, 'id', f'stop{n}'), {'data': make_board(n), 'expires_at': 0.0})
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        self.assertGreater(cache.evictions, 0)
+        self.assertLessEqual(cache.bytes, budget)
+        # Allow for OrderedDict and size bookkeeping on top of the entries themselves.
+        self.assertLess(retained, budget * 1.5)
+
+class TestCacheReports(unittest.TestCase):
+    """Test case for the cache report endpoint and CLI command."""
+
+    def setUp(self):
+        """Sets up the test environment."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        get_board_store(self.app).put_board((BUS, 'id', '490000001'), make_board(1))
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_endpoint_requires_admin_token(self):
+        """Tests that the report is refused without the admin token."""
+        self.assertEqual(self.client.get('/admin/caches').status_code, 401)
+        response = self.client.get('/admin/caches', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_endpoint_reports_caches(self):
+        """Tests that the report lists every registered cache with its largest entries."""
+        response = self.client.get('/admin/caches?top=1', headers={'Authorization': 'Bearer admin-secret'})
+        self.assertEqual(response.status_code, 200)
+        caches = {c['name']: c for c in response.get_json()['caches']}
+        self.assertEqual(set(caches), {'boards', 'payloads', 'rate_limit_buckets', 'rate_limit_addresses'})
+        self.assertEqual(caches['boards']['entries'], 1)
+        self.assertEqual(caches['boards']['largest'][0]['key'], 'bus:id:490000001')
+        self.assertEqual(caches['boards']['max_bytes'], TestConfig.BOARD_CACHE_MAX_BYTES)
+
+    def test_cli(self):
+        """Tests that `flask cache-stats` prints the local caches."""
+        result = self.app.test_cli_runner().invoke(args=['cache-stats'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('boards: 1 entries', result.output)
+        self.assertIn('bus:id:490000001', result.output)
+
+    def test_cli_queries_worker(self):
+        """Tests that `flask cache-stats --url` reports a running worker's caches."""
+        report = self.client.get('/admin/caches', headers={'Authorization': 'Bearer admin-secret'}).get_json()
+        response = MagicMock(status_code=200, json=MagicMock(return_value=report))
+        with patch('requests.get', return_value=response) as mock_get:
+            result = self.app.test_cli_runner().invoke(args=['cache-stats', '--url', 'http://worker:8000/'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(mock_get.call_args.args[0], 'http://worker:8000/admin/caches')
+        self.assertEqual(mock_get.call_args.kwargs['headers'], {'Authorization': 'Bearer admin-secret'})
+        self.assertIn(f"Worker {report['pid']}:", result.output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import time
+import unittest
+from project import create_app, db
+from project.main import MOCK_TRAIN_DATA, fetch_train_data
+from project.metrics import get_metrics
+from project.providers import DarwinTrainProvider, HedgedProvider, TransportAPITrainProvider
+from project.tests.stand_in import StandInServer
+from project.upstream import UpstreamError
+from config import Config
+
+DARWIN_BOARD = {
+    "locationName": "Colchester",
+    "trainServices": [
+        {"std": "12:00", "etd": "On time", "platform": "3", "operator": "Greater Anglia",
+         "destination": [{"locationName": "London Liverpool Street", "crs": "LST"}]},
+        {"std": "12:15", "etd": "12:21", "platform": None, "operator": "Greater Anglia",
+         "destination": [{"locationName": "Norwich", "crs": "NRW"}]},
+        {"std": "12:30", "etd": "Cancelled", "operator": "CrossCountry",
+         "destination": [{"locationName": "Birmingham New Street", "crs": "BHM"}]},
+    ],
+}
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+class TestDarwinTrainProvider(unittest.TestCase):
+    """Test case for the Darwin feed adapter against a local stand-in."""
+
+    def test_converts_to_live_json_shape(self):
+        """Tests that Darwin services become TransportAPI-style departures."""
+        with StandInServer(default=(200, DARWIN_BOARD)) as darwin:
+            board = DarwinTrainProvider(darwin.url + '/departures/{code}', token='secret').departures(None, None, 'COL')
+            self.assertEqual(darwin.requests[0][1], '/departures/COL?accessToken=secret')
+        departures = board['departures']['all']
+        self.assertEqual([d['status'] for d in departures], ['ON TIME', 'LATE', 'CANCELLED'])
+        self.assertEqual(departures[0]['destination_name'], 'London Liverpool Street')
+        self.assertEqual(departures[1]['expected_departure_time'], '12:21')
+        self.assertEqual(departures[0]['operator_name'], 'Greater Anglia')
+
+class TestHedgedProvider(unittest.TestCase):
+    """Test case for hedging slow primary requests to the secondary."""
+
+    def setUp(self):
+        """Starts stand-ins for TransportAPI and a Darwin feed."""
+        self.primary = StandInServer(default=(200, MOCK_TRAIN_DATA)).__enter__()
+        self.addCleanup(self.primary.__exit__)
+        self.secondary = StandInServer(default=(200, DARWIN_BOARD)).__enter__()
+        self.addCleanup(self.secondary.__exit__)
+        self.outcomes = []
+
+    def hedged(self, budget=1.0, burst=5.0, **kwargs):
+        """Builds a hedged provider whose primary usually answers in 200ms.
+
+        Args:
+            budget (float): Hedges allowed per request.
+            burst (float): Hedges that can be saved up.
+            **kwargs: Other `HedgedProvider` arguments.
+
+        Returns:
+            HedgedProvider: The provider.
+        """
+        provider = HedgedProvider(
+            TransportAPITrainProvider(timeout=5, base_url=self.primary.url),
+            DarwinTrainProvider(self.secondary.url + '/departures/{code}', timeout=5),
+            budget=budget, burst=burst, min_delay=0.01, on_result=self.outcomes.append, **kwargs,
+        )
+        for _ in range(20):
+            provider.latency.record(0.2)
+        return provider
+
+    def test_fast_primary_is_not_hedged(self):
+        """Tests that the secondary is left alone while the primary is quick."""
+        board = self.hedged().departures('id', 'key', 'COL')
+        self.assertEqual(board, MOCK_TRAIN_DATA)
+        self.assertEqual(self.secondary.requests, [])
+        self.assertEqual(self.outcomes, ['primary'])
+        self.assertTrue(self.primary.requests[0][1].startswith('/train/station/COL/live.json?'))
+
+    def test_slow_primary_is_hedged(self):
+        """Tests that the secondary answers once the primary passes its p90."""
+        self.primary.delay = 1.0
+        started = time.monotonic()
+        board = self.hedged().departures('id', 'key', 'COL')
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(board['source'], 'darwin')
+        self.assertEqual(self.outcomes, ['hedged_secondary'])
+
+    def test_failed_primary_falls_back(self):
+        """Tests that a primary error also sends the request to the secondary."""
+        self.primary.default = (503, {})
+        provider = self.hedged()
+        self.assertEqual(provider.departures('id', 'key', 'COL')['source'], 'darwin')
+
+        self.secondary.default = (500, {})
+        with self.assertRaises(UpstreamError):
+            provider.departures('id', 'key', 'COL')
+        self.assertEqual(self.outcomes, ['hedged_secondary', 'hedged_failed'])
+
+    def test_definitive_errors_are_not_hedged(self):
+        """Tests that a rejected App Key or unknown code is raised rather than hedged."""
+        provider = self.hedged()
+        for status in (401, 404):
+            self.primary.default = (status, {})
+            with self.assertRaises(UpstreamError):
+                provider.departures('id', 'key', 'COL')
+        self.assertEqual(self.secondary.requests, [])
+        self.assertEqual(self.outcomes, ['primary_failed', 'primary_failed'])
+
+    def test_queue_time_does_not_count(self):
+        """Tests that time spent waiting for a pool thread is not taken as primary latency."""
+        provider = self.hedged(max_workers=1)
+        provider._executor.submit(time.sleep, 0.4)
+        self.assertEqual(provider.departures('id', 'key', 'COL'), MOCK_TRAIN_DATA)
+        self.assertEqual(self.secondary.requests, [])
+        self.assertEqual(self.outcomes, ['primary'])
+
+    def test_abandoned_primaries_are_bounded(self):
+        """Tests that no hedge is sent while too many losing primaries are still running."""
+        self.primary.delay = 0.5
+        provider = self.hedged(max_abandoned=1)
+        self.assertEqual(provider.departures('id', 'key', 'COL')['source'], 'darwin')
+        self.assertEqual(provider.departures('id', 'key', 'COL'), MOCK_TRAIN_DATA)
+        self.assertEqual(self.outcomes, ['hedged_secondary', 'budget_exhausted'])
+        self.assertEqual(len(self.secondary.requests), 1)
+
+    def test_budget_caps_hedges(self):
+        """Tests that hedges stop once the budget is spent."""
+        self.primary.delay = 0.5
+        provider = self.hedged(budget=0.0, burst=1.0)
+        provider.departures('id', 'key', 'COL')
+        provider.departures('id', 'key', 'COL')
+        self.assertEqual(self.outcomes, ['hedged_secondary', 'budget_exhausted'])
+        self.assertEqual(len(self.secondary.requests), 1)
+
+class TestHedgedTrainFetch(unittest.TestCase):
+    """Test case for `fetch_train_data` with a secondary provider configured."""
+
+    def test_fetch_train_data(self):
+        """Tests that the configured hedged provider sits under `fetch_train_data`."""
+        with StandInServer(default=(200, MOCK_TRAIN_DATA)) as primary, \
+                StandInServer(default=(200, DARWIN_BOARD)) as secondary:
+            class HedgedConfig(TestConfig):
+                TRANSPORTAPI_URL = primary.url
+                TRAIN_SECONDARY = 'darwin'
+                DARWIN_URL = secondary.url + '/departures/{code}'
+
+            app = create_app(HedgedConfig)
+            with app.app_context():
+                self.assertEqual(fetch_train_data('id', 'key', 'COL'), MOCK_TRAIN_DATA)
+                self.assertEqual(get_metrics(app).value('train_hedge_total', outcome='primary'), 1)
+
+    def test_darwin_needs_url(self):
+        """Tests that selecting the Darwin feed without a URL fails at start-up."""
+        class BrokenConfig(TestConfig):
+            TRAIN_SECONDARY = 'darwin'
+
+        with self.assertRaises(ValueError):
+            create_app(BrokenConfig)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from project import create_app, db
+from project.boards import BUS, TRAIN
+from project.leases import HashRing, LeaseManager, board_key_name
+from project.main import MOCK_TRAIN_DATA, MOCK_BUS_DATA
+from project.metrics import get_metrics
+from project.models import User, Installation
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    MIN_REFRESH_SECONDS = 0
+
+class TestHashRing(unittest.TestCase):
+    """Test case for consistent hashing of board keys."""
+
+    def test_adding_a_node_moves_few_keys(self):
+        """Tests that a new node only takes over its share of the keys."""
+        keys = [board_key_name((BUS, 'id', f'stop{n}')) for n in range(2000)]
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+        moved = [key for key in keys if before.owner(key) != after.owner(key)]
+        self.assertTrue(all(after.owner(key) == 'd' for key in moved))
+        self.assertLess(len(moved), len(keys) * 0.4)
+        self.assertEqual({before.owner(key) for key in keys}, {'a', 'b', 'c'})
+        self.assertIsNone(HashRing([]).owner(keys[0]))
+
+class TestLeaseManager(unittest.TestCase):
+    """Test case for lease acquisition and failover between two nodes."""
+
+    def setUp(self):
+        """Sets up two nodes sharing one database and one fake clock."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.now = [1000.0]
+        clock = lambda: self.now[0]
+        self.a = LeaseManager('a', lease_seconds=30, node_timeout=90, clock=clock)
+        self.b = LeaseManager('b', lease_seconds=30, node_timeout=90, clock=clock)
+        self.a.heartbeat()
+        self.b.heartbeat()
+        self.a.heartbeat()
+        # A board owned by node a.
+        self.key = next(
+            (TRAIN, 'id', f'S{n}') for n in range(100) if self.a.owner((TRAIN, 'id', f'S{n}')) == 'a'
+        )
+
+    def tearDown(self):
+        """Drops all tables and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_one_holder_at_a_time(self):
+        """Tests that only one node holds a lease and the other reads what it publishes."""
+        self.assertEqual(self.b.owner(self.key), 'a')
+        self.assertTrue(self.a.acquire(self.key, float('inf')))
+        self.assertFalse(self.b.acquire(self.key, float('inf')))
+        self.a.publish(self.key, {'data': {'x': 1}, 'fetched_at': 1000.0, 'expires_at': 1300.0})
+        self.assertEqual(self.b.read(self.key)['data'], {'x': 1})
+
+        # Slightly overdue: left to the owner.
+        self.now[0] = 1310.0
+        self.a.heartbeat()
+        self.assertFalse(self.b.acquire(self.key, 10))
+        self.assertTrue(self.a.acquire(self.key, 10))
+
+    def test_workers_of_one_node_hold_leases_separately(self):
+        """Tests that two worker processes sharing a `NODE_ID` cannot both hold a lease."""
+        self.assertTrue(self.a.acquire(self.key, float('inf')))
+        with patch('project.leases.os.getpid', return_value=os.getpid() + 1):
+            self.assertFalse(self.a.acquire(self.key, float('inf')))
+            self.a.release(self.key)
+        # The other worker's release did not free this worker's lease.
+        self.assertTrue(self.a.acquire(self.key, float('inf')))
+        with patch('project.leases.os.getpid', return_value=os.getpid() + 1):
+            self.assertFalse(self.a.acquire(self.key, float('inf')))
+
+    def test_failover(self):
+        """Tests that a dead node's boards pass to the survivors."""
+        self.assertTrue(self.a.acquire(self.key, float('inf')))
+        # Node a dies mid-fetch; its lease lapses, then it drops off the ring.
+        self.now[0] += 31
+        self.assertTrue(self.b.acquire(self.key, 31))
+        self.b.release(self.key)
+        self.now[0] += 90
+        self.b.heartbeat()
+        self.assertEqual(self.b.owner(self.key), 'b')
+        self.assertTrue(self.b.acquire(self.key, 0))
+
+class TestSharedRefresh(unittest.TestCase):
+    """Test case for board refreshes coordinated across app nodes."""
+
+    def setUp(self):
+        """Sets up three nodes on one database file and a shared installation."""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.remove, self.db_path)
+        self.apps = []
+        for name in ('a', 'b', 'c'):
+            class NodeConfig(TestConfig):
+                SQLALCHEMY_DATABASE_URI = f'sqlite:///{self.db_path}'
+                LEASES_ENABLED = True
+                NODE_ID = name
+            self.apps.append(create_app(NodeConfig))
+        with self.apps[0].app_context():
+            db.create_all()
+            db.session.add(Installation(
+                user=User(trmnl_id='user123'),
+                access_token='token123',
+                bus_stop='12345',
+                train_station='LST',
+                app_id='id',
+                app_key='key',
+            ))
+            db.session.commit()
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    @patch('project.main.fetch_bus_data', return_value=MOCK_BUS_DATA)
+    def test_upstream_calls_do_not_grow_with_nodes(self, mock_bus, mock_train):
+        """Tests that each board is fetched once however many nodes serve polls."""
+        headers = {'Authorization': 'Bearer token123'}
+        bodies = []
+        for _ in range(2):
+            for app in self.apps:
+                response = app.test_client().get('/api/data', headers=headers)
+                self.assertEqual(response.status_code, 200)
+                bodies.append(response.json)
+        self.assertEqual(mock_bus.call_count, 1)
+        self.assertEqual(mock_train.call_count, 1)
+        self.assertTrue(all(body == bodies[0] for body in bodies))
+        shared = sum(get_metrics(app).value('board_updates_total', source='shared') for app in self.apps)
+        self.assertEqual(shared, 4)
+
+if __name__ == '__main__':
+    unittest.main()
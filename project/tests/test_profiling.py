@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from project import create_app, db
+from project.main import MOCK_TRAIN_DATA
+from project.models import User, Installation
+from project.profiling import PROFILE_HEADER, aggregate_profiles, make_profile_token
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    MIN_REFRESH_SECONDS = 0
+
+class TestProfiling(unittest.TestCase):
+    """Test case for the opt-in request profiler."""
+
+    def setUp(self):
+        """Creates a temporary profile directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.profile_dir = os.path.join(self.tmp.name, 'profiles')
+
+    def _app(self, **overrides):
+        """Creates an app with one installation and the given profiling settings.
+
+        Args:
+            **overrides: Configuration values to set.
+
+        Returns:
+            Flask: The application, with its context pushed.
+        """
+        config = type('ProfileConfig', (TestConfig,), dict(PROFILE_DIR=self.profile_dir, **overrides))
+        app = create_app(config)
+        context = app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+        db.session.add(Installation(user=User(trmnl_id='user123'), access_token='token123',
+                                    train_station='LST', bus_stop='450012345'))
+        db.session.commit()
+        return app
+
+    def _dumps(self):
+        """Lists the profile dumps written so far, relative to the profile directory.
+
+        Returns:
+            list: `route/file` paths.
+        """
+        if not os.path.isdir(self.profile_dir):
+            return []
+        return [
+            os.path.join(route, name)
+            for route in sorted(os.listdir(self.profile_dir))
+            for name in sorted(os.listdir(os.path.join(self.profile_dir, route)))
+        ]
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_signed_header_forces_profile(self, mock_train):
+        """Tests that a signed header profiles one request, tagged with installation and stops."""
+        app = self._app()
+        client = app.test_client()
+        headers = {'Authorization': 'Bearer token123'}
+        client.get('/api/data', headers=headers)
+        self.assertEqual(self._dumps(), [])
+
+        client.get('/api/data', headers=dict(headers, **{PROFILE_HEADER: 'forged'}))
+        self.assertEqual(self._dumps(), [])
+
+        client.get('/api/data', headers=dict(headers, **{PROFILE_HEADER: make_profile_token(app)}))
+        dumps = self._dumps()
+        self.assertEqual(len(dumps), 1)
+        self.assertTrue(dumps[0].startswith('api.get_data/'))
+        self.assertIn('-i1-bus-450012345-train-LST', dumps[0])
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_sampling_and_aggregation(self, mock_train):
+        """Tests config-driven sampling and aggregation into collapsed stacks."""
+        app = self._app(PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1.0)
+        client = app.test_client()
+        for _ in range(3):
+            client.get('/api/data', headers={'Authorization': 'Bearer token123'})
+        self.assertEqual(len(self._dumps()), 3)
+
+        output = os.path.join(self.tmp.name, 'profile.folded')
+        self.assertEqual(aggregate_profiles(self.profile_dir, output), 3)
+        with open(output) as fh:
+            lines = fh.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, weight = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('api.get_data;'))
+            self.assertGreater(int(weight), 0)
+        self.assertTrue(any(':get_data' in line for line in lines))
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_unwritable_profile_dir(self, mock_train):
+        """Tests that a profile that cannot be written is logged and the response still served."""
+        # A regular file where the directory should be cannot be written to, even as root.
+        with open(self.profile_dir, 'w'):
+            pass
+        app = self._app(PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1.0)
+        with self.assertLogs('project.profiling', level='WARNING'):
+            response = app.test_client().get('/api/data', headers={'Authorization': 'Bearer token123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('trains', response.json)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import pytz
+from project import create_app, db
+from project.boards import get_board_store
+from project.boards import TRAIN
+from project.main import MOCK_TRAIN_DATA, refresh_all_boards, refresh_boards
+from project.metrics import get_metrics
+from project.models import User, Installation
+from project.push import PushDispatcher, get_pusher
+from project.tests.stand_in import StandInServer
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    PUSH_ENABLED = True
+    PUSH_BACKOFF_SECONDS = 0.01
+
+class TestPushDispatcher(unittest.TestCase):
+    """Test case for webhook delivery against a local stand-in receiver."""
+
+    def test_retries_transient_failures(self):
+        """Tests that 5xx/429 responses are retried and 4xx are not."""
+        with StandInServer() as receiver:
+            receiver.responses = [(503, {}), (429, {}), (200, {})]
+            outcomes = []
+            pusher = PushDispatcher(max_workers=1, retries=3, backoff=0.01, on_result=outcomes.append)
+            [ok] = pusher.dispatch([(1, receiver.url + '/hook', {'buses': []})])
+            self.assertTrue(ok.result(timeout=5))
+            self.assertEqual(len(receiver.requests), 3)
+            self.assertEqual(receiver.requests[-1][2], {'merge_variables': {'buses': []}})
+            self.assertEqual(outcomes, ['retried', 'retried', 'ok_after_retry'])
+
+            receiver.responses = [(404, {})]
+            [rejected] = pusher.dispatch([(1, receiver.url + '/hook', {})])
+            self.assertFalse(rejected.result(timeout=5))
+            self.assertEqual(len(receiver.requests), 4)
+
+    def test_gives_up_after_retries(self):
+        """Tests that a push fails once its retries are used up."""
+        with StandInServer(default=(500, {})) as receiver:
+            pusher = PushDispatcher(max_workers=2, retries=2, backoff=0.01)
+            [future] = pusher.dispatch([(1, receiver.url + '/hook', {})])
+            self.assertFalse(future.result(timeout=5))
+            self.assertEqual(len(receiver.requests), 3)
+            self.assertEqual(pusher.drain(timeout=5), 0)
+
+    def test_latest_payload_wins(self):
+        """Tests that a payload queued behind a busy worker is replaced by a newer one."""
+        with StandInServer() as receiver:
+            outcomes = []
+            pusher = PushDispatcher(max_workers=1, retries=0, on_result=outcomes.append)
+            blocker = threading.Event()
+            pusher._executor.submit(blocker.wait, 5)
+            first = pusher.dispatch([(1, receiver.url + '/hook', {'n': 1})])
+            second = pusher.dispatch([(1, receiver.url + '/hook', {'n': 2}), (2, receiver.url + '/other', {})])
+            self.assertIs(first[0], second[0])
+            blocker.set()
+            self.assertEqual(pusher.drain(timeout=5), 0)
+            self.assertEqual([body for _, path, body in receiver.requests if path == '/hook'],
+                             [{'merge_variables': {'n': 2}}])
+            self.assertEqual(sorted(outcomes), ['ok', 'ok', 'superseded'])
+
+class TestPushMode(unittest.TestCase):
+    """Test case for pushing changed payloads after board refreshes."""
+
+    def setUp(self):
+        """Sets up installations sharing a station, two of them pushed to a stand-in receiver.
+
+        The database is a file, so a second app can stand in for another process.
+        """
+        self.receiver = StandInServer().__enter__()
+        self.addCleanup(self.receiver.__exit__)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        class FileConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp.name, 'push.db')}"
+            PUSH_WEBHOOK_URL_TEMPLATE = self.receiver.url + '/hook/{installation_id}'
+
+        self.config_class = FileConfig
+        self.app = create_app(FileConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(trmnl_id='user123')
+        for n in (1, 2):
+            db.session.add(Installation(user=user, access_token=f'token{n}', trmnl_installation_id=f'inst{n}',
+                                        train_station='LST', min_train_time=0, app_id='id', app_key='key'))
+        # Not installed through TRMNL yet, so there is no webhook to push to.
+        db.session.add(Installation(user=user, access_token='token3', train_station='LST', min_train_time=0,
+                                    app_id='id', app_key='key'))
+        db.session.commit()
+        self.store = get_board_store(self.app)
+        self.pusher = get_pusher(self.app)
+
+        # Fix "now" to 11:45 so the mock departures are all in the future.
+        patcher = patch('project.main.datetime')
+        mock_datetime = patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_datetime.now.return_value = pytz.timezone('Europe/London').localize(datetime(2023, 10, 27, 11, 45))
+        mock_datetime.strptime = datetime.strptime
+        mock_datetime.combine = datetime.combine
+        mock_datetime.max = datetime.max
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_refresh_pushes_only_changed_payloads(self):
+        """Tests that a refresh pushes new payloads once and unchanged ones not at all."""
+        with patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA):
+            refresh_all_boards(self.store)
+            refresh_all_boards(self.store, force=True)
+            self.pusher.drain(timeout=5)
+        self.assertEqual(sorted(path for _, path, _ in self.receiver.requests), ['/hook/inst1', '/hook/inst2'])
+        self.receiver.requests.clear()
+
+        changed = {'departures': {'all': []}}
+        with patch('project.main.fetch_train_data', return_value=changed):
+            refresh_all_boards(self.store, force=True)
+            self.pusher.drain(timeout=5)
+        self.assertEqual(sorted(path for _, path, _ in self.receiver.requests), ['/hook/inst1', '/hook/inst2'])
+        merge_variables = self.receiver.requests[-1][2]['merge_variables']
+        self.assertIn('valid_until', merge_variables)
+        self.assertEqual({'buses': merge_variables['buses'], 'trains': merge_variables['trains']},
+                         {'buses': [], 'trains': []})
+        self.assertEqual(get_metrics(self.app).value('push_total', outcome='ok'), 4)
+
+    def test_scheduled_refreshes_in_new_processes_push(self):
+        """Tests that `refresh-boards` runs in separate processes push changes, and only changes."""
+        def refresh_in_new_app(board):
+            app = create_app(self.config_class)
+            with app.app_context(), patch('project.main.fetch_train_data', return_value=board):
+                refresh_all_boards(get_board_store(app))
+                get_pusher(app).drain(timeout=5)
+
+        refresh_in_new_app(MOCK_TRAIN_DATA)
+        self.assertEqual(len(self.receiver.requests), 2)
+        refresh_in_new_app(MOCK_TRAIN_DATA)
+        self.assertEqual(len(self.receiver.requests), 2)
+        refresh_in_new_app({'departures': {'all': []}})
+        self.assertEqual(len(self.receiver.requests), 4)
+        self.assertEqual(self.receiver.requests[-1][2]['merge_variables']['trains'], [])
+
+    def test_boards_from_other_nodes_are_not_pushed(self):
+        """Tests that only the process that fetched a board from upstream pushes its changes."""
+        with patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA):
+            refresh_all_boards(self.store)
+        self.pusher.drain(timeout=5)
+        self.receiver.requests.clear()
+        key = (TRAIN, 'id', 'LST')
+
+        def shared(store, key, installation):
+            store.put_board(key, {'departures': {'all': []}})
+            return 'shared', None
+
+        with patch('project.main.update_board', side_effect=shared):
+            self.assertEqual(refresh_boards(self.store, [key], Installation.query.first()), 3)
+        self.pusher.drain(timeout=5)
+        self.assertEqual(self.receiver.requests, [])
+        self.assertEqual(self.store.payloads.get(1)['payload']['trains'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import patch
+from project import create_app, db
+from project import main as main_module
+from project.main import MOCK_TRAIN_DATA
+from project.metrics import get_metrics
+from project.models import User, Installation
+from project.ratelimit import RateLimiter
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    RATE_LIMIT_PER_MINUTE = 6
+    RATE_LIMIT_BURST = 3
+    MIN_REFRESH_SECONDS = 0
+    ADMIN_TOKEN = 'admin-secret'
+
+class TestRateLimiter(unittest.TestCase):
+    """Test case for the token-bucket limiter itself."""
+
+    def test_burst_then_refill(self):
+        """Tests that a bucket allows its burst, then refills at its rate."""
+        now = [0.0]
+        limiter = RateLimiter(per_minute=60, burst=3, clock=lambda: now[0])
+        # Configuring charges the request that authenticated the token.
+        limiter.configure('t')
+        self.assertEqual(limiter.check('t'), 0)
+        self.assertEqual(limiter.check('t'), 0)
+        self.assertAlmostEqual(limiter.check('t'), 1.0)
+        now[0] += 1.0
+        self.assertEqual(limiter.check('t'), 0)
+        # Tokens that never authenticated have no bucket.
+        self.assertIsNone(limiter.check('other'))
+
+    def test_configure_overrides_defaults(self):
+        """Tests that per-installation limits replace the defaults for that token."""
+        now = [0.0]
+        limiter = RateLimiter(per_minute=60, burst=5, clock=lambda: now[0])
+        limiter.configure('t', per_minute=6, burst=2)
+        self.assertEqual(limiter.check('t'), 0)
+        self.assertAlmostEqual(limiter.check('t'), 10.0)
+
+    def test_bucket_count_is_bounded(self):
+        """Tests that the least recently used buckets are dropped past `max_tokens`."""
+        limiter = RateLimiter(per_minute=60, burst=1, max_tokens=2)
+        for token in ('a', 'b', 'c'):
+            limiter.configure(token)
+        self.assertEqual(list(limiter.buckets), ['b', 'c'])
+
+    def test_unknown_tokens_cannot_evict_real_buckets(self):
+        """Tests that a flood of made-up tokens only fills the address buckets."""
+        now = [0.0]
+        limiter = RateLimiter(per_minute=60, burst=2, max_tokens=2, max_addresses=2, clock=lambda: now[0])
+        limiter.configure('real')
+        for n in range(100):
+            if limiter.check(f'fake{n}') is None and not limiter.check_address(f'10.0.0.{n % 5}'):
+                limiter.charge_address(f'10.0.0.{n % 5}')
+        self.assertEqual(list(limiter.buckets), ['real'])
+        self.assertEqual(limiter.check('real'), 0)
+        self.assertLessEqual(len(limiter.addresses), 2)
+
+class TestPollThrottling(unittest.TestCase):
+    """Test case for throttling runaway pollers of `/api/data`."""
+
+    def setUp(self):
+        """Sets up the test environment with one configured installation."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        self.installation = Installation(
+            user=User(trmnl_id='user123'),
+            access_token='token123',
+            trmnl_installation_id='inst123',
+            train_station='LST',
+            app_id='id',
+            app_key='key',
+        )
+        db.session.add(self.installation)
+        db.session.commit()
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _poll(self, token='token123'):
+        """Polls `/api/data` with the given token.
+
+        Args:
+            token (str): The access token.
+
+        Returns:
+            Response: The test client response.
+        """
+        return self.client.get('/api/data', headers={'Authorization': f'Bearer {token}'})
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_tight_loop_is_throttled(self, mock_train):
+        """Tests that polls beyond the burst get 429 with Retry-After and are counted."""
+        statuses = [self._poll().status_code for _ in range(5)]
+        self.assertEqual(statuses, [200, 200, 200, 429, 429])
+        self.assertIn('Retry-After', self._poll().headers)
+        self.assertEqual(get_metrics(self.app).value('api_throttled_total', reason='rate_limit'), 3)
+
+    def test_invalid_token_is_throttled(self):
+        """Tests that a looping client with a bad token is throttled too."""
+        statuses = [self._poll('bogus').status_code for _ in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_valid_tokens_share_an_address(self, mock_train):
+        """Tests that many installations behind one address are not throttled by each other."""
+        for n in range(20):
+            db.session.add(Installation(user=User(trmnl_id=f'shared{n}'), access_token=f'shared{n}',
+                                        train_station='LST', app_id='id', app_key='key'))
+        db.session.commit()
+        statuses = [self._poll(f'shared{n}').status_code for n in range(20)]
+        self.assertEqual(statuses, [200] * 20)
+        # Failed attempts from the same address are still limited.
+        statuses = [self._poll('bogus').status_code for _ in range(4)]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        self.assertEqual(self._poll('shared0').status_code, 200)
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_per_installation_limits(self, mock_train):
+        """Tests that an installation's own burst applies from its first poll."""
+        self.installation.poll_burst = 1
+        db.session.commit()
+        # The first poll creates the token's bucket and uses its only request.
+        statuses = [self._poll().status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 429, 429])
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_min_refresh_window(self, mock_train):
+        """Tests that polls inside the minimum refresh window reuse the previous payload."""
+        self.installation.min_refresh_seconds = 60
+        db.session.commit()
+        with patch('project.main.refresh_boards') as mock_refresh, \
+                patch('project.main.materialize_payload', wraps=main_module.materialize_payload) as mock_materialize:
+            first = self._poll()
+            self.assertEqual(mock_refresh.call_count, 1)
+            second = self._poll()
+            self.assertEqual(second.json, first.json)
+            self.assertEqual(mock_refresh.call_count, 1)
+            self.assertEqual(mock_materialize.call_count, 1)
+        self.assertEqual(get_metrics(self.app).value('api_throttled_total', reason='min_refresh'), 1)
+
+    def test_metrics_endpoint(self):
+        """Tests that `/metrics` requires the admin token and reports throttled counts."""
+        for _ in range(5):
+            self._poll('bogus')
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer admin-secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('api_throttled_total{reason="rate_limit"} 2', response.get_data(as_text=True))
+
+if __name__ == '__main__':
+    unittest.main()
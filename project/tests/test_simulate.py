@@ -0,0 +1,122 @@
+import json
+import unittest
+from datetime import datetime
+from project import create_app
+from project import main as main_module
+from project.clock import get_clock
+from project.simulate import poll_times, simulate_day, synthetic_population
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+# Three devices sharing one App ID and station, polling every 15 minutes.
+SHARED_STATION = [
+    {'app_id': 'app', 'train_station': 'LST', 'interval': 900, 'offset': offset}
+    for offset in (0, 300, 600)
+]
+
+class TestSimulation(unittest.TestCase):
+    """Test case for the full-day policy simulator."""
+
+    def test_poll_times(self):
+        """Tests interval schedules with a sleep window, and recorded schedules."""
+        times = poll_times({'interval': 3600, 'offset': 60, 'sleep': (0, 6)})
+        self.assertEqual(times[0], 6 * 3600 + 60)
+        self.assertEqual(len(times), 18)
+        self.assertEqual(poll_times({'polls': [90000, 30, 10]}), [10, 30])
+
+    def test_synthetic_population_is_reproducible(self):
+        """Tests that a seed always yields the same population."""
+        self.assertEqual(synthetic_population(5, seed=3), synthetic_population(5, seed=3))
+
+    def test_shared_board_is_fetched_once_per_ttl(self):
+        """Tests upstream calls and staleness against the board TTL, with the clock restored afterwards."""
+        report = simulate_day(SHARED_STATION, {'config': {'BOARD_TTL_SECONDS': 1800}}, daily_limit=0)
+        self.assertEqual(report['polls'], 288)
+        self.assertEqual(report['throttled'], 0)
+        self.assertEqual(list(report['calls_per_key']), ['train:app:LST'])
+        # At most one call per TTL (plus the first), fewer while quiet at night.
+        self.assertLessEqual(report['upstream_calls'], 49)
+        self.assertLessEqual(report['staleness']['max'], 1800)
+        # The simulated clock belongs to the simulated app only.
+        self.assertIs(main_module.datetime, datetime)
+        self.assertIsNone(get_clock(create_app(TestConfig)))
+
+    def test_policies_compare(self):
+        """Tests that a longer TTL trades upstream calls for staleness."""
+        short = simulate_day(SHARED_STATION, {'config': {'BOARD_TTL_SECONDS': 300}}, daily_limit=0)
+        long = simulate_day(SHARED_STATION, {'config': {'BOARD_TTL_SECONDS': 3600}}, daily_limit=0)
+        self.assertLess(long['upstream_calls'], short['upstream_calls'])
+        self.assertGreater(long['staleness']['p90'], short['staleness']['p90'])
+
+    def test_scheduled_refresh_keeps_polls_off_upstream(self):
+        """Tests that with scheduled refreshes polls never wait on upstream."""
+        report = simulate_day(
+            SHARED_STATION,
+            {'config': {'BOARD_TTL_SECONDS': 3600, 'QUIET_BOARD_TTL_SECONDS': 3600}, 'refresh_every': 1800},
+            daily_limit=0,
+        )
+        # Runs every 30 minutes skip boards that are still inside their hour.
+        self.assertEqual(report['upstream_calls'], 24)
+        self.assertLess(report['latency_ms']['max'], 100)
+
+    def test_quota_is_reported(self):
+        """Tests that calls beyond the daily limit are rejected, backed off and reported."""
+        report = simulate_day(SHARED_STATION, {'config': {'BOARD_TTL_SECONDS': 300}}, daily_limit=10)
+        rejected = report['over_quota']['app']
+        self.assertGreater(rejected, 0)
+        self.assertEqual(report['upstream_calls'], 10 + rejected)
+        # Backoff keeps failing polls from retrying every time.
+        self.assertLess(report['upstream_calls'], 96)
+        self.assertGreater(report['staleness']['max'], 6 * 3600)
+        self.assertLess(report['quota_exhausted_at']['app'], 12 * 3600)
+
+    def test_quota_resets_at_midnight(self):
+        """Tests that the stub's daily limit starts again on the next day."""
+        report = simulate_day(SHARED_STATION, {'config': {'BOARD_TTL_SECONDS': 3600}}, duration=2 * 86400,
+                              daily_limit=20)
+        calls = report['calls_per_app_id']['app']
+        # Both days get their own 20 calls before being rejected.
+        self.assertGreaterEqual(calls - report['over_quota']['app'], 40)
+
+    def test_cli(self):
+        """Tests that `flask simulate-day` prints reports and enforces `--max-calls-per-key`."""
+        runner = create_app(TestConfig).test_cli_runner()
+        args = ['simulate-day', '--population', self._population_file()]
+        result = runner.invoke(args=args + ['--json'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(set(json.loads(result.output)), {'default', 'ttl-30m', 'ttl-1h', 'scheduled-1h'})
+        self.assertNotIn('QUOTA EXHAUSTED', runner.invoke(args=args).output)
+        result = runner.invoke(args=args + ['--daily-limit', '30'])
+        self.assertIn('default: QUOTA EXHAUSTED for 1 of 1 App IDs', result.output)
+        result = runner.invoke(args=args + ['--max-calls-per-key', '30'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('default', result.output.splitlines()[-1])
+        self.assertNotIn('ttl-1h', result.output.splitlines()[-1])
+
+    def _population_file(self):
+        """Writes `SHARED_STATION` to a temporary JSON file.
+
+        Returns:
+            str: The file's path.
+        """
+        import os
+        import tempfile
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(SHARED_STATION, fh)
+        self.addCleanup(os.remove, path)
+        return path
+
+if __name__ == '__main__':
+    unittest.main()
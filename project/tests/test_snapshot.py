@@ -0,0 +1,157 @@
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+from types import SimpleNamespace
+from unittest.mock import patch
+from project import create_app, db
+from project.boards import BoardStore, get_board_store, settings_fingerprint, TRAIN
+from project.main import MOCK_TRAIN_DATA
+from project.models import User, Installation
+from project.snapshot import HEADER, MAGIC, VERSION, load_snapshot, write_snapshot
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+# Settings fingerprints of installations reading the LST and CBG boards.
+LST = ('', None, 'LST', None, None, 'id', 'key')
+CBG = ('', None, 'CBG', None, None, 'id', 'key')
+
+class TestSnapshot(unittest.TestCase):
+    """Test case for snapshotting and restoring the board store."""
+
+    def setUp(self):
+        """Creates a temporary directory for snapshot files."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'boards.snap')
+        self.now = [1000.0]
+
+    def _store(self):
+        """Returns a store driven by the test's fake wall clock.
+
+        Returns:
+            BoardStore: A new, empty store.
+        """
+        return BoardStore(ttl=60, clock=lambda: self.now[0])
+
+    def test_round_trip_honours_ttl(self):
+        """Tests that unexpired boards and payloads survive a round trip and expired boards do not."""
+        store = self._store()
+        store.put_board((TRAIN, 'id', 'LST'), MOCK_TRAIN_DATA)
+        self.now[0] += 30
+        store.put_board((TRAIN, 'id', 'CBG'), {'departures': {'all': []}})
+        store.put_payload(7, CBG, {'buses': [], 'trains': []})
+        write_snapshot(store, self.path)
+
+        self.now[0] += 40  # LST has expired, CBG has not.
+        restored = self._store()
+        self.assertEqual(load_snapshot(restored, self.path), 1)
+        self.assertIn((TRAIN, 'id', 'CBG'), restored.boards)
+        self.assertNotIn((TRAIN, 'id', 'LST'), restored.boards)
+        self.assertEqual(restored.payload(7, CBG), {'buses': [], 'trains': []})
+
+    def test_stale_payloads_are_skipped(self):
+        """Tests that payloads past `valid_until`, or whose board was not restored, are dropped."""
+        store = self._store()
+        store.put_board((TRAIN, 'id', 'LST'), MOCK_TRAIN_DATA, ttl=10)
+        store.put_board((TRAIN, 'id', 'CBG'), {'departures': {'all': []}}, ttl=600)
+        store.put_payload(1, LST, {'buses': [], 'trains': []})
+        store.put_payload(2, CBG, {'buses': [], 'trains': [], 'valid_until': '1970-01-01T00:16:50+00:00'})
+        store.put_payload(3, CBG, {'buses': [], 'trains': [], 'valid_until': '1970-01-01T00:20:00+00:00'})
+        write_snapshot(store, self.path)
+
+        self.now[0] += 20  # The LST board has expired; payload 2 is past its valid_until.
+        restored = self._store()
+        load_snapshot(restored, self.path)
+        self.assertIsNone(restored.payload(1, LST))
+        self.assertIsNone(restored.payload(2, CBG))
+        self.assertIsNotNone(restored.payload(3, CBG))
+
+    def test_unsupported_version_is_ignored(self):
+        """Tests that snapshots written by another format version are not loaded."""
+        store = self._store()
+        store.put_board((TRAIN, 'id', 'LST'), MOCK_TRAIN_DATA)
+        write_snapshot(store, self.path)
+        with open(self.path, 'r+b') as fh:
+            fh.seek(len(MAGIC))
+            fh.write(struct.pack('>H', 99))
+        self.assertEqual(load_snapshot(self._store(), self.path), 0)
+
+    def test_app_keys_are_not_written(self):
+        """Tests that snapshots keep a digest of the App Key rather than the key itself."""
+        installation = SimpleNamespace(bus_stop='', bus_direction=None, train_station='LST', train_destination=None,
+                                       min_train_time=None, app_id='id', app_key='secret-app-key')
+        fingerprint = settings_fingerprint(installation)
+        store = self._store()
+        store.put_board((TRAIN, 'id', 'LST'), MOCK_TRAIN_DATA)
+        store.put_payload(1, fingerprint, {'buses': [], 'trains': []})
+        write_snapshot(store, self.path)
+
+        with open(self.path, 'rb') as fh:
+            self.assertNotIn(b'secret-app-key', zlib.decompress(fh.read()[HEADER.size:]))
+        restored = self._store()
+        load_snapshot(restored, self.path)
+        self.assertEqual(restored.payload(1, fingerprint), {'buses': [], 'trains': []})
+
+    def test_missing_or_corrupt_file(self):
+        """Tests that a missing or truncated file restores nothing."""
+        self.assertEqual(load_snapshot(self._store(), self.path), 0)
+        with open(self.path, 'wb') as fh:
+            fh.write(MAGIC)
+        self.assertEqual(load_snapshot(self._store(), self.path), 0)
+        with open(self.path, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, VERSION, 0, 10) + b'x' * 10)
+        self.assertEqual(load_snapshot(self._store(), self.path), 0)
+
+class TestWarmRestart(unittest.TestCase):
+    """Test case for restoring caches when a worker starts."""
+
+    def setUp(self):
+        """Sets up an app with snapshots enabled and one configured installation."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db_path = os.path.join(self.tmp.name, 'site.db')
+
+        class SnapshotConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{self.db_path}'
+            SNAPSHOT_PATH = os.path.join(self.tmp.name, 'boards.snap')
+
+        self.config = SnapshotConfig
+        app = create_app(self.config)
+        with app.app_context():
+            db.create_all()
+            user = User(trmnl_id='user123')
+            db.session.add(Installation(user=user, access_token='token123', train_station='LST',
+                                        app_id='id', app_key='key'))
+            db.session.commit()
+            db.session.remove()
+
+    @patch('project.main.fetch_train_data', return_value=MOCK_TRAIN_DATA)
+    def test_warm_cache_then_restart(self, mock_train):
+        """Tests that `flask warm-cache` lets a fresh worker serve polls without upstream calls."""
+        app = create_app(self.config)
+        result = app.test_cli_runner().invoke(args=['warm-cache'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(mock_train.call_count, 1)
+
+        restarted = create_app(self.config)
+        self.assertIn((TRAIN, 'id', 'LST'), get_board_store(restarted).boards)
+        with restarted.app_context():
+            response = restarted.test_client().get('/api/data', headers={'Authorization': 'Bearer token123'})
+            db.session.remove()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_train.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from project import create_app, db
+from project.startup import measure_cold_start
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+class TestStartup(unittest.TestCase):
+    """Test case for app profiles and the cold-start harness."""
+
+    def _rules(self, app):
+        """Returns the URL rules registered on `app`, excluding static files.
+
+        Args:
+            app (Flask): The application to inspect.
+
+        Returns:
+            set: The registered rule strings.
+        """
+        return {rule.rule for rule in app.url_map.iter_rules() if rule.endpoint != 'static'}
+
+    def test_data_profile_registers_only_polling_route(self):
+        """Tests that the data profile serves `/api/data` (and its operator endpoints) and nothing else."""
+        app = create_app(TestConfig, profile='data')
+        self.assertEqual(self._rules(app), {'/api/data', '/metrics', '/admin/caches'})
+        self.assertNotIn('trmnl_oauth', app.extensions)
+        self.assertNotIn('csrf', app.extensions)
+
+    def test_full_profile_registers_every_route(self):
+        """Tests that the full profile keeps the install, webhook and settings routes."""
+        app = create_app(TestConfig)
+        rules = self._rules(app)
+        for rule in ('/install', '/callback', '/manage', '/api/data',
+                     '/webhook/installation_success', '/webhook/uninstall'):
+            self.assertIn(rule, rules)
+
+    def test_full_profile_migrations_are_lazy(self):
+        """Tests that `flask db` is always registered but sets up Flask-Migrate only when used."""
+        app = create_app(TestConfig)
+        self.assertIn('db', app.cli.commands)
+        self.assertNotIn('migrate', app.extensions)
+        result = app.test_cli_runner().invoke(args=['db', '--help'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('upgrade', result.output)
+        self.assertIn('migrate', app.extensions)
+        self.assertNotIn('db', create_app(TestConfig, profile='data').cli.commands)
+
+    def test_unknown_profile(self):
+        """Tests that an unknown profile is rejected."""
+        with self.assertRaises(ValueError):
+            create_app(TestConfig, profile='bogus')
+
+    def test_data_profile_polling_works(self):
+        """Tests that a data-only app can authenticate and answer a poll."""
+        app = create_app(TestConfig, profile='data')
+        with app.app_context():
+            db.create_all()
+            response = app.test_client().get('/api/data')
+            self.assertEqual(response.status_code, 401)
+            db.drop_all()
+
+    def test_data_profile_cold_start_skips_heavy_modules(self):
+        """Tests that a fresh data-only process never imports the form/OAuth/migration stack."""
+        result = measure_cold_start('data', runs=1)
+        self.assertEqual(result['heavy_modules'], [])
+        self.assertGreater(result['total_ms'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
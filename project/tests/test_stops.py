@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from project import create_app, db
+from project.models import User, Installation
+from project.stops import StopIndex
+from config import Config
+
+NAPTAN_CSV = """ATCOCode,CommonName,LocalityName,Street
+450012345,Leeds Bus Station,Leeds,Dyer Street
+450012346,Leeds Station,Leeds,New Station Street
+0100BRP90312,Temple Meads Station,Bristol,Station Approach
+"""
+
+CRS_CSV = """CrsCode,StationName
+LST,London Liverpool Street
+LIV,Liverpool Lime Street
+CBG,Cambridge
+"""
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+class TestStopIndex(unittest.TestCase):
+    """Test case for the prefix index itself."""
+
+    def setUp(self):
+        """Builds an index over a few stations."""
+        self.index = StopIndex([
+            ('LST', 'London Liverpool Street', ''),
+            ('LIV', 'Liverpool Lime Street', ''),
+            ('CBG', 'Cambridge', ''),
+            ('lst', 'Duplicate', ''),
+        ])
+
+    def test_code_lookup(self):
+        """Tests exact, case-insensitive code lookups; the first record for a code wins."""
+        self.assertIn('lst', self.index)
+        self.assertNotIn('XYZ', self.index)
+        self.assertEqual(self.index.get('lst')['name'], 'London Liverpool Street')
+        self.assertEqual(len(self.index), 3)
+
+    def test_prefix_search(self):
+        """Tests code prefixes first, then any word of the name, then multi-word prefixes."""
+        self.assertEqual([r['code'] for r in self.index.search('li')], ['LIV', 'LST'])
+        self.assertEqual([r['code'] for r in self.index.search('street')], ['LST', 'LIV'])
+        self.assertEqual([r['code'] for r in self.index.search('Liverpool  St')], ['LST'])
+        self.assertEqual([r['code'] for r in self.index.search('liverpool l')], ['LIV'])
+        self.assertEqual(self.index.search('li', limit=1), [{'code': 'LIV', 'name': 'Liverpool Lime Street', 'locality': ''}])
+        self.assertEqual(self.index.search(''), [])
+
+class TestStopLookup(unittest.TestCase):
+    """Test case for the typeahead endpoint and settings validation."""
+
+    def setUp(self):
+        """Sets up an app with NaPTAN and CRS reference files."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        paths = {}
+        for name, content in (('naptan.csv', NAPTAN_CSV), ('crs.csv', CRS_CSV)):
+            paths[name] = os.path.join(self.tmp.name, name)
+            with open(paths[name], 'w') as fh:
+                fh.write(content)
+
+        class StopsConfig(TestConfig):
+            NAPTAN_PATH = paths['naptan.csv']
+            CRS_PATH = paths['crs.csv']
+
+        self.app = create_app(StopsConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        db.session.add(Installation(user=User(trmnl_id='user123'), access_token='token123'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @patch('requests.get', side_effect=AssertionError('no network expected'))
+    def test_typeahead(self, mock_get):
+        """Tests that the lookup answers from local data only."""
+        response = self.client.get('/api/stops?kind=bus&q=leeds')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['code'] for r in response.json], ['450012345', '450012346'])
+        self.assertEqual(response.json[0]['locality'], 'Leeds')
+
+        response = self.client.get('/api/stops?kind=train&q=cam')
+        self.assertEqual(response.json, [{'code': 'CBG', 'name': 'Cambridge', 'locality': ''}])
+        self.assertEqual(self.client.get('/api/stops?kind=ferry&q=x').status_code, 400)
+
+    def _save(self, **settings):
+        """Posts the settings form.
+
+        Args:
+            **settings: Form values.
+
+        Returns:
+            Response: The test client response.
+        """
+        data = dict(min_train_time=30, **settings)
+        return self.client.post('/manage', headers={'Authorization': 'Bearer token123'}, data=data)
+
+    def test_unknown_codes_are_rejected(self):
+        """Tests that typos are caught on save and nothing is stored."""
+        response = self._save(bus_stop='450099999', train_station='LSX')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn('Unknown bus stop ATCO code', body)
+        self.assertIn('Unknown station CRS code', body)
+        self.assertIsNone(Installation.query.first().bus_stop)
+
+    def test_valid_codes_are_normalized(self):
+        """Tests that known codes are accepted and upper-cased."""
+        response = self._save(bus_stop='0100brp90312', train_station='lst')
+        self.assertEqual(response.status_code, 302)
+        installation = Installation.query.first()
+        self.assertEqual(installation.bus_stop, '0100BRP90312')
+        self.assertEqual(installation.train_station, 'LST')
+
+    def test_without_reference_data(self):
+        """Tests that validation is skipped and the lookup is 404 when no data is configured."""
+        app = create_app(TestConfig)
+        with app.app_context():
+            self.assertEqual(app.test_client().get('/api/stops?q=lst').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from datetime import timedelta
+from unittest.mock import patch
+from project import create_app, db
+from project.models import User, Installation, utcnow
+from project.sweeper import InstallSweeper, get_sweeper
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    INSTALL_STATE_TTL_SECONDS = 3600
+    INSTALL_SWEEP_BATCH_SIZE = 2
+
+class TestInstallSweeper(unittest.TestCase):
+    """Test case for deleting abandoned install attempts."""
+
+    def setUp(self):
+        """Sets up abandoned, recent, authorized and finished installs."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        old = utcnow() - timedelta(hours=2)
+        for n in range(5):
+            db.session.add(Installation(install_state=f'abandoned{n}', created_at=old))
+        db.session.add(Installation(install_state='recent'))
+        # Authorized but the success webhook never arrived; the token is in use.
+        db.session.add(Installation(install_state='no-webhook', access_token='token1', created_at=old))
+        db.session.add(Installation(
+            user=User(trmnl_id='user123'), access_token='token2', trmnl_installation_id='inst', created_at=old,
+        ))
+        db.session.commit()
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def remaining_states(self):
+        """Returns the install states left in the table.
+
+        Returns:
+            set: The `install_state` of every row.
+        """
+        return {installation.install_state for installation in Installation.query}
+
+    def test_sweep_in_batches(self):
+        """Tests that only expired pending installs are deleted, batch by batch."""
+        sweeper = get_sweeper(self.app)
+        self.assertEqual(sweeper.sweep(max_batches=1), 2)
+        self.assertEqual(sweeper.sweep(), 3)
+        self.assertEqual(self.remaining_states(), {'recent', 'no-webhook', None})
+
+    def test_opportunistic_sweep_is_rate_limited(self):
+        """Tests that `maybe_sweep` runs at most one batch per interval."""
+        now = [0.0]
+        sweeper = InstallSweeper(max_age=3600, batch_size=2, interval=300, clock=lambda: now[0])
+        self.assertEqual(sweeper.maybe_sweep(), 2)
+        self.assertEqual(sweeper.maybe_sweep(), 0)
+        now[0] = 300.0
+        self.assertEqual(sweeper.maybe_sweep(), 2)
+
+    @patch('project.main.oauth')
+    def test_install_sweeps(self, mock_oauth):
+        """Tests that `/install` clears abandoned attempts as it adds its own."""
+        mock_oauth.trmnl.authorize_redirect.return_value = 'redirect'
+        self.client = self.app.test_client()
+        self.client.get('/install')
+        self.assertEqual(Installation.query.count(), 9 - 2)
+
+    def test_sweep_uses_partial_index(self):
+        """Tests that the sweeper's scan is answered from the pending-install index."""
+        query = (
+            db.session.query(Installation.id)
+            .filter(Installation.install_state.isnot(None))
+            .filter(Installation.created_at < utcnow())
+            .order_by(Installation.created_at)
+        )
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(row) for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+        self.assertIn('ix_installation_pending_created_at', plan)
+
+    def test_cli(self):
+        """Tests the `sweep-installs` command."""
+        result = self.app.test_cli_runner().invoke(args=['sweep-installs'])
+        self.assertIn('Deleted 5 abandoned install(s)', result.output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+from unittest.mock import patch
+import pytz
+from project import create_app, db
+from project.models import User, Installation
+from project.providers import get_provider
+from project.timetable import TimetableStore, import_gtfs
+from config import Config
+
+FEED = {
+    'agency.txt': [
+        'agency_id,agency_name',
+        'FL,First Leeds',
+        'AR,Arriva Yorkshire',
+    ],
+    'routes.txt': [
+        'route_id,agency_id,route_short_name',
+        'r19,FL,19',
+        'r163,AR,163',
+    ],
+    'trips.txt': [
+        'route_id,service_id,trip_id,trip_headsign',
+        'r19,WEEKDAY,t1,East Garforth',
+        'r19,WEEKDAY,t2,East Garforth',
+        'r19,WEEKDAY,t3,East Garforth',
+        'r163,WEEKDAY,t4,Castleford',
+        'r19,SUNDAY,t5,East Garforth',
+    ],
+    'stop_times.txt': [
+        'trip_id,arrival_time,departure_time,stop_id,stop_sequence',
+        't1,11:59:00,12:00:00,450012345,1',
+        't2,12:29:00,12:30:00,450012345,1',
+        't3,25:09:00,25:10:00,450012345,1',
+        't4,12:10:00,12:10:00,450012345,1',
+        't5,10:00:00,10:00:00,450012345,1',
+    ],
+    'calendar.txt': [
+        'service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date',
+        'WEEKDAY,1,1,1,1,1,0,0,20230101,20231231',
+        'SUNDAY,0,0,0,0,0,0,1,20230101,20231231',
+    ],
+    'calendar_dates.txt': [
+        'service_id,date,exception_type',
+        'WEEKDAY,20231225,2',
+        'SUNDAY,20231225,1',
+    ],
+}
+
+UK = pytz.timezone('Europe/London')
+
+def write_feed(directory):
+    """Writes the test GTFS feed as `.txt` files into `directory`.
+
+    Args:
+        directory (str): The destination directory.
+
+    Returns:
+        str: The directory.
+    """
+    for name, lines in FEED.items():
+        with open(os.path.join(directory, name), 'w') as fh:
+            fh.write('\n'.join(lines) + '\n')
+    return directory
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+
+class TestTimetableStore(unittest.TestCase):
+    """Test case for GTFS import and departure lookup."""
+
+    def setUp(self):
+        """Imports the test feed into a temporary store."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        feed = write_feed(self.tmp.name)
+        self.path = os.path.join(self.tmp.name, 'timetable.db')
+        self.assertEqual(import_gtfs(feed, self.path), 5)
+        self.store = TimetableStore(self.path)
+
+    def _times(self, now, limit=10):
+        """Returns the departure times from the test stop as `HH:MM` strings.
+
+        Args:
+            now (datetime): The local time to look from.
+            limit (int): Maximum number of departures.
+
+        Returns:
+            list: The departure times.
+        """
+        return [when.strftime('%H:%M') for when, *_ in self.store.next_departures('450012345', now, limit)]
+
+    def test_next_departures_in_order(self):
+        """Tests that weekday departures come back sorted, skipping those already gone."""
+        now = UK.localize(datetime(2023, 10, 27, 12, 5))  # A Friday
+        self.assertEqual(self._times(now), ['12:10', '12:30', '01:10'])
+        self.assertEqual(self._times(now, limit=1), ['12:10'])
+
+    def test_after_midnight_trips_belong_to_previous_day(self):
+        """Tests that a 25:10 trip of Friday's service is offered early on Saturday."""
+        now = UK.localize(datetime(2023, 10, 28, 0, 30))
+        self.assertEqual(self._times(now), ['01:10'])
+
+    def test_tomorrow_fills_the_limit(self):
+        """Tests that tomorrow's departures follow today's, up to 24 hours ahead."""
+        sunday_night = UK.localize(datetime(2023, 10, 29, 23, 0))
+        self.assertEqual(self._times(sunday_night), ['12:00', '12:10', '12:30'])
+        self.assertEqual(self._times(sunday_night, limit=1), ['12:00'])
+        friday_night = UK.localize(datetime(2023, 10, 27, 23, 0))
+        self.assertEqual(self._times(friday_night), ['01:10'])
+
+    def test_many_services_on_a_day(self):
+        """Tests that days running more services than SQLite allows query variables still work."""
+        calendar = FEED['calendar.txt'] + [f'EXTRA{i},1,1,1,1,1,1,1,20230101,20231231' for i in range(40000)]
+        with patch.dict(FEED, {'calendar.txt': calendar}):
+            import_gtfs(write_feed(self.tmp.name), self.path)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        now = UK.localize(datetime(2023, 10, 27, 12, 5))
+        self.assertEqual(len(self.store.services_on(now.date())), 40001)
+        self.assertEqual(self._times(now), ['12:10', '12:30', '01:10'])
+
+    def test_calendar_and_exceptions(self):
+        """Tests weekday patterns and calendar_dates additions/removals."""
+        sunday = UK.localize(datetime(2023, 10, 29, 9, 0))
+        self.assertEqual(self._times(sunday), ['10:00'])
+        christmas = UK.localize(datetime(2023, 12, 25, 9, 0))  # A Monday
+        self.assertEqual(self._times(christmas), ['10:00'])
+
+    def test_has_stop(self):
+        """Tests that only stops in the feed are reported as covered."""
+        self.assertTrue(self.store.has_stop('450012345'))
+        self.assertFalse(self.store.has_stop('450099999'))
+
+    def test_reimport_is_picked_up(self):
+        """Tests that replacing the store changes the covered stops without a new `TimetableStore`."""
+        self.assertFalse(self.store.has_stop('450099999'))
+        feed = os.path.join(self.tmp.name, 'feed.zip')
+        with zipfile.ZipFile(feed, 'w') as archive:
+            for name, lines in FEED.items():
+                archive.writestr(name, '\n'.join(lines).replace('450012345', '450099999') + '\n')
+        import_gtfs(feed, self.path)
+        # Make sure the modification time moves even on coarse filesystem clocks.
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertTrue(self.store.has_stop('450099999'))
+        self.assertFalse(self.store.has_stop('450012345'))
+        monday = UK.localize(datetime(2023, 10, 30, 11, 0))
+        self.assertEqual(len(self.store.next_departures('450099999', monday, 10)), 4)
+
+class TestStaticBusProvider(unittest.TestCase):
+    """Test case for serving bus departures from the static timetable."""
+
+    def setUp(self):
+        """Sets up an app using the static bus provider."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        timetable_path = os.path.join(self.tmp.name, 'timetable.db')
+        import_gtfs(write_feed(self.tmp.name), timetable_path)
+
+        class StaticConfig(TestConfig):
+            BUS_PROVIDER = 'static'
+            TIMETABLE_PATH = timetable_path
+
+        self.app = create_app(StaticConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        self.provider = get_provider(self.app, 'bus')
+        self.provider.clock = lambda: UK.localize(datetime(2023, 10, 27, 11, 45))
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _install(self, bus_stop, **kwargs):
+        """Creates an installation for a bus stop.
+
+        Args:
+            bus_stop (str): The ATCO code.
+            **kwargs: Extra `Installation` fields.
+
+        Returns:
+            Installation: The saved installation.
+        """
+        installation = Installation(user=User(trmnl_id='user123'), access_token='token123',
+                                    bus_stop=bus_stop, **kwargs)
+        db.session.add(installation)
+        db.session.commit()
+        return installation
+
+    @patch('requests.get', side_effect=AssertionError('no network expected'))
+    def test_covered_stop_needs_no_network(self, mock_get):
+        """Tests that a stop in the feed is answered locally and filtered as usual."""
+        self._install('450012345')
+        response = self.client.get('/api/data', headers={'Authorization': 'Bearer token123'})
+        self.assertEqual(response.status_code, 200)
+        buses = response.json['buses']
+        # Only First services are kept; the Arriva 163 is filtered out.
+        self.assertEqual({bus['line'] for bus in buses}, {'19'})
+        self.assertEqual(sorted(bus['time'] for bus in buses), ['01:10', '12:00', '12:30'])
+        mock_get.assert_not_called()
+
+    def test_uncovered_stop_falls_back_to_transportapi(self):
+        """Tests that stops outside the feed use TransportAPI when credentials are set."""
+        self._install('450099999', app_id='id', app_key='key')
+        with patch.object(self.provider.fallback, 'departures', return_value={'departures': {}}) as mock_live:
+            self.client.get('/api/data', headers={'Authorization': 'Bearer token123'})
+        mock_live.assert_called_once_with('id', 'key', '450099999')
+
+if __name__ == '__main__':
+    unittest.main()
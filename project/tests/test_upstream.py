@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import patch
+from project import create_app, db
+from project.boards import TRAIN, get_board_store
+from project.main import MOCK_TRAIN_DATA
+from project.metrics import get_metrics
+from project.models import User, Installation
+from project.tests.stand_in import StandInServer
+from project.upstream import (
+    AUTH, NOT_FOUND, QUOTA, TIMEOUT, TRANSIENT, ErrorCache, UpstreamError, credential_key, get_upstream_errors,
+    request_json,
+)
+from config import Config
+
+class TestConfig(Config):
+    """Configuration for testing.
+
+    Overrides the default configuration with settings suitable for testing,
+    such as using an in-memory database and disabling CSRF protection.
+    """
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    WTF_CSRF_ENABLED = False
+    SERVER_NAME = 'localhost:5000'
+    MIN_REFRESH_SECONDS = 0
+
+class TestClassification(unittest.TestCase):
+    """Test case for classifying upstream failures against a stand-in API."""
+
+    def test_request_json(self):
+        """Tests each HTTP failure mode maps to its error class."""
+        cases = [
+            ((404, {}), NOT_FOUND),
+            ((401, {}), AUTH),
+            ((403, {}), AUTH),
+            ((429, {}), QUOTA),
+            ((503, {}), TRANSIENT),
+            ((200, {'error': 'Usage limits are exceeded'}), QUOTA),
+            ((200, {'error': 'Authorisation failed'}), AUTH),
+            ((200, {'error': 'No such stop'}), NOT_FOUND),
+        ]
+        with StandInServer() as upstream:
+            upstream.responses = [response for response, _ in cases]
+            for _, kind in cases:
+                with self.assertRaises(UpstreamError) as raised:
+                    request_json(upstream.url + '/live.json', {'app_id': 'id'}, timeout=5)
+                self.assertEqual(raised.exception.kind, kind)
+            self.assertEqual(request_json(upstream.url, {}, timeout=5), {})
+
+            upstream.delay = 0.5
+            with self.assertRaises(UpstreamError) as raised:
+                request_json(upstream.url, {}, timeout=0.1)
+            self.assertEqual(raised.exception.kind, TIMEOUT)
+
+class TestErrorCache(unittest.TestCase):
+    """Test case for the exponential backoff of failing lookups."""
+
+    def test_backoff_doubles_and_clears(self):
+        """Tests that each failure doubles the wait, up to the cap, until a success."""
+        now = [0.0]
+        cache = ErrorCache(max_backoff=100, base_backoff={TRANSIENT: 30}, clock=lambda: now[0])
+        key = (TRAIN, 'id', 'LST')
+        self.assertIsNone(cache.blocked(key))
+        self.assertEqual(cache.record(key, UpstreamError(TRANSIENT, 'down'))['retry_at'], 30)
+        self.assertIsNotNone(cache.blocked(key))
+        now[0] = 30.0
+        self.assertIsNone(cache.blocked(key))
+        self.assertEqual(cache.record(key, UpstreamError(TRANSIENT, 'down'))['retry_at'], 90)
+        self.assertEqual(cache.record(key, UpstreamError(TRANSIENT, 'down'))['retry_at'], 130)
+        self.assertEqual(cache.status(key)['failures'], 3)
+        cache.clear(key)
+        self.assertIsNone(cache.status(key))
+
+    def test_bounded(self):
+        """Tests that the oldest failures are dropped beyond `max_entries`."""
+        cache = ErrorCache(max_entries=2)
+        for code in ('A', 'B', 'C'):
+            cache.record((TRAIN, 'id', code), UpstreamError(NOT_FOUND, 'nope'))
+        self.assertIsNone(cache.status((TRAIN, 'id', 'A')))
+        self.assertIsNotNone(cache.status((TRAIN, 'id', 'C')))
+
+class TestBrokenInstallation(unittest.TestCase):
+    """Test case for polls of an installation whose station lookup fails."""
+
+    def setUp(self):
+        """Sets up an installation with an unknown station."""
+        self.app = create_app(TestConfig)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        db.session.add(Installation(
+            user=User(trmnl_id='user123'),
+            access_token='token123',
+            train_station='XXX',
+            app_id='id',
+            app_key='key',
+        ))
+        db.session.commit()
+        self.headers = {'Authorization': 'Bearer token123'}
+
+    def tearDown(self):
+        """Removes the database session, drops all tables, and pops the application context."""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    @patch('project.upstream.request_json', side_effect=UpstreamError(NOT_FOUND, 'HTTP 404', 404))
+    def test_failing_lookup_backs_off(self, mock_request):
+        """Tests that a failing station is not retried on every poll and is shown on the manage page."""
+        for _ in range(3):
+            response = self.client.get('/api/data', headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['trains'], [])
+        self.assertEqual(mock_request.call_count, 1)
+        metrics = get_metrics(self.app)
+        self.assertEqual(metrics.value('upstream_errors_total', kind=TRAIN, error=NOT_FOUND), 1)
+        self.assertEqual(metrics.value('upstream_skipped_total', kind=TRAIN), 2)
+
+        page = self.client.get('/manage', headers=self.headers).get_data(as_text=True)
+        self.assertIn('TransportAPI does not recognise this code.', page)
+        self.assertIn('not_found, 1 failed attempt(s)', page)
+
+        # Saving the settings (e.g. a corrected key) gives the lookup a fresh attempt.
+        self.client.post('/manage', headers=self.headers, data={
+            'train_station': 'XXX', 'min_train_time': 30, 'app_id': 'id', 'app_key': 'new-key',
+        })
+        self.assertIsNone(get_upstream_errors(self.app).status((TRAIN, 'id', 'XXX')))
+        self.client.get('/api/data', headers=self.headers)
+        self.assertEqual(mock_request.call_count, 2)
+
+    def test_bad_key_does_not_block_shared_app_id(self):
+        """Tests that an auth failure only backs off the App Key that caused it."""
+        db.session.add(Installation(user=User(trmnl_id='user456'), access_token='token456',
+                                    train_station='XXX', app_id='id', app_key='good-key'))
+        db.session.commit()
+
+        def lookup(url, params, timeout):
+            if params['app_key'] == 'key':
+                raise UpstreamError(AUTH, 'HTTP 401', 401)
+            return MOCK_TRAIN_DATA
+
+        with patch('project.upstream.request_json', side_effect=lookup) as mock_request:
+            self.client.get('/api/data', headers=self.headers)
+            response = self.client.get('/api/data', headers={'Authorization': 'Bearer token456'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertIsNotNone(get_board_store(self.app).board((TRAIN, 'id', 'XXX')))
+        errors = get_upstream_errors(self.app)
+        self.assertIsNone(errors.status((TRAIN, 'id', 'XXX')))
+        self.assertEqual(errors.status(credential_key((TRAIN, 'id', 'XXX'), 'key'))['kind'], AUTH)
+
+if __name__ == '__main__':
+    unittest.main()
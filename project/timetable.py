@@ -0,0 +1,318 @@
+import csv
+import io
+import os
+import sqlite3
+import threading
+import zipfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE departures (
+    stop_id TEXT NOT NULL,
+    service_id TEXT NOT NULL,
+    dep_secs INTEGER NOT NULL,
+    line TEXT,
+    direction TEXT,
+    operator TEXT
+);
+CREATE TABLE calendar (
+    service_id TEXT PRIMARY KEY,
+    days INTEGER NOT NULL,
+    start_date INTEGER NOT NULL,
+    end_date INTEGER NOT NULL
+);
+CREATE TABLE calendar_dates (
+    service_id TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    exception_type INTEGER NOT NULL
+);
+"""
+
+# Built after the bulk insert, which is much faster than maintaining them row by row.
+_INDEXES = """
+CREATE INDEX ix_departures_stop_service_time ON departures (stop_id, service_id, dep_secs);
+CREATE INDEX ix_calendar_dates_date ON calendar_dates (date);
+"""
+
+# The services running on :date, whose weekday is :weekday_bit, as a CTE to join against.
+_ACTIVE_SERVICES = """
+WITH active (service_id) AS (
+    SELECT service_id FROM calendar
+    WHERE days & :weekday_bit AND start_date <= :date AND end_date >= :date
+        AND service_id NOT IN (SELECT service_id FROM calendar_dates WHERE date = :date AND exception_type = 2)
+    UNION
+    SELECT service_id FROM calendar_dates WHERE date = :date AND exception_type = 1
+)
+"""
+
+_WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+class TimetableError(Exception):
+    """Raised when a feed cannot be imported or a store cannot be opened."""
+
+
+def _gtfs_seconds(value):
+    """Converts a GTFS `HH:MM:SS` time, which may exceed 24:00, to seconds.
+
+    Args:
+        value (str): The GTFS time.
+
+    Returns:
+        int: Seconds since the start of the service day.
+    """
+    hours, minutes, seconds = (int(part) for part in value.strip().split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _service_day(day):
+    """Returns the query parameters selecting the services of a day in `_ACTIVE_SERVICES`.
+
+    Args:
+        day (date): The service day.
+
+    Returns:
+        dict: The `date` and `weekday_bit` parameters.
+    """
+    return {'date': int(day.strftime('%Y%m%d')), 'weekday_bit': 1 << day.weekday()}
+
+
+@contextmanager
+def _open_feed(source):
+    """Opens a GTFS feed for reading, closing any archive on exit.
+
+    Args:
+        source (str): A GTFS `.zip` file or a directory of `.txt` files.
+
+    Yields:
+        function: `rows(name)` yielding dicts, or nothing if the file is absent.
+    """
+    if os.path.isdir(source):
+        def rows(name):
+            path = os.path.join(source, name)
+            if not os.path.exists(path):
+                return
+            with open(path, newline='', encoding='utf-8-sig') as fh:
+                yield from csv.DictReader(fh)
+        yield rows
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        def rows(name):
+            if name not in archive.namelist():
+                return
+            with archive.open(name) as fh:
+                yield from csv.DictReader(io.TextIOWrapper(fh, encoding='utf-8-sig', newline=''))
+        yield rows
+
+
+def import_gtfs(source, path):
+    """Ingests a GTFS feed into an indexed SQLite timetable store.
+
+    Only what is needed to answer "next departures from stop X" is kept: one
+    row per (stop, service, departure time) with the route's short name, the
+    trip headsign and the agency name, plus the service calendars. The store
+    is built in a temporary file and renamed over `path` when complete.
+    TransXChange data can be used once converted to GTFS (e.g. the UK Bus
+    Open Data Service publishes both).
+
+    Args:
+        source (str): A GTFS `.zip` file or a directory of `.txt` files.
+        path (str): Destination SQLite file.
+
+    Returns:
+        int: The number of departures imported.
+
+    Raises:
+        TimetableError: If the feed is missing required files.
+    """
+    with _open_feed(source) as rows:
+        agencies = {row.get('agency_id', ''): row['agency_name'] for row in rows('agency.txt')}
+        default_agency = next(iter(agencies.values()), '')
+        routes = {
+            row['route_id']: (
+                row.get('route_short_name') or row.get('route_long_name') or '',
+                agencies.get(row.get('agency_id', ''), default_agency),
+            )
+            for row in rows('routes.txt')
+        }
+        trips = {}
+        for row in rows('trips.txt'):
+            line, operator = routes.get(row['route_id'], ('', default_agency))
+            trips[row['trip_id']] = (row['service_id'], line, row.get('trip_headsign', ''), operator)
+        if not trips:
+            raise TimetableError('Feed has no trips.txt entries.')
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(_SCHEMA)
+            count = 0
+            batch = []
+            for row in rows('stop_times.txt'):
+                trip = trips.get(row['trip_id'])
+                dep = row.get('departure_time') or row.get('arrival_time')
+                if trip is None or not dep:
+                    continue
+                service_id, line, direction, operator = trip
+                batch.append((row['stop_id'], service_id, _gtfs_seconds(dep), line, direction, operator))
+                if len(batch) >= 10000:
+                    conn.executemany('INSERT INTO departures VALUES (?, ?, ?, ?, ?, ?)', batch)
+                    count += len(batch)
+                    batch = []
+            conn.executemany('INSERT INTO departures VALUES (?, ?, ?, ?, ?, ?)', batch)
+            count += len(batch)
+
+            conn.executemany('INSERT INTO calendar VALUES (?, ?, ?, ?)', (
+                (
+                    row['service_id'],
+                    sum(1 << i for i, day in enumerate(_WEEKDAYS) if row.get(day) == '1'),
+                    int(row['start_date']),
+                    int(row['end_date']),
+                )
+                for row in rows('calendar.txt')
+            ))
+            conn.executemany('INSERT INTO calendar_dates VALUES (?, ?, ?)', (
+                (row['service_id'], int(row['date']), int(row['exception_type']))
+                for row in rows('calendar_dates.txt')
+            ))
+            conn.executescript(_INDEXES)
+            conn.execute("INSERT INTO meta VALUES ('format_version', ?)", (str(FORMAT_VERSION),))
+            conn.commit()
+        finally:
+            conn.close()
+    os.replace(tmp_path, path)
+    return count
+
+
+class TimetableStore:
+    """Read-only access to a store built by `import_gtfs`.
+
+    Connections are opened per thread, since SQLite connections cannot be
+    shared between the threads of a worker. Connections and the set of
+    covered stops are tied to the store file's modification time, so a
+    store replaced by `flask import-timetable` is picked up without a
+    restart.
+
+    Attributes:
+        path (str): The SQLite file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._stops = None
+        self._stops_mtime = None
+        self._stops_lock = threading.Lock()
+
+    def _mtime(self):
+        """Returns the store file's modification time.
+
+        Returns:
+            int: The modification time in nanoseconds.
+
+        Raises:
+            TimetableError: If the store is missing.
+        """
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            raise TimetableError(f'No timetable store at {self.path}.') from None
+
+    def _conn(self):
+        """Returns this thread's read-only connection, (re)opening it if needed.
+
+        Returns:
+            sqlite3.Connection: The connection.
+
+        Raises:
+            TimetableError: If the store is missing or has another format version.
+        """
+        mtime = self._mtime()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.mtime != mtime:
+            conn.close()
+            conn = self._local.conn = None
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+            version = conn.execute("SELECT value FROM meta WHERE key = 'format_version'").fetchone()
+            if not version or int(version[0]) != FORMAT_VERSION:
+                conn.close()
+                raise TimetableError(f'Unsupported timetable format in {self.path}.')
+            self._local.conn = conn
+            self._local.mtime = mtime
+        return conn
+
+    def has_stop(self, stop_id):
+        """Checks whether the feed has any departures from a stop.
+
+        Args:
+            stop_id (str): The stop's ATCO code.
+
+        Returns:
+            bool: True if the stop is covered by the feed.
+        """
+        mtime = self._mtime()
+        if self._stops_mtime != mtime:
+            with self._stops_lock:
+                if self._stops_mtime != mtime:
+                    self._stops = frozenset(
+                        row[0] for row in self._conn().execute('SELECT DISTINCT stop_id FROM departures')
+                    )
+                    self._stops_mtime = mtime
+        return stop_id in self._stops
+
+    def services_on(self, day):
+        """Returns the service IDs running on a date.
+
+        Args:
+            day (date): The service day.
+
+        Returns:
+            set: The active service IDs.
+        """
+        query = _ACTIVE_SERVICES + 'SELECT service_id FROM active'
+        return {row[0] for row in self._conn().execute(query, _service_day(day))}
+
+    def next_departures(self, stop_id, now, limit):
+        """Returns the next departures from a stop within the next 24 hours.
+
+        Yesterday's, today's and tomorrow's service days are read in turn
+        (yesterday's trips may run past midnight, with GTFS times of 24:00 and
+        later) until `limit` departures are found. Boards only carry `HH:MM`
+        times, so nothing a day or more away is returned. Active services are
+        joined in SQL, so any number of them can run on a day.
+
+        Args:
+            stop_id (str): The stop's ATCO code.
+            now (datetime): The current local time.
+            limit (int): Maximum number of departures.
+
+        Returns:
+            list: `(datetime, line, direction, operator)` tuples in departure order.
+        """
+        results = []
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        seconds_now = (now.replace(tzinfo=None) - midnight).seconds
+        conn = self._conn()
+        query = _ACTIVE_SERVICES + (
+            'SELECT dep_secs, line, direction, operator FROM departures JOIN active USING (service_id) '
+            'WHERE stop_id = :stop_id AND dep_secs >= :since AND dep_secs < :until ORDER BY dep_secs LIMIT :limit'
+        )
+        for offset in (-1, 0, 1):
+            start = midnight + timedelta(days=offset)
+            # A later service day cannot depart before its own midnight.
+            if len(results) >= limit and results[limit - 1][0] < start:
+                break
+            since = seconds_now - offset * 86400
+            params = dict(_service_day(start.date()), stop_id=stop_id, since=since, until=since + 86400, limit=limit)
+            for dep_secs, line, direction, operator in conn.execute(query, params):
+                results.append((start + timedelta(seconds=dep_secs), line, direction, operator))
+            results.sort(key=lambda dep: dep[0])
+        return results[:limit]
@@ -0,0 +1,264 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+_EXTENSION_KEY = 'upstream_errors'
+
+NOT_FOUND = 'not_found'
+AUTH = 'auth'
+QUOTA = 'quota'
+TRANSIENT = 'transient'
+TIMEOUT = 'timeout'
+
+# First backoff per error class, in seconds; doubled on every further failure.
+# Errors that will not fix themselves wait longer before the next attempt.
+BASE_BACKOFF = {
+    NOT_FOUND: 600,
+    AUTH: 600,
+    QUOTA: 900,
+    TRANSIENT: 30,
+    TIMEOUT: 60,
+}
+
+# Shown on the manage page.
+DESCRIPTIONS = {
+    NOT_FOUND: 'TransportAPI does not recognise this code.',
+    AUTH: 'TransportAPI rejected the App ID or App Key.',
+    QUOTA: 'The TransportAPI usage limit for this App ID has been reached.',
+    TRANSIENT: 'TransportAPI is having problems.',
+    TIMEOUT: 'TransportAPI did not answer in time.',
+}
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream lookup fails, classified by cause.
+
+    Attributes:
+        kind (str): One of `NOT_FOUND`, `AUTH`, `QUOTA`, `TRANSIENT` or `TIMEOUT`.
+        status (int or None): The HTTP status, if a response was received.
+    """
+
+    def __init__(self, kind, message, status=None):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+
+
+def classify_status(status):
+    """Classifies an HTTP error status.
+
+    Args:
+        status (int): The HTTP status code (400 or above).
+
+    Returns:
+        str: The error class.
+    """
+    if status in (401, 403):
+        return AUTH
+    if status == 429:
+        return QUOTA
+    if status in (408, 504):
+        return TIMEOUT
+    if status >= 500:
+        return TRANSIENT
+    return NOT_FOUND
+
+
+def classify_message(message):
+    """Classifies the `error` field TransportAPI sends with some 200 responses.
+
+    Args:
+        message (str): The error message.
+
+    Returns:
+        str: The error class.
+    """
+    text = message.lower()
+    if 'limit' in text or 'quota' in text:
+        return QUOTA
+    if 'authoris' in text or 'authentic' in text or 'app_id' in text or 'app_key' in text:
+        return AUTH
+    return NOT_FOUND
+
+
+def request_json(url, params, timeout):
+    """Fetches a JSON document, raising a classified error on failure.
+
+    Args:
+        url (str): The URL.
+        params (dict): Query parameters.
+        timeout (float): Connect and read timeout, in seconds.
+
+    Returns:
+        dict: The parsed response.
+
+    Raises:
+        UpstreamError: If the request fails, times out or returns an error.
+    """
+    import requests
+
+    try:
+        response = requests.get(url, params=params, timeout=timeout)
+    except requests.Timeout as e:
+        raise UpstreamError(TIMEOUT, str(e)) from e
+    except requests.RequestException as e:
+        raise UpstreamError(TRANSIENT, str(e)) from e
+    if response.status_code >= 400:
+        raise UpstreamError(classify_status(response.status_code), f'HTTP {response.status_code}',
+                            response.status_code)
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise UpstreamError(TRANSIENT, 'Response is not JSON.', response.status_code) from e
+    if isinstance(data, dict) and data.get('error'):
+        raise UpstreamError(classify_message(str(data['error'])), str(data['error']), response.status_code)
+    return data
+
+
+def key_digest(app_key):
+    """Returns a short hash of a TransportAPI App Key, safe to keep in memory or on disk.
+
+    Args:
+        app_key (str): The TransportAPI App Key.
+
+    Returns:
+        str: The first 16 hex digits of the key's SHA-256.
+    """
+    return hashlib.sha256((app_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+def credential_key(key, app_key):
+    """Returns the error cache key of a lookup made with one App Key.
+
+    Authentication failures are recorded under this key rather than the
+    board key, so one installation's wrong App Key does not block others
+    that share its App ID. The key itself is only kept as a short hash.
+
+    Args:
+        key (tuple): The board key, `(kind, app_id, code)`.
+        app_key (str): The TransportAPI App Key.
+
+    Returns:
+        tuple: `(kind, app_id, code, app_key_hash)`.
+    """
+    return key + (key_digest(app_key),)
+
+
+class ErrorCache:
+    """Negative cache of failing upstream lookups with exponential backoff.
+
+    Entries are keyed like boards, `(kind, app_id, code)`, i.e. per App ID
+    and stop, except `AUTH` failures, which are keyed per App Key as well
+    (see `credential_key`). After a failure the lookup is skipped until its `retry_at`;
+    each consecutive failure doubles the wait, starting from the error
+    class's `BASE_BACKOFF` and capped at `max_backoff`. A success clears the
+    entry. At most `max_entries` entries are kept, least recently failed
+    first out.
+
+    Attributes:
+        max_backoff (float): Longest wait between attempts, in seconds.
+        max_entries (int): Maximum number of entries kept.
+    """
+
+    def __init__(self, max_backoff=21600, max_entries=10000, base_backoff=None, clock=time.time):
+        self.max_backoff = max_backoff
+        self.max_entries = max_entries
+        self.base_backoff = dict(BASE_BACKOFF, **(base_backoff or {}))
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def blocked(self, key):
+        """Returns the failure a lookup is still backing off from.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            dict or None: The entry, or None if the lookup may be attempted.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry['retry_at'] <= self.clock():
+            return None
+        return entry
+
+    def record(self, key, error):
+        """Records a failed lookup and schedules the next attempt.
+
+        Args:
+            key (tuple): The board key.
+            error (UpstreamError): The classified failure.
+
+        Returns:
+            dict: The entry, with `kind`, `message`, `status`, `failures`,
+                  `failed_at` and `retry_at`.
+        """
+        now = self.clock()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            failures = previous['failures'] + 1 if previous else 1
+            delay = min(self.base_backoff[error.kind] * 2 ** (failures - 1), self.max_backoff)
+            entry = {
+                'kind': error.kind,
+                'message': str(error),
+                'status': error.status,
+                'failures': failures,
+                'failed_at': now,
+                'retry_at': now + delay,
+            }
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def status(self, key):
+        """Returns the last failure of a lookup, whether or not it is still backing off.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            dict or None: The entry, or None if the last attempt succeeded.
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def clear(self, key):
+        """Forgets a lookup's failures, e.g. after a success or a settings change.
+
+        Args:
+            key (tuple): The board key.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def init_upstream_errors(app):
+    """Creates the negative cache of failing upstream lookups for `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        ErrorCache: The new cache.
+    """
+    cache = ErrorCache(max_backoff=app.config.get('UPSTREAM_BACKOFF_MAX_SECONDS', 21600))
+    app.extensions[_EXTENSION_KEY] = cache
+    return cache
+
+
+def get_upstream_errors(app):
+    """Returns the negative cache of failing upstream lookups of `app`.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        ErrorCache: The app's cache.
+    """
+    return app.extensions[_EXTENSION_KEY]